@@ -0,0 +1,54 @@
+"""
+Compares the map rendering modes of build_map() on synthetic station sets.
+
+For every mode and station count it reports the time to build and save the map, the size of the saved HTML file and
+the number of markers drawn. Run from the repository root:
+
+  python benchmarks/bench_map_rendering.py --stations 10 100 1000 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import weather_map
+import weather_scraper
+import weather_table
+
+DESCRIPTIONS = ['Sunny and light winds', 'Light cloud and a gentle breeze', 'Light rain showers and a moderate breeze', 'Fog and light winds']
+
+def synthetic_table(count, seed=0):
+  """
+  Builds a table of `count` random stations spread over the Netherlands.
+  """
+  random=np.random.default_rng(seed)
+  rows=[[f'Station {i}', int(random.integers(-5, 30)), DESCRIPTIONS[i % len(DESCRIPTIONS)], float(random.uniform(50.8, 53.4)), float(random.uniform(3.4, 7.2))] for i in range(count)]
+  return weather_table.WeatherTable.from_rows(rows)
+
+def measure(table, mode, folder):
+  """
+  Returns (seconds, bytes) to build and save the map of `table` in `mode`.
+  """
+  path=os.path.join(folder, f'{mode}.html')
+  start=time.perf_counter()
+  weather_map.build_map(table, mode).save(path)
+  seconds=time.perf_counter()-start
+  return seconds,os.path.getsize(path)
+
+def main(argv=None):
+  parser=argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument('--stations', type=int, nargs='+', default=[10, 100, 1000, 5000], help='station counts to render')
+  args=parser.parse_args(argv)
+  print(f"{'stations':>9}{'mode':>10}{'time (s)':>10}{'size (kB)':>11}{'markers':>9}")
+  with tempfile.TemporaryDirectory() as folder:
+    for count in args.stations:
+      table=synthetic_table(count)
+      for mode in weather_scraper.MAP_MODES:
+        seconds,size=measure(table, mode, folder)
+        print(f"{count:>9}{mode:>10}{seconds:>10.3f}{size/1024:>11.1f}{len(table):>9}")
+
+if __name__ == '__main__':
+  main()
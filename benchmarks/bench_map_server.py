@@ -0,0 +1,122 @@
+"""
+Load-tests the embedded map server of weather_server.MapServer on localhost.
+
+A synthetic map of --stations stations is rendered once and served by a MapServer in a separate process. --viewers
+threads each keep one connection open and request the map --requests times, with gzip accepted. A --revalidate share of
+the requests carries the ETag of the previous response, as a browser reloading the page does, and is answered with 304.
+With --swap-every the server publishes a new render every that many seconds during the test, and every response is
+checked to be one complete version of the map.
+
+It reports the throughput, the latency percentiles and the CPU time the server process spent per request, next to
+the time one gzip compression of the map takes, which a server that compresses on every hit would pay per request.
+Run from the repository root:
+
+  python benchmarks/bench_map_server.py --viewers 200 --requests 50 --stations 1000 --swap-every 0.5
+"""
+import argparse
+import gzip
+import http.client
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import weather_map
+import weather_server
+from bench_map_rendering import synthetic_table
+
+def render(stations, version):
+  """
+  Returns the HTML of the synthetic map, every version with other temperatures.
+  """
+  return weather_map.build_map(synthetic_table(stations, seed=version), 'geojson').get_root().render().encode('utf-8')
+
+def serve(connection, stations, swap_every):
+  """
+  Runs the server in its own process, so its CPU time is not mixed with the one of the viewers.
+  """
+  pages=[render(stations, version) for version in range(4 if swap_every else 1)]
+  server=weather_server.MapServer(port=0)
+  server.publish('netherlands_weather_map.html', pages[0])
+  server.start()
+  connection.send(server.address)
+  start=time.process_time()
+  version=0
+  while not connection.poll(swap_every or None):
+    version+=1
+    server.publish('netherlands_weather_map.html', pages[version % len(pages)])
+  connection.recv()
+  seconds=time.process_time()-start
+  stats=server.stats()
+  server.close()
+  connection.send((seconds, stats, pages))
+
+def viewer(address, requests, revalidate, latencies, bodies, errors, seed):
+  connection=http.client.HTTPConnection(*address, timeout=30)
+  choices=random.Random(seed)
+  etag=None
+  try:
+    for _ in range(requests):
+      headers={'Accept-Encoding':'gzip'}
+      if etag is not None and choices.random() < revalidate:
+        headers['If-None-Match']=etag
+      start=time.perf_counter()
+      connection.request('GET', '/', headers=headers)
+      response=connection.getresponse()
+      body=response.read()
+      latencies.append(time.perf_counter()-start)
+      if response.status == 200:
+        etag=response.getheader('ETag')
+        bodies.add(gzip.decompress(body))
+      elif response.status != 304:
+        errors.append(response.status)
+  except Exception as error:
+    errors.append(error)
+  finally:
+    connection.close()
+
+def main(argv=None):
+  parser=argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument('--viewers', type=int, default=200, help='concurrent connections')
+  parser.add_argument('--requests', type=int, default=50, help='requests per connection')
+  parser.add_argument('--stations', type=int, default=1000, help='stations on the map')
+  parser.add_argument('--revalidate', type=float, default=0.5, help='share of conditional requests')
+  parser.add_argument('--swap-every', type=float, default=0.0, help='seconds between two new renders during the test, 0 never swaps')
+  args=parser.parse_args(argv)
+  page=render(args.stations, 0)
+  start=time.perf_counter()
+  compressed=gzip.compress(page)
+  compress_seconds=time.perf_counter()-start
+  print(f'map: {len(page)/1024:.1f} kB, gzip {len(compressed)/1024:.1f} kB in {compress_seconds*1000:.1f} ms')
+  parent,child=multiprocessing.Pipe()
+  process=multiprocessing.Process(target=serve, args=(child, args.stations, args.swap_every))
+  process.start()
+  address=parent.recv()
+  latencies,bodies,errors=[],set(),[]
+  threads=[threading.Thread(target=viewer, args=(address, args.requests, args.revalidate, latencies, bodies, errors, seed)) for seed in range(args.viewers)]
+  start=time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  seconds=time.perf_counter()-start
+  parent.send('stop')
+  cpu_seconds,stats,pages=parent.recv()
+  process.join()
+  latencies.sort()
+  count=len(latencies)
+  print(f'{count} requests from {args.viewers} viewers in {seconds:.2f} s: {count/seconds:.0f} requests/s')
+  print(f'latency ms: p50 {statistics.median(latencies)*1000:.2f}, p99 {latencies[int(0.99*(count-1))]*1000:.2f}, max {latencies[-1]*1000:.2f}')
+  print(f'server CPU: {cpu_seconds/count*1e6:.0f} us per request ({cpu_seconds:.2f} s), versus {compress_seconds*1e6:.0f} us to gzip the map once')
+  print(f"responses: {stats['gzip']['responses']} gzip, {stats['not_modified']['responses']} not modified, {stats['publishes']} publishes")
+  incomplete=bodies-set(pages)
+  print(f'errors: {len(errors)}, incomplete maps: {len(incomplete)}')
+  return 1 if errors or incomplete else 0
+
+if __name__ == '__main__':
+  raise SystemExit(main())
@@ -0,0 +1,57 @@
+"""
+Compares the HTML extraction backends of weather_parsers on the recorded fixture pages.
+
+For every page and backend it reports the median parse time over a number of repetitions and the peak memory
+allocated while parsing once (measured with tracemalloc). Run from the repository root:
+
+  python benchmarks/bench_parsers.py --repeat 50
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import weather_parsers
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'fixtures')
+
+def measure(parse, html, backend, repeat):
+  """
+  Returns (median seconds, peak bytes) of one parse function on one page.
+  """
+  timings=[]
+  for _ in range(repeat):
+    start=time.perf_counter()
+    parse(html, backend)
+    timings.append(time.perf_counter()-start)
+  tracemalloc.start()
+  parse(html, backend)
+  _,peak=tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return statistics.median(timings),peak
+
+def main(argv=None):
+  parser=argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument('--repeat', type=int, default=20, help='parses per page and backend for the timing')
+  args=parser.parse_args(argv)
+  pages=sorted(glob.glob(os.path.join(FIXTURES, 'bbc_*.html')))+sorted(glob.glob(os.path.join(FIXTURES, 'geodatos_*.html')))
+  print(f"{'page':<28}{'backend':<10}{'size (kB)':>10}{'time (ms)':>11}{'peak (kB)':>11}{'speedup':>9}")
+  for path in pages:
+    with open(path, encoding='utf-8') as file:
+      html=file.read()
+    parse=weather_parsers.parse_bbc_page if os.path.basename(path).startswith('bbc_') else weather_parsers.parse_geodatos_page
+    results={backend:parse(html, backend) for backend in weather_parsers.BACKENDS}
+    if len({repr(result) for result in results.values()}) != 1:
+      raise SystemExit(f'backends disagree on {path}: {results}')
+    baseline=None
+    for backend in weather_parsers.BACKENDS:
+      seconds,peak=measure(parse, html, backend, args.repeat)
+      baseline=baseline or seconds
+      print(f"{os.path.basename(path):<28}{backend:<10}{len(html)/1024:>10.1f}{seconds*1000:>11.3f}{peak/1024:>11.1f}{baseline/seconds:>8.1f}x")
+
+if __name__ == '__main__':
+  main()
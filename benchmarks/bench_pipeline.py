@@ -0,0 +1,269 @@
+"""
+Measures every stage of the scraping pipeline offline, against a local stub server that serves the recorded pages.
+
+The recorded BBC and geodatos pages in tests/fixtures are served by a threaded HTTP server on localhost with a
+configurable latency per request. Every BBC location ID gets its own station: the page of a recorded city is served with
+the city renamed to 'Station <id>', and that station gets its own coordinates page. The scrapers keep their real URLs, the
+transport adapter of the shared `weather_http` client only redirects them to the stub server, so connection pooling,
+parsing and caching run exactly as in production.
+
+For every stage and number of stations it reports the throughput and the latency:
+  - bbc_weather_scraper and dutch_coordinates: per call, with the caches disabled.
+  - weather_array_stacker and map_generator: per batch, with empty caches, one sample per repetition.
+
+With --parse-workers, weather_array_stacker and map_generator run on a `weather_pipeline.PipelinedStacker` with
+--workers download threads and that many parse processes, its stage utilisation is printed after every batch.
+
+The results can be stored as a baseline and later runs flag every stage whose throughput dropped by more than the
+tolerance, the exit status is then 1. Run from the repository root:
+
+  python benchmarks/bench_pipeline.py --sizes 10 100 1000 10000 --latency 5 --workers 8
+  python benchmarks/bench_pipeline.py --save-baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import weather_cache
+import weather_http
+import weather_map #imported up front, so map_generator is not timed loading Folium
+import weather_parsers
+import weather_pipeline
+import weather_scraper
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'fixtures')
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_pipeline.json')
+STAGES = ('bbc_weather_scraper', 'dutch_coordinates', 'weather_array_stacker', 'map_generator')
+FIRST_STATION = 3000000 #location IDs of the synthetic stations start here
+GEODATOS_PATH = '/en/coordinates/netherlands/'
+
+def read_fixture(name):
+  with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+    return file.read()
+
+class StubWeb:
+  """
+  Serves BBC and geodatos pages for any number of stations, built from the recorded pages.
+
+  Args:
+    latency (float): Seconds the server waits before answering every request.
+  """
+  def __init__(self, latency=0.0):
+    self.latency=latency
+    self.bbc=[]
+    for name in ('bbc_2759794.html', 'bbc_2755003.html'):
+      html=read_fixture(name)
+      self.bbc.append((html, weather_parsers.parse_bbc_page(html)[0]))
+    html=read_fixture('geodatos_amsterdam.html')
+    latitude,longitude=weather_parsers.parse_geodatos_page(html)
+    self.geodatos=(html, f'{latitude}, {longitude}')
+    self.pages={}
+    self.lock=threading.Lock()
+    self.requests=0
+
+  def page(self, path):
+    """
+    Returns the encoded page of a path, or None for an unknown path.
+    """
+    with self.lock:
+      self.requests+=1
+      body=self.pages.get(path)
+    if body is not None:
+      return body
+    if path.startswith('/weather/') and path[9:].isdigit():
+      station=int(path[9:])
+      html,city=self.bbc[station % len(self.bbc)]
+      body=html.replace(city, f'Station {station}')
+    elif path.startswith(GEODATOS_PATH + 'station-') and path[len(GEODATOS_PATH)+8:].isdigit():
+      station=int(path[len(GEODATOS_PATH)+8:])
+      html,coordinates=self.geodatos
+      #spreading the stations over the country keeps the map realistic
+      body=html.replace(coordinates, f'{50.8+(station*7919 % 2600)/1000:.5f}, {3.4+(station*104729 % 3800)/1000:.5f}')
+    else:
+      return None
+    body=body.encode('utf-8')
+    with self.lock:
+      self.pages[path]=body
+    return body
+
+  def serve(self):
+    """
+    Starts the server on a free localhost port in a background thread and returns it.
+    """
+    web=self
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version='HTTP/1.1' #keep-alive, like the real websites
+      disable_nagle_algorithm=True #the last segment of a page would otherwise wait for the delayed ACK of the client
+
+      def do_GET(self):
+        if web.latency:
+          time.sleep(web.latency)
+        body=web.page(urlsplit(self.path).path)
+        if body is None:
+          self.send_response(404)
+          body=b'<html><body>Page not found</body></html>'
+        else:
+          self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, *args):
+        pass
+
+    server=ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads=True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+class StubAdapter(HTTPAdapter):
+  """
+  Transport adapter that sends every request to the stub server instead of the host in its URL.
+  """
+  def __init__(self, address, pool_size):
+    super().__init__(pool_connections=1, pool_maxsize=pool_size)
+    self.base='http://%s:%d' % address
+
+  def send(self, request, **kwargs):
+    parts=urlsplit(request.url)
+    request.url=self.base+parts.path
+    return super().send(request, **kwargs)
+
+def station_urls(count):
+  return [weather_scraper.BBC_WEATHER_URL + str(FIRST_STATION+i) for i in range(count)]
+
+def fresh_state(address, workers, folder):
+  """
+  Installs a new HTTP client pointed at the stub server and empty caches, so every measurement starts cold.
+  """
+  weather_http.set_default_client(weather_http.HttpClient(pool_size=max(workers, 1), adapter=StubAdapter(address, max(workers, 1))))
+  weather_cache.set_default_forecast_cache(weather_cache.ForecastCache())
+  handle,path=tempfile.mkstemp(suffix='.sqlite', dir=folder)
+  os.close(handle)
+  weather_cache.set_default_coordinate_cache(weather_cache.CoordinateCache(path))
+
+def percentile(samples, fraction):
+  ordered=sorted(samples)
+  return ordered[min(len(ordered)-1, int(round(fraction*(len(ordered)-1))))]
+
+def utilisation(pipeline):
+  stats=pipeline.stats()
+  return ', '.join(f"{stage} {stats[stage]['utilisation']:.0%} of {stats[stage]['workers']}" for stage in ('fetch', 'parse'))
+
+def run_stage(stage, count, args, address, folder, pipeline=None):
+  """
+  Runs one stage on `count` stations and returns its throughput (items/s) and latency percentiles (s).
+  """
+  urls=station_urls(count)
+  samples=[]
+  items=0
+  for _ in range(args.repeat):
+    fresh_state(address, args.workers, folder)
+    if stage == 'bbc_weather_scraper':
+      for url in urls:
+        start=time.perf_counter()
+        weather_scraper.bbc_weather_scraper(url, cache=False)
+        samples.append(time.perf_counter()-start)
+    elif stage == 'dutch_coordinates':
+      for i in range(count):
+        start=time.perf_counter()
+        weather_scraper.dutch_coordinates(f'Station {FIRST_STATION+i}', cache=False)
+        samples.append(time.perf_counter()-start)
+    elif stage == 'weather_array_stacker':
+      start=time.perf_counter()
+      weather_scraper.weather_array_stacker(urls, args.workers, pipeline=pipeline)
+      samples.append(time.perf_counter()-start)
+    else:
+      start=time.perf_counter()
+      weather_scraper.map_generator(urls, args.workers, mode=args.mode, output=os.path.join(folder, 'map.html'), pipeline=pipeline)
+      samples.append(time.perf_counter()-start)
+    items+=count
+  elapsed=sum(samples)
+  return {'throughput':items/elapsed, 'p50':statistics.median(samples), 'p95':percentile(samples, 0.95)}
+
+def settings(args):
+  stored={'latency':args.latency, 'workers':args.workers, 'mode':args.mode}
+  if args.parse_workers is not None:
+    stored['parse_workers']=args.parse_workers
+  return stored
+
+def compare(results, baseline, tolerance):
+  """
+  Returns the (key, current, stored) throughputs of the measurements that are slower than the baseline by more than `tolerance`.
+  """
+  regressions=[]
+  for key,result in results.items():
+    stored=baseline.get(key)
+    if stored is not None and result['throughput'] < stored['throughput']*(1-tolerance):
+      regressions.append((key,result['throughput'],stored['throughput']))
+  return regressions
+
+def main(argv=None):
+  parser=argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+  parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000], help='numbers of stations to scrape')
+  parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help='stages to measure')
+  parser.add_argument('--latency', type=float, default=0.0, help='milliseconds the stub server waits before every answer')
+  parser.add_argument('--workers', type=int, default=8, help='max_workers of weather_array_stacker() and map_generator()')
+  parser.add_argument('--parse-workers', type=int, help='run the batch stages on a PipelinedStacker with this many parse processes')
+  parser.add_argument('--mode', choices=weather_scraper.MAP_MODES, default='markers', help='map mode of map_generator()')
+  parser.add_argument('--repeat', type=int, default=1, help='repetitions of every measurement')
+  parser.add_argument('--baseline', default=BASELINE, help='baseline file the results are compared with')
+  parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline instead of comparing')
+  parser.add_argument('--tolerance', type=float, default=0.25, help='fraction of baseline throughput that may be lost before a regression is flagged')
+  args=parser.parse_args(argv)
+  web=StubWeb(args.latency/1000)
+  server=web.serve()
+  baseline={}
+  if not args.save_baseline and os.path.exists(args.baseline):
+    with open(args.baseline, encoding='utf-8') as file:
+      stored=json.load(file)
+    if stored['settings'] == settings(args):
+      baseline=stored['results']
+    else:
+      print(f"baseline {args.baseline} was measured with {stored['settings']}, not compared")
+  results={}
+  pipeline=None
+  if args.parse_workers is not None:
+    pipeline=weather_pipeline.PipelinedStacker(args.workers, args.parse_workers)
+  print(f"{'stage':<23}{'items':>7}{'items/s':>11}{'p50 (ms)':>11}{'p95 (ms)':>11}{'baseline':>10}")
+  try:
+    with tempfile.TemporaryDirectory() as folder:
+      for stage in args.stages:
+        for count in args.sizes:
+          key=f'{stage}/{count}'
+          results[key]=result=run_stage(stage, count, args, server.server_address, folder, pipeline)
+          stored=baseline.get(key)
+          change=f"{result['throughput']/stored['throughput']-1:>+9.0%}" if stored else f"{'-':>9}"
+          print(f"{stage:<23}{count:>7}{result['throughput']:>11.1f}{result['p50']*1000:>11.2f}{result['p95']*1000:>11.2f} {change}")
+          if pipeline is not None and stage in ('weather_array_stacker', 'map_generator'):
+            print(f"{'':<23}utilisation: {utilisation(pipeline)}")
+  finally:
+    if pipeline is not None:
+      pipeline.close()
+    server.shutdown()
+    weather_http.set_default_client(None)
+    weather_cache.set_default_forecast_cache(None)
+    weather_cache.set_default_coordinate_cache(None)
+  if args.save_baseline:
+    with open(args.baseline, 'w', encoding='utf-8') as file:
+      json.dump({'settings':settings(args), 'results':results}, file, indent=1, sort_keys=True)
+      file.write('\n')
+    print(f'baseline written to {args.baseline}')
+    return 0
+  regressions=compare(results, baseline, args.tolerance)
+  for key,current,stored in regressions:
+    print(f'REGRESSION {key}: {current:.1f} items/s, baseline {stored:.1f} items/s')
+  return 1 if regressions else 0
+
+if __name__ == '__main__':
+  raise SystemExit(main())
@@ -0,0 +1,49 @@
+import hashlib
+import threading
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+def geodatos_page(latitude, longitude):
+  '''Minimal geodatos.net page with the paragraph read by dutch_coordinates().'''
+  return f'<html><body><h1>Coordinates</h1><p class="font-bold text-blue-500 mt-3 lg:text-lg">{latitude}, {longitude}</p></body></html>'
+
+class FakeWeb(BaseAdapter):
+  '''
+  Transport adapter that serves pages from a dictionary instead of the network, to be mounted on a requests session.
+  Unknown urls answer 404. With etags=True every page carries an ETag and conditional requests are answered with 304.
+  '''
+  def __init__(self, pages, etags=False):
+    super().__init__()
+    self.pages = pages
+    self.etags = etags
+    self.requests = []
+    self.lock = threading.Lock()
+
+  def send(self, request, **kwargs):
+    with self.lock:
+      self.requests.append(request.url)
+    response = Response()
+    response.url = request.url
+    response.request = request
+    response.encoding = 'utf-8'
+    response.headers = CaseInsensitiveDict()
+    body = self.pages.get(request.url)
+    if body is None:
+      response.status_code = 404
+      response._content = b'<html><body>Page not found</body></html>'
+      return response
+    body = body.encode('utf-8')
+    etag = '"' + hashlib.md5(body).hexdigest() + '"'
+    if self.etags:
+      response.headers['ETag'] = etag
+    if self.etags and request.headers.get('If-None-Match') == etag:
+      response.status_code = 304
+      response._content = b''
+    else:
+      response.status_code = 200
+      response._content = body
+    return response
+
+  def close(self):
+    pass
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import pytest
+import weather_map
+import weather_scraper
+import weather_table
+
+rows = [['Amsterdam', 14, 'Sunny', 52.37403, 4.88969],
+        ['Haarlem', 9, 'Fog', 52.38084, 4.63683],
+        ['Utrecht', 23, 'Sunny', 52.09083, 5.12222]]
+
+def test_build_map():
+  table = weather_table.WeatherTable.from_rows(rows)
+  #testing that every mode shows all cities with their coloured temperatures
+  for mode in weather_scraper.MAP_MODES:
+    html = weather_map.build_map(table, mode).get_root().render()
+    for city, temperature, description, _, _ in rows:
+      assert f"{city} - {temperature} - {description}" in html
+    assert '"green"' in html or 'color: green' in html
+  markers = weather_map.build_map(table, 'markers').get_root().render()
+  assert markers.count('L.marker(') == 3
+  geojson = weather_map.build_map(table, 'geojson').get_root().render()
+  assert 'pointToLayer' in geojson and geojson.count('L.marker(') == 1
+  assert '"coordinates": [4.88969, 52.37403]' in geojson
+  cluster = weather_map.build_map(table, 'cluster').get_root().render()
+  assert 'L.markerClusterGroup' in cluster and cluster.count('L.marker(') == 1
+  with pytest.raises(ValueError, match='Invalid map mode'):
+    weather_map.build_map(table, 'heatmap')
+
+def test_map_generator_modes():
+  #testing that map_generator saves the map in the requested mode without scraping
+  original = weather_scraper.weather_table_stacker
+  weather_scraper.weather_table_stacker = lambda url_list, max_workers, per_host_limit, pipeline=None: weather_table.WeatherTable.from_rows(rows)
+  folder = os.getcwd()
+  umask = os.umask(0o022)
+  try:
+    with tempfile.TemporaryDirectory() as temporary:
+      os.chdir(temporary)
+      weather_scraper.map_generator(['https://www.bbc.com/weather/2759794'], mode='cluster')
+      with open('netherlands_weather_map.html', encoding='utf-8') as file:
+        html = file.read()
+      assert 'Haarlem - 9 - Fog' in html and 'L.markerClusterGroup' in html
+      #testing that the saved map can be read by others and that replacing it keeps its permissions
+      assert os.stat('netherlands_weather_map.html').st_mode & 0o777 == 0o644
+      os.chmod('netherlands_weather_map.html', 0o664)
+      weather_map.save_map(weather_table.WeatherTable.from_rows(rows), 'netherlands_weather_map.html')
+      assert os.stat('netherlands_weather_map.html').st_mode & 0o777 == 0o664
+      os.chdir(folder)
+    with pytest.raises(ValueError, match='Invalid map mode'):
+      weather_scraper.map_generator(['https://www.bbc.com/weather/2759794'], mode='heatmap')
+  finally:
+    os.umask(umask)
+    os.chdir(folder)
+    weather_scraper.weather_table_stacker = original
+test_build_map()#running the testing functions so the file can be run as a standalone
+test_map_generator_modes()
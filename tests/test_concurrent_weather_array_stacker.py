@@ -0,0 +1,60 @@
+import random
+import threading
+import time
+import pytest
+import weather_scraper
+
+cities = {'1': 'Amsterdam', '2': 'Haarlem', '3': 'Utrecht', '4': 'Zwolle', '5': 'Groningen', '6': 'Leiden'}
+
+class HostCounter:
+  '''Fake scrapers that record the highest number of simultaneous calls made to each host.'''
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.active = {'bbc': 0, 'geodatos': 0}
+    self.peak = {'bbc': 0, 'geodatos': 0}
+
+  def enter(self, host):
+    with self.lock:
+      self.active[host] += 1
+      self.peak[host] = max(self.peak[host], self.active[host])
+    time.sleep(random.uniform(0.001, 0.02))#random delays make the rows finish out of order
+    with self.lock:
+      self.active[host] -= 1
+
+  def bbc_weather_scraper(self, url):
+    if url[0:28] != 'https://www.bbc.com/weather/':
+      raise ValueError('Invalid website')
+    self.enter('bbc')
+    return [cities[url[28:]], int(url[28:]), 'Sunny']
+
+  def dutch_coordinates(self, city):
+    self.enter('geodatos')
+    return [52.0 + len(city), 4.0 + len(city)]
+
+def test_concurrent_weather_array_stacker():
+  counter = HostCounter()
+  original = (weather_scraper.bbc_weather_scraper, weather_scraper.dutch_coordinates)
+  weather_scraper.bbc_weather_scraper = counter.bbc_weather_scraper
+  weather_scraper.dutch_coordinates = counter.dutch_coordinates
+  try:
+    url_list = ['https://www.bbc.com/weather/' + key for key in cities]
+    sequential = weather_scraper.weather_array_stacker(url_list)
+    #testing that the concurrent rows are identical and in the same order as the input
+    for _ in range(3):
+      assert weather_scraper.weather_array_stacker(url_list, max_workers=6, per_host_limit=2) == sequential
+    assert [row[0] for row in sequential] == list(cities.values())
+    #testing that the per host limits are respected
+    assert counter.peak['bbc'] <= 2 and counter.peak['geodatos'] <= 2
+    counter.peak = {'bbc': 0, 'geodatos': 0}
+    weather_scraper.weather_array_stacker(url_list, max_workers=6, per_host_limit={'www.bbc.com': 3, 'www.geodatos.net': 1})
+    assert counter.peak['bbc'] <= 3 and counter.peak['geodatos'] == 1
+    #testing if errors are raised correctly
+    with pytest.raises(ValueError, match='Invalid website'):
+      weather_scraper.weather_array_stacker(url_list + ['https://www.cern.home'], max_workers=4)
+    with pytest.raises(ValueError, match='Invalid number of workers'):
+      weather_scraper.weather_array_stacker(url_list, max_workers=0)
+    with pytest.raises(ValueError, match='Invalid host concurrency limit'):
+      weather_scraper.weather_array_stacker(url_list, max_workers=2, per_host_limit=0)
+  finally:
+    weather_scraper.bbc_weather_scraper, weather_scraper.dutch_coordinates = original
+test_concurrent_weather_array_stacker()#running the testing function so the file can be run as a standalone
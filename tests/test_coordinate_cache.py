@@ -0,0 +1,43 @@
+import os
+import tempfile
+import pytest
+import weather_cache
+import weather_http
+import weather_scraper
+from fake_web import FakeWeb, geodatos_page
+
+def test_coordinate_cache():
+  fake = FakeWeb({'https://www.geodatos.net/en/coordinates/netherlands/the-hague': geodatos_page(52.07667, 4.29861)})
+  weather_http.set_default_client(weather_http.HttpClient(adapter=fake))
+  try:
+    with tempfile.TemporaryDirectory() as folder:
+      path = os.path.join(folder, 'coordinates.sqlite3')
+      cache = weather_cache.CoordinateCache(path)
+      #testing that the first lookup scrapes and the following ones are served from the cache
+      assert weather_scraper.dutch_coordinates('The Hague', cache=cache) == [52.07667, 4.29861]
+      assert weather_scraper.dutch_coordinates('the hague', cache=cache) == [52.07667, 4.29861]
+      assert weather_scraper.dutch_coordinates('THE-HAGUE', cache=cache) == [52.07667, 4.29861]
+      assert len(fake.requests) == 1
+      cache.close()
+      #testing that the coordinates survive a new run
+      reopened = weather_cache.CoordinateCache(path)
+      assert weather_scraper.dutch_coordinates('The Hague', cache=reopened) == [52.07667, 4.29861]
+      assert len(fake.requests) == 1
+      reopened.close()
+      #testing that misses are not cached and still raise
+      with pytest.raises(ValueError, match="Error: Coordinates not found for astremdam"):
+        weather_scraper.dutch_coordinates('astremdam', cache=weather_cache.CoordinateCache(':memory:'))
+      assert len(fake.requests) == 2
+      #testing that disabling the cache always scrapes
+      weather_scraper.dutch_coordinates('The Hague', cache=False)
+      assert len(fake.requests) == 3
+    #testing that the gazetteer answers without any request
+    gazetteer = weather_cache.CoordinateCache(':memory:', gazetteer=True)
+    assert weather_scraper.dutch_coordinates('Den Haag', cache=gazetteer) == [52.07667, 4.29861]
+    assert weather_scraper.dutch_coordinates('Amsterdam', cache=gazetteer) == [52.37403, 4.88969]
+    assert len(fake.requests) == 3
+    with pytest.raises(ValueError, match="Invalid input data type"):
+      gazetteer.get(901)
+  finally:
+    weather_http.set_default_client(None)
+test_coordinate_cache()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import pytest
+import weather_cache
+import weather_http
+import weather_map
+import weather_parsers
+import weather_scraper
+from fake_web import FakeWeb
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def fixture(name):
+  with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+    return file.read()
+
+amsterdam = [[14, 7], [16, 9], [12, 5], [11, 3], [13, 4], [15, -2], [9, 1], [8, 0], [10, 2], [12, 4], [11, 3], [7, -1], [6, -3], [9, 1]]
+
+def test_parse_bbc_forecast():
+  #testing that all backends read the same 14 days, including temperatures below zero
+  for backend in weather_parsers.BACKENDS:
+    city, days = weather_parsers.parse_bbc_forecast(fixture('bbc_2759794.html'), backend)
+    assert city == 'Amsterdam' and len(days) == 14
+    assert days[0] == ['Today', 14, 7, 'Sunny and light winds']
+    assert days[2] == ['Wednesday 23rd', 12, 5, 'Light rain showers and a moderate breeze']
+    assert [day[1:3] for day in days] == amsterdam
+  chunk_size = weather_parsers.STREAM_CHUNK_SIZE
+  try:
+    weather_parsers.STREAM_CHUNK_SIZE = 5
+    assert weather_parsers.parse_bbc_forecast(fixture('bbc_2755003.html'), 'stream') == weather_parsers.parse_bbc_forecast(fixture('bbc_2755003.html'), 'soup')
+  finally:
+    weather_parsers.STREAM_CHUNK_SIZE = chunk_size
+  #testing a late evening page without today's maximum, and a negative maximum for today's map
+  page = ('<h1 class="wr-c-location__name gel-paragon">Delft</h1><ol class="wr-day-carousel__list">'
+          '<li class="wr-day"><span class="wr-date__longish">Today</span><div class="wr-day__details">'
+          '<span class="wr-day-temperature__low-value"><span class="wr-value--temperature--c">&minus;4&deg;</span></span>'
+          '<div class="wr-day__details__weather-type-description">Clear sky</div></div></li>'
+          '<li class="wr-day"><span class="wr-date__longish">Tomorrow</span><div class="wr-day__details">'
+          '<span class="wr-day-temperature__high-value"><span class="wr-value--temperature--c">-1&deg;</span></span>'
+          '<span class="wr-day-temperature__low-value"><span class="wr-value--temperature--c">-6&deg;</span></span>'
+          '<div class="wr-day__details__weather-type-description">Light snow</div></div></li></ol>'
+          '<li class="wr-day"><span class="wr-date__longish">Hourly</span></li>')
+  for backend in weather_parsers.BACKENDS:
+    assert weather_parsers.parse_bbc_forecast(page, backend)[1][:2] == [['Today', None, -4, 'Clear sky'], ['Tomorrow', -1, -6, 'Light snow']]
+  #testing if errors are raised correctly in edge cases
+  for backend in weather_parsers.BACKENDS:
+    with pytest.raises(ValueError, match='Location not found'):
+      weather_parsers.parse_bbc_forecast('<html><body>Page not found</body></html>', backend)
+    with pytest.raises(ValueError, match='Forecast not found'):
+      weather_parsers.parse_bbc_forecast('<h1 class="wr-c-location__name gel-paragon">Delft</h1>', backend)
+
+def test_weather_forecast_stacker():
+  pages = {'https://www.bbc.com/weather/2759794': fixture('bbc_2759794.html'), 'https://www.bbc.com/weather/2755003': fixture('bbc_2755003.html'),
+           'https://www.geodatos.net/en/coordinates/netherlands/amsterdam': fixture('geodatos_amsterdam.html'),
+           'https://www.geodatos.net/en/coordinates/netherlands/haarlem': fixture('geodatos_haarlem.html')}
+  web = FakeWeb(pages)
+  folder = os.getcwd()
+  with tempfile.TemporaryDirectory() as temporary:
+    weather_http.set_default_client(weather_http.HttpClient(adapter=web))
+    weather_cache.set_default_coordinate_cache(weather_cache.CoordinateCache(os.path.join(temporary, 'coordinates.sqlite')))
+    weather_cache.set_default_forecast_cache(weather_cache.ForecastCache())
+    try:
+      os.chdir(temporary)
+      urls = ['https://www.bbc.com/weather/2759794', 'https://www.bbc.com/weather/2755003']
+      #testing that every city is downloaded once and gets its coordinates
+      forecasts = weather_scraper.weather_forecast_stacker(urls, max_workers=2)
+      assert [row[0] for row in forecasts] == ['Amsterdam', 'Haarlem'] and forecasts[1][2:] == [52.38084, 4.63683]
+      assert [day[1:3] for day in forecasts[0][1]] == amsterdam
+      assert weather_scraper.weather_forecast_stacker(urls) == forecasts
+      #testing that today's map afterwards is served from the forecast cache without downloading again
+      downloads = len(web.requests)
+      assert weather_scraper.weather_array_stacker(urls) == [['Amsterdam', 14, 'Sunny and light winds', 52.37403, 4.88969],
+                                                             ['Haarlem', 13, 'Sunny intervals and a gentle breeze', 52.38084, 4.63683]]
+      assert len(web.requests) == downloads
+      #testing the day selector: one radio layer per day, today shown first, the tiles left out of the selector
+      for mode in weather_scraper.MAP_MODES:
+        html = weather_map.build_forecast_map(forecasts, mode).get_root().render()
+        assert 'L.control.layers' in html and '"Wednesday 23rd"' in html and '"Sunday 3rd"' in html
+        assert 'Amsterdam - 15 - Drizzle and a fresh breeze' in html
+        assert 'Haarlem - 15 - Thick cloud and light winds' in html
+      days = weather_map.forecast_tables(forecasts)
+      assert [date for date, _ in days][:2] == ['Today', 'Tomorrow'] and days[5][1].temperature.tolist() == [15, 14]
+      weather_scraper.map_generator(urls, forecast=True, mode='geojson')
+      with open(weather_scraper.MAP_FILE, encoding='utf-8') as file:
+        assert '"Tomorrow"' in file.read()
+      assert len(web.requests) == downloads+2
+      #testing if errors are raised correctly in edge cases
+      with pytest.raises(ValueError, match='Invalid website'):
+        weather_scraper.bbc_weather_forecast('https://www.cern.home')
+      with pytest.raises(ValueError, match='cannot be generated incrementally'):
+        weather_scraper.map_generator(urls, forecast=True, data_file='weather.json')
+      with pytest.raises(ValueError, match='Invalid number of workers'):
+        weather_scraper.weather_forecast_stacker(urls, max_workers=0)
+      os.chdir(folder)
+    finally:
+      os.chdir(folder)
+      weather_http.set_default_client(None)
+      weather_cache.set_default_coordinate_cache(None)
+      weather_cache.set_default_forecast_cache(None)
+test_parse_bbc_forecast()#running the testing functions so the file can be run as a standalone
+test_weather_forecast_stacker()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import time
+import pytest
+import weather_cache
+import weather_http
+import weather_scraper
+from fake_web import FakeWeb
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class Clock:
+  '''Manually advanced clock for the cache.'''
+  def __init__(self):
+    self.now = 1000.0
+
+  def __call__(self):
+    return self.now
+
+def test_forecast_cache():
+  with open(os.path.join(FIXTURES, 'bbc_2759794.html'), encoding='utf-8') as file:
+    page = file.read()
+  url = 'https://www.bbc.com/weather/2759794'
+  fake = FakeWeb({url: page})
+  weather_http.set_default_client(weather_http.HttpClient(adapter=fake))
+  try:
+    assert weather_cache.location_id(url) == 2759794
+    assert weather_cache.location_id('https://www.bbc.com/weather/') is None
+    #testing that forecasts are served from the cache until the TTL expires
+    clock = Clock()
+    cache = weather_cache.ForecastCache(ttl=60, clock=clock)
+    for _ in range(3):
+      assert weather_scraper.bbc_weather_scraper(url, cache=cache) == ['Amsterdam', 14, 'Sunny and light winds']
+    assert len(fake.requests) == 1
+    clock.now += 61
+    weather_scraper.bbc_weather_scraper(url, cache=cache)
+    assert len(fake.requests) == 2
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 2
+    #testing the least recently used eviction
+    small = weather_cache.ForecastCache(ttl=60, max_entries=2, clock=clock)
+    small.put(1, ['A', 1, 'a'])
+    small.put(2, ['B', 2, 'b'])
+    small.get(1)
+    small.put(3, ['C', 3, 'c'])
+    assert small.get(2) is None and small.get(1) == ['A', 1, 'a'] and small.get(3) == ['C', 3, 'c']
+    assert small.stats()['evictions'] == 1
+    #testing that stale forecasts are served while they are refreshed in the background
+    swr = weather_cache.ForecastCache(ttl=60, stale_while_revalidate=30, clock=clock)
+    swr.put(2759794, ['Amsterdam', 3, 'Old'])
+    clock.now += 70
+    assert weather_scraper.bbc_weather_scraper(url, cache=swr) == ['Amsterdam', 3, 'Old']
+    for _ in range(100):
+      if swr.get(2759794) is not None:
+        break
+      time.sleep(0.01)
+    assert swr.get(2759794) == ['Amsterdam', 14, 'Sunny and light winds']
+    assert swr.stats()['stale_hits'] == 1
+    clock.now += 100
+    assert swr.fetch(2759794, lambda: ['Amsterdam', 20, 'New']) == ['Amsterdam', 20, 'New']
+    #testing that the disk cache is shared between runs and that expired forecasts are dropped
+    with tempfile.TemporaryDirectory() as folder:
+      path = os.path.join(folder, 'forecasts.sqlite3')
+      first = weather_cache.ForecastCache(ttl=60, path=path, clock=clock)
+      first.put(2759794, ['Amsterdam', 14, 'Sunny and light winds'])
+      first.close()
+      second = weather_cache.ForecastCache(ttl=60, path=path, clock=clock)
+      requests_before = len(fake.requests)
+      assert weather_scraper.bbc_weather_scraper(url, cache=second) == ['Amsterdam', 14, 'Sunny and light winds']
+      assert len(fake.requests) == requests_before
+      second.close()
+      clock.now += 61
+      third = weather_cache.ForecastCache(ttl=60, path=path, clock=clock)
+      assert third.get(2759794) is None and len(third) == 0
+      third.close()
+    with pytest.raises(ValueError, match='Invalid cache settings'):
+      weather_cache.ForecastCache(max_entries=0)
+  finally:
+    weather_http.set_default_client(None)
+test_forecast_cache()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import numpy as np
+import pytest
+import weather_history
+import weather_scraper
+
+urls = ['https://www.bbc.com/weather/2759794', 'https://www.bbc.com/weather/2755003']
+rows = [['Amsterdam', 14, 'Sunny', 52.37403, 4.88969], ['Haarlem', 9, 'Fog', 52.38084, 4.63683]]
+
+def test_history_store():
+  original = weather_scraper.bbc_weather_scraper, weather_scraper.dutch_coordinates
+  weather_scraper.bbc_weather_scraper = lambda url: list(rows[urls.index(url)][:3])
+  weather_scraper.dutch_coordinates = lambda city: [row[3:] for row in rows if row[0] == city][0]
+  with tempfile.TemporaryDirectory() as folder:
+    path = os.path.join(folder, 'weather.history')
+    store = weather_history.HistoryStore(path)
+    try:
+      #testing that the stacker appends its rows, to the default store or to the one it is given
+      weather_history.set_default_store(store)
+      weather_scraper.weather_array_stacker(urls)
+      weather_scraper.weather_array_stacker(urls, history=False)
+      assert len(store) == 2
+      weather_history.set_default_store(None)
+      rows[0][1], rows[0][2] = 16, 'Light rain'
+      weather_scraper.weather_array_stacker(urls, max_workers=2, history=store)
+    finally:
+      rows[0][1], rows[0][2] = 14, 'Sunny'
+      weather_history.set_default_store(None)
+      weather_scraper.bbc_weather_scraper, weather_scraper.dutch_coordinates = original
+    #testing the compact records and the history of a city
+    assert os.path.getsize(path) == weather_history.HEADER_SIZE + 4 * 16
+    history = store.history(urls[0])
+    assert [observation[1:] for observation in history] == [[14, 'Sunny'], [16, 'Light rain']]
+    assert history[0][0] <= history[1][0] and store.history(2755003)[1][1:] == [9, 'Fog']
+    #testing snapshots at a moment in time, found by binary search without loading the file
+    store.append([(2759794, 3, 'Snow'), ('2747373', None, 'Drizzle')], timestamp=history[1][0] + 3600)
+    snapshot = store.snapshot(history[1][0])
+    assert snapshot[2759794][1:] == [16, 'Light rain'] and 2747373 not in snapshot
+    latest = store.snapshot()
+    assert latest[2759794][1:] == [3, 'Snow'] and latest[2747373][1:] == [None, 'Drizzle'] and latest[2755003][1:] == [9, 'Fog']
+    assert list(store.snapshot(window=60)) == [2747373, 2759794]
+    assert store.history(urls[0], start=history[1][0]) == store.history(urls[0])[1:]
+    assert store.history(urls[0], end=history[0][0] - 1) == []
+    #testing that a reopened store reads the same records and drops an interrupted append
+    with open(path, 'ab') as file:
+      file.write(b'\x01\x02\x03')
+    reopened = weather_history.HistoryStore(path)
+    assert len(reopened) == 6 and reopened.snapshot() == latest
+    assert isinstance(reopened._records(), np.memmap)
+    reopened.append([(2759794, 4, 'Snow')], timestamp=latest[2759794][0] + 60)
+    assert len(store) == 7 and store.history(2759794)[-1][1:] == [4, 'Snow']#the first store sees the new record
+    assert os.path.getsize(path + '.descriptions') == len('Sunny\nFog\nLight rain\nSnow\nDrizzle\n')
+    #testing that the history of a city follows its own records only, through the index next to the store
+    assert os.path.getsize(path + '.chain') == 7 * 8 and store._indexed == 7
+    assert reopened._chain(7).tolist() == [-1, -1, 0, 1, 2, -1, 4]
+    assert store._records()['location'][[1, 3]].tolist() == [2755003, 2755003]
+    everything = store.history(2759794)
+    locations = store._map
+    try:
+      store._map = locations.copy()
+      store._map['location'][:] = 0 #a scan of the location column would now find nothing
+      store._mapped = len(locations)
+      assert store.history(2759794) == everything and len(everything) == 4
+    finally:
+      store._map = locations
+    assert store.history(2759794, start=everything[1][0], end=everything[2][0]) == everything[1:3]
+    #testing that a missing or outdated index is rebuilt when the store is opened
+    os.remove(path + '.heads')
+    rebuilt = weather_history.HistoryStore(path)
+    assert rebuilt._chain(7).tolist() == [-1, -1, 0, 1, 2, -1, 4] and rebuilt.history(2759794) == everything
+    with open(path + '.heads', 'w', encoding='utf-8') as file:
+      file.write('{"records": 3, "heads": {}}')
+    assert weather_history.HistoryStore(path).history(2755003) == store.history(2755003)
+    rebuilt.close()
+    #testing if errors are raised correctly
+    with pytest.raises(ValueError, match='Observations must be appended in time order'):
+      reopened.append([(2759794, 5, 'Sunny')], timestamp=0)
+    with pytest.raises(ValueError, match='Invalid location'):
+      reopened.history('https://www.cern.home')
+    with open(os.path.join(folder, 'other'), 'wb') as file:
+      file.write(b'not a history file')
+    with pytest.raises(ValueError, match='Not a weather history file'):
+      weather_history.HistoryStore(os.path.join(folder, 'other'))
+    store.close()
+    reopened.close()
+test_history_store()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,36 @@
+import weather_http
+from fake_web import FakeWeb, geodatos_page
+
+def test_http_client():
+  url = 'https://www.geodatos.net/en/coordinates/netherlands/utrecht'
+  page = geodatos_page(52.09083, 5.12222)
+  fake = FakeWeb({url: page}, etags=True)
+  client = weather_http.HttpClient(adapter=fake)
+  #testing that the first request downloads the page and the next ones are answered with 304
+  assert client.get_text(url) == page
+  assert client.get_text(url) == page
+  assert client.get_text(url) == page
+  stats = client.stats()
+  assert stats['requests'] == 3 and stats['not_modified'] == 2
+  assert stats['bytes_downloaded'] == len(page) and stats['bytes_saved'] == 2 * len(page)
+  assert abs(stats['conditional_hit_rate'] - 2 / 3) < 1e-9
+  #testing that a changed page is downloaded again
+  fake.pages[url] = geodatos_page(52.1, 5.1)
+  assert client.get_text(url) == geodatos_page(52.1, 5.1)
+  assert client.stats()['not_modified'] == 2
+  #testing that pages without validators are never sent conditionally
+  plain = FakeWeb({url: page})
+  client = weather_http.HttpClient(adapter=plain, max_cached_bodies=1)
+  client.get_text(url)
+  client.get_text(url)
+  assert client.stats()['not_modified'] == 0 and client.stats()['bytes_downloaded'] == 2 * len(page)
+  #testing that the remembered bodies are bounded
+  other = 'https://www.geodatos.net/en/coordinates/netherlands/delft'
+  fake.pages[other] = page
+  client = weather_http.HttpClient(adapter=fake, max_cached_bodies=1)
+  client.get_text(url)
+  client.get_text(other)
+  client.get_text(url)
+  assert client.stats()['not_modified'] == 0
+  client.close()
+test_http_client()#running the testing function so the file can be run as a standalone
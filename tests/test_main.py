@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import tempfile
+import pytest
+import weather_metrics
+import weather_scraper
+import weather_table
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def test_import_is_cheap():
+  #testing that importing the module neither scrapes, writes files nor loads the heavy dependencies
+  with tempfile.TemporaryDirectory() as folder:
+    code = "import sys, weather_scraper; print(sorted(m for m in ('requests', 'bs4', 'folium', 'numpy') if m in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=folder, env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == '[]'
+    assert os.listdir(folder) == []
+
+def test_main():
+  rows = [['Amsterdam', 14, 'Sunny', 52.37403, 4.88969], ['Haarlem', 9, 'Fog', 52.38084, 4.63683]]
+  calls = []
+  def stacker(url_list, max_workers, per_host_limit, pipeline=None):
+    calls.append((url_list, max_workers, per_host_limit) if pipeline is None else (url_list, pipeline.fetch_workers, pipeline.parse_workers))
+    if url_list[0][0:28] != 'https://www.bbc.com/weather/':
+      raise ValueError('Invalid website')
+    return weather_table.WeatherTable.from_rows(rows[:len(url_list)])
+  original = weather_scraper.weather_table_stacker
+  weather_scraper.weather_table_stacker = stacker
+  try:
+    with tempfile.TemporaryDirectory() as folder:
+      #testing that locations, output path and knobs are passed on
+      output = os.path.join(folder, 'maps', 'today.html')
+      os.makedirs(os.path.dirname(output))
+      assert weather_scraper.main(['2759794', 'https://www.bbc.com/weather/2755003', '-o', output, '--workers', '4', '--per-host', '2', '--mode', 'geojson']) == 0
+      assert calls[-1] == (['https://www.bbc.com/weather/2759794', 'https://www.bbc.com/weather/2755003'], 4, 2)
+      with open(output, encoding='utf-8') as file:
+        assert 'Haarlem - 9 - Fog' in file.read()
+      #testing that --parse-workers hands the download and parse worker counts to a pipeline
+      weather_scraper.main(['2759794', '-o', output, '--workers', '6', '--parse-workers', '3'])
+      assert calls[-1] == (['https://www.bbc.com/weather/2759794'], 6, 3)
+      #testing the default city list
+      weather_scraper.main(['-o', output])
+      assert calls[-1][0] == weather_scraper.url_list
+      #testing that the stage timings are written in the Prometheus format and the instrumentation is switched off again
+      metrics = os.path.join(folder, 'weather.prom')
+      weather_scraper.main(['2759794', '-o', output, '--metrics', metrics])
+      with open(metrics, encoding='utf-8') as file:
+        text = file.read()
+      assert 'weather_stage_seconds_count{stage="map_generator",host=""} 1' in text
+      assert 'weather_stage_seconds_count{stage="map_render",host=""} 1' in text
+      assert weather_metrics.default_recorder() is None
+      #testing that scraping errors end the program with a message instead of a traceback
+      with pytest.raises(SystemExit) as exit:
+        weather_scraper.main(['https://www.cern.home', '-o', output])
+      assert exit.value.code == 1
+      #testing that the options the daemon cannot use are refused instead of ignored
+      for options in (['--stream'], ['--workers', '4'], ['--parse-workers', '2'], ['--per-host', '1']):
+        with pytest.raises(SystemExit) as exit:
+          weather_scraper.main(['2759794', '-o', output, '--daemon'] + options)
+        assert exit.value.code == 2
+      #testing that a deadline of zero is refused instead of replaced by the default one
+      with pytest.raises(SystemExit) as exit:
+        weather_scraper.main(['2759794', '-o', output, '--timeout', '0'])
+      assert exit.value.code == 2
+  finally:
+    weather_scraper.weather_table_stacker = original
+test_import_is_cheap()#running the testing functions so the file can be run as a standalone
+test_main()
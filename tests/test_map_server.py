@@ -0,0 +1,83 @@
+import gzip
+import http.client
+import os
+import tempfile
+import threading
+import pytest
+import weather_daemon
+import weather_server
+
+def request(server, path, headers={}, method='GET'):
+  connection = http.client.HTTPConnection(*server.address, timeout=10)
+  try:
+    connection.request(method, path, headers=headers)
+    response = connection.getresponse()
+    return response.status, dict(response.getheaders()), response.read()
+  finally:
+    connection.close()
+
+def test_map_server():
+  page = '<html><body>' + 'Amsterdam 14 Sunny ' * 200 + '</body></html>'
+  server = weather_server.MapServer(port=0)
+  server.start()
+  try:
+    assert server.publish('netherlands_weather_map.html', page) is True
+    assert server.publish('netherlands_weather_map.html', page) is False #unchanged content keeps its tag
+    assert server.publish('data.json', '{}') is True
+    #testing the pre-compressed variants and the headers
+    status, headers, body = request(server, '/', {'Accept-Encoding': 'gzip, deflate'})
+    assert status == 200 and headers['Content-Encoding'] == 'gzip' and gzip.decompress(body) == page.encode()
+    assert headers['Content-Type'] == 'text/html; charset=utf-8' and headers['Vary'] == 'Accept-Encoding'
+    etag = headers['ETag']
+    status, headers, body = request(server, '/netherlands_weather_map.html?v=2', {'Accept-Encoding': 'gzip;q=0'})
+    assert status == 200 and 'Content-Encoding' not in headers and body == page.encode()
+    #testing that every coding has its own strong tag
+    assert etag == headers['ETag'][:-1] + '-gz"'
+    status, headers, body = request(server, '/data.json', {'Accept-Encoding': 'gzip'})
+    assert body == b'{}' and 'Content-Encoding' not in headers and headers['Content-Type'] == 'application/json; charset=utf-8'
+    status, headers, body = request(server, '/', method='HEAD')
+    assert status == 200 and body == b'' and headers['Content-Length'] == str(len(page))
+    #testing revalidation with the tag of any coding and unknown paths
+    status, headers, body = request(server, '/', {'If-None-Match': f'"other", W/{etag}'})
+    assert status == 304 and body == b'' and headers['ETag'] == etag[:-4] + '"'
+    status, headers, body = request(server, '/', {'If-None-Match': etag[:-4] + '"', 'Accept-Encoding': 'gzip'})
+    assert status == 304 and headers['ETag'] == etag
+    assert request(server, '/missing.html')[0] == 404
+    #testing that renders are swapped in while viewers keep requesting, every viewer gets one complete version
+    versions = {page.replace('14', str(temperature)).encode() for temperature in range(20)}
+    bodies = []
+    def viewer():
+      for _ in range(20):
+        bodies.append(gzip.decompress(request(server, '/', {'Accept-Encoding': 'gzip'})[2]))
+    viewers = [threading.Thread(target=viewer) for _ in range(8)]
+    for thread in viewers:
+      thread.start()
+    for temperature in range(20):
+      server.publish('netherlands_weather_map.html', page.replace('14', str(temperature)))
+    for thread in viewers:
+      thread.join()
+    assert len(bodies) == 160 and set(bodies) <= versions
+    stats = server.stats()
+    assert stats['gzip']['responses'] == 161 and stats['not_modified']['responses'] == 2 and stats['not_found']['responses'] == 1
+    assert stats['files'] == 2 and stats['publishes'] == 22
+    #testing that the daemon publishes every render
+    with tempfile.TemporaryDirectory() as folder:
+      output = os.path.join(folder, 'map.html')
+      other = weather_server.MapServer(port=0, index='map.html', root=folder)
+      try:
+        daemon = weather_daemon.RefreshDaemon(['https://www.bbc.com/weather/2759794'], output=output, server=other)
+        daemon.rows['https://www.bbc.com/weather/2759794'] = ['Amsterdam', 14, 'Sunny', 52.37403, 4.88969]
+        daemon.render()
+        assert other.lookup('/').bodies['identity'] == open(output, 'rb').read()
+        assert other.lookup('/map.html') is other.lookup('/') and other.publish_map(output) == 0
+      finally:
+        other.close()
+    #testing if errors are raised correctly
+    with pytest.raises(ValueError, match='Invalid port'):
+      weather_server.MapServer(port=70000)
+    with pytest.raises(ValueError, match='Invalid input data type'):
+      server.publish('map.html', None)
+  finally:
+    server.close()
+
+test_map_server()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from weather_scraper import marker_colour, marker_colours
+
+def test_marker_colours():
+  #testing that the batch function agrees with the thresholds of marker_colour
+  temperatures = np.arange(-30, 45)
+  expected = ['blue' if t < 10 else 'green' if t < 20 else 'red' for t in temperatures.tolist()]
+  assert marker_colours(temperatures).tolist() == expected
+  assert marker_colours([9.99, 10.0, 19.5, 20.0]).tolist() == ['blue', 'green', 'green', 'red']
+  #testing user supplied bins and missing values
+  assert marker_colours([-5, 0, 25, 40], edges=[0, 30], palette=['cyan', 'yellow', 'darkred']).tolist() == ['cyan', 'yellow', 'yellow', 'darkred']
+  assert marker_colours([np.nan, 12.0]).tolist() == ['gray', 'green']
+  #testing the continuous colormap
+  assert marker_colours([-10, 0, 5, 10, 50], edges=[0, 10], palette=['#0000ff', '#ff0000'], continuous=True).tolist() == ['#0000ff', '#0000ff', '#800080', '#ff0000', '#ff0000']
+  assert marker_colours([15], edges=[10, 15, 20], palette=['blue', 'white', 'red'], continuous=True).tolist() == ['#ffffff']
+  #testing that the scalar wrapper accepts floats and numpy numbers
+  assert marker_colour(np.int64(5)) == 'blue' and marker_colour(15.5) == 'green' and marker_colour(np.float32(25)) == 'red'
+  assert marker_colour(15, edges=[16], palette=['a', 'b']) == 'a' and marker_colour(float('nan')) == 'gray'
+  #testing if errors are raised correctly in edge cases
+  with pytest.raises(ValueError, match="Invalid input data type"):
+    marker_colours(['cat'])
+  with pytest.raises(ValueError, match="Invalid input data type"):
+    marker_colour(True)
+  with pytest.raises(ValueError, match="Invalid input data type"):
+    marker_colour('cat')
+  with pytest.raises(ValueError, match="Invalid temperature edges"):
+    marker_colours([1], edges=[20, 10])
+  with pytest.raises(ValueError, match="Invalid temperature edges"):
+    marker_colour(15, edges=[20, 10])
+  with pytest.raises(ValueError, match="Palette needs one colour more than there are edges"):
+    marker_colours([1], palette=['blue', 'red'])
+  with pytest.raises(ValueError, match="Palette needs one colour per edge"):
+    marker_colours([1], continuous=True)
+  with pytest.raises(ValueError, match="Invalid colour teal"):
+    marker_colours([1], edges=[0, 1], palette=['teal', 'red'], continuous=True)
+test_marker_colours()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,108 @@
+import json
+import logging
+import os
+import tempfile
+import time
+import pytest
+import weather_cache
+import weather_http
+import weather_metrics
+import weather_scraper
+from fake_web import FakeWeb
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def fixture(name):
+  with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+    return file.read()
+
+class Events(logging.Handler):
+  def __init__(self):
+    super().__init__()
+    self.lines = []
+
+  def emit(self, record):
+    self.lines.append(record.getMessage())
+
+def test_metrics():
+  #testing that disabled instrumentation records nothing and hands out the shared do-nothing stage
+  assert weather_metrics.default_recorder() is None
+  with weather_metrics.stage('dutch_coordinates', city='Delft') as event:
+    event.set(cache='hit')
+  assert event.enabled is False
+  assert weather_metrics.stage('bbc_weather_scraper') is event
+  pages = {'https://www.bbc.com/weather/2759794': fixture('bbc_2759794.html'), 'https://www.bbc.com/weather/2755003': fixture('bbc_2755003.html'),
+           'https://www.geodatos.net/en/coordinates/netherlands/amsterdam': fixture('geodatos_amsterdam.html'),
+           'https://www.geodatos.net/en/coordinates/netherlands/haarlem': fixture('geodatos_haarlem.html')}
+  logger = logging.getLogger('test_metrics')
+  logger.setLevel(logging.INFO)
+  handler = Events()
+  logger.addHandler(handler)
+  recorder = weather_metrics.MetricsRecorder(logger=logger)
+  with tempfile.TemporaryDirectory() as folder:
+    weather_http.set_default_client(weather_http.HttpClient(adapter=FakeWeb(pages)))
+    weather_cache.set_default_coordinate_cache(weather_cache.CoordinateCache(os.path.join(folder, 'coordinates.sqlite')))
+    weather_cache.set_default_forecast_cache(weather_cache.ForecastCache())
+    weather_metrics.set_default_recorder(recorder)
+    try:
+      urls = ['https://www.bbc.com/weather/2759794', 'https://www.bbc.com/weather/2755003']
+      rows = weather_scraper.weather_array_stacker(urls)
+      assert weather_scraper.weather_array_stacker(urls, max_workers=2) == rows
+      with pytest.raises(ValueError, match='Location not found'):
+        weather_scraper.bbc_weather_scraper('https://www.bbc.com/weather/0488508')
+      weather_scraper.map_generator(urls, output=os.path.join(folder, 'map.html'))
+    finally:
+      weather_metrics.set_default_recorder(None)
+      weather_http.set_default_client(None)
+      weather_cache.set_default_coordinate_cache(None)
+      weather_cache.set_default_forecast_cache(None)
+      logger.removeHandler(handler)
+  #testing the counters: every forecast and every city is only downloaded once, the failing page once too
+  stats = recorder.stats()
+  assert stats['bbc_weather_scraper']['count'] == 7
+  assert stats['bbc_weather_scraper']['cache_misses'] == 3
+  assert stats['bbc_weather_scraper']['cache_hits'] == 4
+  assert stats['bbc_weather_scraper']['errors'] == 1
+  assert stats['dutch_coordinates']['cache_misses'] == 2
+  assert stats['dutch_coordinates']['cache_hits'] == 4
+  assert stats['http']['count'] == 5
+  assert stats['http']['bytes'] == sum(len(page.encode('utf-8')) for page in pages.values())+len(b'<html><body>Page not found</body></html>')
+  assert stats['bbc_parse']['count'] == 3 and stats['bbc_parse']['errors'] == 1
+  assert stats['geodatos_parse']['count'] == 2
+  assert stats['weather_array_stacker']['count'] == 3
+  assert stats['map_generator']['count'] == 1 and stats['map_render']['count'] == 1
+  #testing the structured log events and the Prometheus export
+  events = [json.loads(line) for line in handler.lines]
+  assert len(events) == sum(stage['count'] for stage in stats.values())
+  assert any({'stage': 'dutch_coordinates', 'host': 'www.geodatos.net', 'city': 'Haarlem', 'cache': 'miss'}.items() <= event.items() for event in events)
+  assert [event['error'] for event in events if 'error' in event] == ['ValueError', 'ValueError']
+  text = recorder.prometheus_text()
+  assert 'weather_stage_seconds_count{stage="bbc_weather_scraper",host="www.bbc.com",city="Amsterdam"} 3' in text
+  assert 'weather_cache_requests_total{stage="dutch_coordinates",host="www.geodatos.net",city="Haarlem",result="miss"} 1' in text
+  assert 'weather_stage_errors_total{stage="bbc_weather_scraper",host="www.bbc.com",error="ValueError"} 1' in text
+  assert 'weather_stage_seconds_bucket{stage="map_render",host="",le="+Inf"} 1' in text
+  #testing that the background refresh of a stale forecast is recorded as its own stage, the call itself as a hit
+  recorder = weather_metrics.MetricsRecorder()
+  now = [0.0]
+  cache = weather_cache.ForecastCache(ttl=10, stale_while_revalidate=100, clock=lambda: now[0])
+  cache.put(2759794, ['Amsterdam', 3, 'Fog'])
+  now[0] = 20
+  weather_http.set_default_client(weather_http.HttpClient(adapter=FakeWeb(pages)))
+  weather_metrics.set_default_recorder(recorder)
+  try:
+    assert weather_scraper.bbc_weather_scraper('https://www.bbc.com/weather/2759794', cache=cache) == ['Amsterdam', 3, 'Fog']
+    while cache.get(2759794) is None:
+      time.sleep(0.01)
+  finally:
+    weather_metrics.set_default_recorder(None)
+    weather_http.set_default_client(None)
+  stats = recorder.stats()
+  assert stats['bbc_weather_scraper']['cache_hits'] == 1 and stats['bbc_weather_scraper']['cache_misses'] == 0
+  assert stats['bbc_weather_revalidate']['count'] == 1 and cache.get(2759794)[1] == 14
+  #testing that city labels can be dropped for large station sets
+  recorder = weather_metrics.MetricsRecorder(city_labels=False)
+  recorder.record({'stage': 'dutch_coordinates', 'host': 'www.geodatos.net', 'city': 'De "Bilt"', 'seconds': 0.002})
+  recorder.record({'stage': 'dutch_coordinates', 'host': 'www.geodatos.net', 'city': 'Delft', 'seconds': 0.5})
+  assert 'weather_stage_seconds_bucket{stage="dutch_coordinates",host="www.geodatos.net",le="0.0025"} 1' in recorder.prometheus_text()
+  assert 'weather_stage_seconds_count{stage="dutch_coordinates",host="www.geodatos.net"} 2' in recorder.prometheus_text()
+test_metrics()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,59 @@
+import os
+import pytest
+import weather_http
+import weather_parsers
+import weather_scraper
+from fake_web import FakeWeb
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def fixture(name):
+  with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+    return file.read()
+
+def test_parsers():
+  #testing that all backends agree on the recorded pages
+  for name, expected in [('bbc_2759794.html', ['Amsterdam', 14, 'Sunny and light winds']), ('bbc_2755003.html', ['Haarlem', 13, 'Sunny intervals and a gentle breeze'])]:
+    for backend in weather_parsers.BACKENDS:
+      assert weather_parsers.parse_bbc_page(fixture(name), backend) == expected
+  for backend in weather_parsers.BACKENDS:
+    assert weather_parsers.parse_geodatos_page(fixture('geodatos_amsterdam.html'), backend) == [52.37403, 4.88969]
+    assert weather_parsers.parse_geodatos_page('<html><p>Not found</p></html>', backend) is None
+  #testing that the streaming tokenizer copes with text and tags split over chunk boundaries
+  chunk_size = weather_parsers.STREAM_CHUNK_SIZE
+  try:
+    for weather_parsers.STREAM_CHUNK_SIZE in [3, 7, 64]:
+      assert weather_parsers.parse_bbc_page(fixture('bbc_2759794.html'), 'stream') == ['Amsterdam', 14, 'Sunny and light winds']
+      assert weather_parsers.parse_geodatos_page(fixture('geodatos_haarlem.html'), 'stream') == [52.38084, 4.63683]
+  finally:
+    weather_parsers.STREAM_CHUNK_SIZE = chunk_size
+  #testing that only the first day is read and that nested markup is handled like BeautifulSoup does
+  page = ('<h1 class="wr-c-location__name  gel-paragon">Delft<span>!</span></h1><br><img src="a.png">'
+          '<div class="wr-day__details x"><div><span class="wr-value--temperature--c"><span aria-hidden="true">7</span>&deg;</span></div>'
+          '<p class="wr-day__details__weather-type-description"> Fog </p></div>'
+          '<div class="wr-day__details"><span class="wr-value--temperature--c">30</span></div>')
+  for backend in weather_parsers.BACKENDS:
+    assert weather_parsers.parse_bbc_page(page, backend) == ['Delft', 7, 'Fog']
+  #testing that temperatures below zero keep their sign, written with a hyphen or with &minus;
+  for sign in ['-', '&minus;', '\u2212']:
+    frost = page.replace('<span aria-hidden="true">7</span>', f'<span aria-hidden="true">{sign}7</span>')
+    for backend in weather_parsers.BACKENDS:
+      assert weather_parsers.parse_bbc_page(frost, backend) == ['Delft', -7, 'Fog']
+  #testing if errors are raised correctly in edge cases
+  for backend in weather_parsers.BACKENDS:
+    with pytest.raises(ValueError, match='Location not found'):
+      weather_parsers.parse_bbc_page('<html><body>Page not found</body></html>', backend)
+    with pytest.raises(ValueError, match='Forecast not found'):
+      weather_parsers.parse_bbc_page('<h1 class="wr-c-location__name gel-paragon">Delft</h1>', backend)
+  with pytest.raises(ValueError, match='Invalid parser backend'):
+    weather_parsers.parse_bbc_page(page, 'regex')
+  #testing the scrapers on top of the parsers
+  weather_http.set_default_client(weather_http.HttpClient(adapter=FakeWeb({'https://www.bbc.com/weather/2759794': fixture('bbc_2759794.html')})))
+  try:
+    for backend in weather_parsers.BACKENDS:
+      assert weather_scraper.bbc_weather_scraper('https://www.bbc.com/weather/2759794', backend, cache=False) == ['Amsterdam', 14, 'Sunny and light winds']
+    with pytest.raises(ValueError, match='Location not found'):
+      weather_scraper.bbc_weather_scraper('https://www.bbc.com/weather/0488508')
+  finally:
+    weather_http.set_default_client(None)
+test_parsers()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import pytest
+import weather_cache
+import weather_http
+import weather_pipeline
+import weather_scraper
+from fake_web import FakeWeb, geodatos_page
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def fixture(name):
+  with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+    return file.read()
+
+def stations(count):
+  '''Pages of `count` stations, built from the recorded Amsterdam page with the city renamed.'''
+  html = fixture('bbc_2759794.html')
+  pages = {}
+  for station in range(count):
+    pages[f'https://www.bbc.com/weather/{3000000 + station}'] = html.replace('Amsterdam', f'Station {station}')
+    pages[f'https://www.geodatos.net/en/coordinates/netherlands/station-{station}'] = geodatos_page(51.0 + station / 100, 4.0 + station / 100)
+  return pages
+
+def test_pipelined_stacker():
+  pages = stations(30)
+  urls = [url for url in pages if 'bbc' in url]
+  with tempfile.TemporaryDirectory() as folder:
+    web = FakeWeb(pages)
+    weather_http.set_default_client(weather_http.HttpClient(adapter=web))
+    weather_cache.set_default_coordinate_cache(weather_cache.CoordinateCache(os.path.join(folder, 'coordinates.sqlite')))
+    weather_cache.set_default_forecast_cache(False)
+    try:
+      expected = weather_scraper.weather_array_stacker(urls)
+      assert expected[7] == ['Station 7', 14, 'Sunny and light winds', 51.07, 4.07]
+      weather_cache.set_default_coordinate_cache(weather_cache.CoordinateCache(os.path.join(folder, 'empty.sqlite')))
+      #testing that both stages give the rows of the stacker, in order, with parsing in threads and in processes
+      for processes in (False, True):
+        pipeline = weather_pipeline.PipelinedStacker(fetch_workers=4, parse_workers=2, queue_size=3, processes=processes)
+        try:
+          assert weather_scraper.weather_array_stacker(urls, pipeline=pipeline) == expected
+        finally:
+          pipeline.close()
+        stats = pipeline.stats()
+        assert stats['fetch']['workers'] == 4 and stats['parse']['workers'] == 2
+        assert 0 < stats['parse']['utilisation'] <= 1 and stats['queue_peak'] <= 3
+        if not processes:
+          assert stats['fetch']['pages'] == 60 and stats['parse']['pages'] == 60
+        else:
+          #the coordinates stored by the first run are not downloaded again
+          assert stats['fetch']['pages'] == 30 and stats['parse']['pages'] == 30
+      #testing that cached forecasts are not downloaded and the results land in the forecast cache
+      weather_cache.set_default_forecast_cache(weather_cache.ForecastCache())
+      pipeline = weather_pipeline.PipelinedStacker(fetch_workers=2, parse_workers=1, processes=False)
+      assert pipeline.run(urls[:5]) == expected[:5]
+      assert pipeline.run(urls) == expected and pipeline.stats()['fetch']['pages'] == 25
+      #testing that the first failing city aborts the run and its error is raised
+      with pytest.raises(ValueError, match='Location not found'):
+        pipeline.run(urls[5:] + ['https://www.bbc.com/weather/0488508'])
+      with pytest.raises(ValueError, match='Invalid website'):
+        pipeline.run(['https://www.cern.home'])
+      with pytest.raises(ValueError, match='Invalid input'):
+        pipeline.run([])
+    finally:
+      weather_http.set_default_client(None)
+      weather_cache.set_default_coordinate_cache(None)
+      weather_cache.set_default_forecast_cache(None)
+  with pytest.raises(ValueError, match='Invalid number of workers'):
+    weather_pipeline.PipelinedStacker(fetch_workers=0)
+  with pytest.raises(ValueError, match='Invalid queue size'):
+    weather_pipeline.PipelinedStacker(queue_size=0)
+  with pytest.raises(ValueError, match='Invalid parser backend'):
+    weather_pipeline.PipelinedStacker(backend='lxml')
+test_pipelined_stacker()#running the testing function so the file can be run as a standalone
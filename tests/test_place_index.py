@@ -0,0 +1,94 @@
+import os
+import tempfile
+import pytest
+import weather_cache
+import weather_http
+import weather_pipeline
+import weather_places
+import weather_scraper
+from fake_web import FakeWeb
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+#lines of a GeoNames country dump: id, name, ascii name, alternate names, latitude, longitude, feature class, ..., population
+DUMP = [
+  ['2759794', 'Amsterdam', 'Amsterdam', 'Amsterdão,Mokum', '52.37403', '4.88969', 'P', 'PPLC'] + [''] * 6 + ['741636'],
+  ['2759661', 'Amstelveen', 'Amstelveen', '', '52.30083', '4.86389', 'P', 'PPL'] + [''] * 6 + ['85718'],
+  ['2747373', 'Den Haag', 'Den Haag', "'s-Gravenhage,The Hague", '52.07667', '4.29861', 'P', 'PPLG'] + [''] * 6 + ['474292'],
+  ['2759797', 'Amstel', 'Amstel', '', '52.30000', '4.90000', 'H', 'STM'] + [''] * 6 + ['0'],
+  ['9999999', 'Bergen', 'Bergen', '', '51.59000', '5.93000', 'P', 'PPL'] + [''] * 6 + ['13000'],
+  ['2758996', 'Bergen', 'Bergen', '', '52.66917', '4.70556', 'P', 'PPL'] + [''] * 6 + ['30000'],
+]
+
+def test_place_index():
+  #testing the normalised keys, accents and whitespace do not matter
+  assert weather_places.normalise_place(' Den  Haag ') == 'den-haag'
+  assert weather_places.normalise_place('Amsterdão') == 'amsterdao'
+  #testing the bundled places and their aliases
+  index = weather_places.PlaceIndex(weather_places._read_places(weather_places.PLACES.splitlines()))
+  assert index.resolve('Den Haag') == ('The Hague', 2747373, 52.07667, 4.29861)
+  assert index.get("'s-Gravenhage") == index.get('the hague') and 'UTRECHT' in index
+  assert index.get('Atlantis') is None
+  with pytest.raises(ValueError, match='Unknown place Atlantis'):
+    index.resolve('Atlantis')
+  #testing that every municipality of the gazetteer and every default city is bundled, with its coordinates
+  gazetteer = weather_cache.load_gazetteer()
+  for key, coordinates in gazetteer.items():
+    assert list(index.resolve(key)[2:]) == coordinates
+  names = ['Amsterdam', 'Haarlem', 'Den Haag', 'Utrecht', 'Zwolle', 'Gouda', 'Apeldoorn', 'Groningen', 'Lelystad', 'Deventer', 'Emmen']
+  assert [weather_scraper.resolve_location(name)[0] for name in names] == weather_scraper.url_list
+  with tempfile.TemporaryDirectory() as folder:
+    #testing an index built from a GeoNames dump, only populated places are kept
+    dump = os.path.join(folder, 'NL.txt')
+    with open(dump, 'w', encoding='utf-8') as file:
+      file.write(''.join('\t'.join(line) + '\n' for line in DUMP))
+    path = os.path.join(folder, 'places.tsv')
+    assert weather_places.build_place_index(dump, path) == 5
+    built = weather_places.PlaceIndex.load(path)
+    assert built.resolve('Mokum')[1] == 2759794 and built.resolve('amsterdao')[1] == 2759794
+    assert built.resolve('The Hague') == ('Den Haag', 2747373, 52.07667, 4.29861)
+    assert built.get('Amstel') is None
+    assert built.resolve('Bergen')[1] == 2758996 #the largest place of that name
+    #testing the prefix search, largest population first and every place once
+    assert [place[0] for place in built.search('ams')] == ['Amsterdam', 'Amstelveen']
+    assert built.search('ams', limit=1) == [built.resolve('Amsterdam')] and built.search('zz') == []
+    #testing that the default index reads the built file from the cache directory
+    environment = os.environ.get('WEATHER_MAP_CACHE_DIR')
+    os.environ['WEATHER_MAP_CACHE_DIR'] = folder
+    weather_places.set_default_place_index(None)
+    try:
+      assert weather_places.build_place_index(dump) == 5
+      assert weather_places.default_place_index().resolve('Mokum')[0] == 'Amsterdam'
+    finally:
+      if environment is None:
+        del os.environ['WEATHER_MAP_CACHE_DIR']
+      else:
+        os.environ['WEATHER_MAP_CACHE_DIR'] = environment
+      weather_places.set_default_place_index(None)
+
+def test_resolved_names():
+  #testing that URLs and IDs pass through and names are resolved without any request
+  assert weather_scraper.resolve_location('https://www.cern.home') == ('https://www.cern.home', None)
+  assert weather_scraper.resolve_location('2759794') == ('https://www.bbc.com/weather/2759794', None)
+  assert weather_scraper.resolve_location('Utrecht') == ('https://www.bbc.com/weather/2745912', [52.09083, 5.12222])
+  with open(os.path.join(FIXTURES, 'bbc_2759794.html'), encoding='utf-8') as file:
+    web = FakeWeb({'https://www.bbc.com/weather/2759794': file.read()}) #no geodatos.net pages at all
+  weather_http.set_default_client(weather_http.HttpClient(adapter=web))
+  weather_cache.set_default_forecast_cache(False)
+  try:
+    #testing that every stacker takes its coordinates from the index instead of geodatos.net
+    expected = [['Amsterdam', 14, 'Sunny and light winds', 52.37403, 4.88969]] * 2
+    assert weather_scraper.weather_array_stacker(['Amsterdam', 'amsterdam']) == expected
+    assert weather_scraper.weather_array_stacker(['Amsterdam', 'amsterdam'], max_workers=2) == expected
+    pipeline = weather_pipeline.PipelinedStacker(fetch_workers=2, parse_workers=1, processes=False)
+    assert pipeline.run(['Amsterdam', 'amsterdam']) == expected
+    assert [row for _, _, row, _ in weather_scraper.weather_array_stream(['Amsterdam'])] == expected[:1]
+    assert not [url for url in web.requests if 'geodatos' in url]
+    with pytest.raises(ValueError, match='Unknown place Atlantis'):
+      weather_scraper.weather_array_stacker(['Atlantis'])
+  finally:
+    weather_http.set_default_client(None)
+    weather_cache.set_default_forecast_cache(None)
+
+test_place_index()#running the testing function so the file can be run as a standalone
+test_resolved_names()
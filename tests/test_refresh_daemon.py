@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+import pytest
+import weather_daemon
+import weather_scraper
+
+weather = {'https://www.bbc.com/weather/2759794': ['Amsterdam', 14, 'Sunny'], 'https://www.bbc.com/weather/2755003': ['Haarlem', 9, 'Fog'],
+           'https://www.bbc.com/weather/2747373': ['The Hague', 11, 'Drizzle'], 'https://www.bbc.com/weather/2745912': ['Utrecht', 12, 'Fog']}
+coordinates = {'Amsterdam': [52.37403, 4.88969], 'Haarlem': [52.38084, 4.63683], 'The Hague': [52.07667, 4.29861], 'Utrecht': [52.09083, 5.12222]}
+
+def test_refresh_daemon():
+  calls = []
+  failing = set()
+  def scraper(url, backend=None, cache=None):
+    calls.append((url, cache))
+    if url in failing:
+      raise ValueError('Location not found')
+    return list(weather[url])
+  original = weather_scraper.bbc_weather_scraper, weather_scraper.dutch_coordinates
+  weather_scraper.bbc_weather_scraper = scraper
+  weather_scraper.dutch_coordinates = lambda city: list(coordinates[city])
+  now = [1000.0]
+  try:
+    with tempfile.TemporaryDirectory() as folder:
+      data = os.path.join(folder, 'weather.json')
+      shell = os.path.join(folder, 'map.html')
+      urls = list(weather)
+      daemon = weather_daemon.RefreshDaemon(urls+urls[:1], interval=100, jitter=0.1, startup=40, output=shell, data_file=data, clock=lambda: now[0], seed=1)
+      #testing that the first refreshes are spread over the start-up period and that the forecast cache is bypassed
+      assert daemon.tick() == 1000+weather_daemon.RENDER_DELAY
+      assert calls == [(urls[0], False)]
+      now[0] = 1002
+      assert daemon.tick() == 1010
+      assert daemon.stats() == {'refreshes': 1, 'changes': 1, 'errors': 0, 'renders': 1}
+      with open(data, encoding='utf-8') as file:
+        assert list(json.load(file)['stations']) == ['2759794']
+      assert os.path.exists(shell)
+      #testing that changes arriving together give a single render
+      now[0] = 1035
+      assert daemon.tick() == 1037
+      now[0] = 1037
+      daemon.tick()
+      assert daemon.stats() == {'refreshes': 4, 'changes': 4, 'errors': 0, 'renders': 2}
+      with open(data, encoding='utf-8') as file:
+        assert json.load(file)['stations']['2745912']['popup'] == 'Utrecht - 12 - Fog'
+      #testing that every city is due again after a jittered interval, so the requests stay spread
+      due = sorted(time for time, _ in daemon._schedule)
+      assert due[0] >= 1000+90 and due[-1] <= 1035+110 and len(set(due)) == 4
+      #testing that unchanged refreshes do not render anything
+      os.utime(data, (0, 0))
+      now[0] = 1200
+      daemon.tick()
+      now[0] = 1250
+      assert daemon.tick() > 1250
+      assert daemon.stats() == {'refreshes': 8, 'changes': 4, 'errors': 0, 'renders': 2}
+      assert os.path.getmtime(data) == 0
+      #testing that a changed city is rendered and a failing city keeps its last weather and is retried sooner
+      weather['https://www.bbc.com/weather/2755003'][1] = 12
+      failing.add('https://www.bbc.com/weather/2747373')
+      now[0] = 1400
+      daemon.tick()
+      now[0] = 1405
+      daemon.tick()
+      assert daemon.stats() == {'refreshes': 11, 'changes': 5, 'errors': 1, 'renders': 3}
+      with open(data, encoding='utf-8') as file:
+        stations = json.load(file)['stations']
+      assert stations['2755003']['temperature'] == 12 and stations['2747373']['city'] == 'The Hague'
+      #testing that the refreshed rows can be queried by coordinates
+      (url, row, distance), = daemon.weather_at(52.38, 4.64)
+      assert url == 'https://www.bbc.com/weather/2755003' and row[1] == 12 and distance < 1
+      assert [url for url, _, _ in daemon.weather_at(52.1, 4.3, k=2)] == ['https://www.bbc.com/weather/2747373', 'https://www.bbc.com/weather/2755003']
+      assert [time for time, url in daemon._schedule if url in failing] == [1400+10]
+      #testing that run() returns on stop() and still renders the changes it collected
+      failing.clear()
+      stop = len(calls)+len(urls)
+      output = os.path.join(folder, 'complete.html')
+      daemon = weather_daemon.RefreshDaemon(urls, interval=60, startup=0, output=output, surface=True)
+      def stopping(url, backend=None, cache=None):
+        if len(calls)+1 == stop:
+          daemon.stop()
+        return scraper(url, backend, cache)
+      weather_scraper.bbc_weather_scraper = stopping
+      daemon.run()
+      assert daemon.stats()['renders'] == 1
+      with open(output, encoding='utf-8') as file:
+        html = file.read()
+      assert 'Utrecht - 12 - Fog' in html and 'L.imageOverlay' in html
+      #testing if errors are raised correctly in edge cases
+      with pytest.raises(ValueError, match='Invalid schedule'):
+        weather_daemon.RefreshDaemon(urls, interval=0)
+      with pytest.raises(ValueError, match='Invalid schedule'):
+        weather_daemon.RefreshDaemon(urls, jitter=1)
+      with pytest.raises(ValueError, match='Invalid map mode'):
+        weather_daemon.RefreshDaemon(urls, mode='heatmap')
+      with pytest.raises(ValueError, match='Invalid input'):
+        weather_daemon.RefreshDaemon([])
+  finally:
+    weather['https://www.bbc.com/weather/2755003'][1] = 9
+    weather_scraper.bbc_weather_scraper, weather_scraper.dutch_coordinates = original
+test_refresh_daemon()#running the testing function so the file can be run as a standalone
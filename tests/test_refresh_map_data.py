@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+import weather_map
+import weather_scraper
+import weather_table
+
+url_list = ['https://www.bbc.com/weather/2759794', 'https://www.bbc.com/weather/2755003']
+rows = [['Amsterdam', 14, 'Sunny', 52.37403, 4.88969], ['Haarlem', 9, 'Fog', 52.38084, 4.63683]]
+
+def test_refresh_map_data():
+  original = weather_scraper.weather_table_stacker
+  weather_scraper.weather_table_stacker = lambda url_list, max_workers, per_host_limit, pipeline=None: weather_table.WeatherTable.from_rows(rows[:len(url_list)])
+  folder = os.getcwd()
+  umask = os.umask(0o022)
+  try:
+    with tempfile.TemporaryDirectory() as temporary:
+      os.chdir(temporary)
+      #testing that the first run writes the shell and the data file, readable by a web server running as another user
+      os.makedirs('data')
+      weather_scraper.map_generator(url_list, data_file='data/weather.json')
+      assert os.stat('data/weather.json').st_mode & 0o777 == 0o644 and os.stat(weather_scraper.MAP_FILE).st_mode & 0o777 == 0o644
+      with open(weather_scraper.MAP_FILE, encoding='utf-8') as file:
+        shell = file.read()
+      assert 'fetch("data/weather.json"' in shell and 'Amsterdam' not in shell
+      with open('data/weather.json', encoding='utf-8') as file:
+        stations = json.load(file)['stations']
+      assert stations['2759794']['popup'] == 'Amsterdam - 14 - Sunny' and stations['2755003']['colour'] == 'blue'
+      #testing that an unchanged refresh does not touch any file
+      os.utime('data/weather.json', (0, 0))
+      os.utime(weather_scraper.MAP_FILE, (0, 0))
+      weather_scraper.map_generator(url_list, data_file='data/weather.json')
+      assert os.path.getmtime('data/weather.json') == 0 and os.path.getmtime(weather_scraper.MAP_FILE) == 0
+      assert weather_map.refresh_map_data(url_list, 'data/weather.json') == []
+      #testing that only the changed and removed stations are reported and the file is replaced
+      rows[1][1] = 12
+      assert weather_map.refresh_map_data(url_list, 'data/weather.json') == ['2755003']
+      assert os.path.getmtime('data/weather.json') != 0
+      os.chmod('data/weather.json', 0o640) #a replaced file keeps the permissions it was given
+      assert weather_map.refresh_map_data(url_list[:1], 'data/weather.json') == ['2755003']
+      assert os.stat('data/weather.json').st_mode & 0o777 == 0o640
+      with open('data/weather.json', encoding='utf-8') as file:
+        assert list(json.load(file)['stations']) == ['2759794']
+      assert sorted(os.listdir('data')) == ['weather.json']#no temporary files are left behind
+      os.chdir(folder)
+  finally:
+    os.umask(umask)
+    rows[1][1] = 9
+    os.chdir(folder)
+    weather_scraper.weather_table_stacker = original
+test_refresh_map_data()#running the testing function so the file can be run as a standalone
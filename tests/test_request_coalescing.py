@@ -0,0 +1,91 @@
+import threading
+import pytest
+import weather_http
+from fake_web import FakeWeb, geodatos_page
+
+class GatedWeb(FakeWeb):
+  '''FakeWeb whose answers wait until the gate is opened, so concurrent requests overlap.'''
+  def __init__(self, pages, error=None):
+    super().__init__(pages)
+    self.gate = threading.Event()
+    self.error = error
+
+  def send(self, request, **kwargs):
+    self.gate.wait(10)
+    if self.error is not None:
+      with self.lock:
+        self.requests.append(request.url)
+      raise self.error
+    return super().send(request, **kwargs)
+
+def concurrently(function, count):
+  results = [None] * count
+  def call(position):
+    try:
+      results[position] = function()
+    except Exception as error:
+      results[position] = error
+  threads = [threading.Thread(target=call, args=(position,)) for position in range(count)]
+  for thread in threads:
+    thread.start()
+  return threads, results
+
+def test_request_coalescing():
+  url = 'https://www.geodatos.net/en/coordinates/netherlands/utrecht'
+  page = geodatos_page(52.09083, 5.12222)
+  web = GatedWeb({url: page})
+  client = weather_http.HttpClient(adapter=web)
+  #testing that concurrent callers of the same url share one request
+  threads, results = concurrently(lambda: client.get_text(url), 8)
+  while client.stats()['coalesced'] < 7:
+    threading.Event().wait(0.01)
+  web.gate.set()
+  for thread in threads:
+    thread.join()
+  assert results == [page] * 8 and web.requests == [url]
+  assert client.stats()['requests'] == 1 and client.stats()['coalesced'] == 7
+  #testing that a finished download is not shared with later callers
+  assert client.get_text(url) == page and len(web.requests) == 2
+  #testing that a failing download fails every caller that waited for it
+  failing = GatedWeb({}, error=ConnectionError('connection reset'))
+  client = weather_http.HttpClient(adapter=failing)
+  threads, results = concurrently(lambda: client.get_text(url), 4)
+  while client.stats()['coalesced'] < 3:
+    threading.Event().wait(0.01)
+  failing.gate.set()
+  for thread in threads:
+    thread.join()
+  assert len(failing.requests) == 1 and all(str(result) == 'connection reset' for result in results)
+  #testing that coalescing can be switched off
+  web = GatedWeb({url: page})
+  web.gate.set()
+  client = weather_http.HttpClient(adapter=web, coalesce=False)
+  threads, results = concurrently(lambda: client.get_text(url), 4)
+  for thread in threads:
+    thread.join()
+  assert results == [page] * 4 and len(web.requests) == 4 and client.stats()['coalesced'] == 0
+
+def test_rate_limit():
+  #testing the token bucket with a simulated clock: a burst passes at once, then one request per 1/rate seconds
+  now = [0.0]
+  bucket = weather_http.TokenBucket(2, burst=2, clock=lambda: now[0], sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+  assert [bucket.acquire() for _ in range(4)] == [0.0, 0.0, 0.5, 0.5]
+  now[0] += 10 #a quiet period refills the bucket, but never beyond the burst
+  assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.5]
+  #testing that the client limits the configured hosts only and reports the waits
+  bbc = 'https://www.bbc.com/weather/2759794'
+  geodatos = 'https://www.geodatos.net/en/coordinates/netherlands/utrecht'
+  web = FakeWeb({bbc: 'bbc', geodatos: 'geodatos'})
+  client = weather_http.HttpClient(adapter=web, rate_limit={'www.bbc.com': 20}, burst=1)
+  for _ in range(3):
+    client.get_text(bbc)
+    client.get_text(geodatos)
+  stats = client.stats()
+  assert stats['requests'] == 6 and stats['throttled'] == 2 and 0 < stats['throttle_wait_seconds'] < 0.5
+  #testing if errors are raised correctly
+  for arguments in ({'rate_limit': 0}, {'rate_limit': {'www.bbc.com': -1}}, {'rate_limit': '5'}, {'burst': 0}):
+    with pytest.raises(ValueError, match='Invalid rate limit'):
+      weather_http.HttpClient(**arguments)
+
+test_request_coalescing()#running the testing functions so the file can be run as a standalone
+test_rate_limit()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import weather_index
+
+def haversine(latitude, longitude, latitudes, longitudes):
+  latitude, longitude, latitudes, longitudes = map(np.radians, (latitude, longitude, latitudes, longitudes))
+  a = np.sin((latitudes - latitude) / 2)**2 + np.cos(latitude) * np.cos(latitudes) * np.sin((longitudes - longitude) / 2)**2
+  return 2 * weather_index.EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+def test_station_index():
+  random = np.random.default_rng(7)
+  latitudes = random.uniform(50.75, 53.55, 500)
+  longitudes = random.uniform(3.35, 7.25, 500)
+  rows = [[f'Station {i}', i % 30, 'Sunny', float(latitude), float(longitude)] for i, (latitude, longitude) in enumerate(zip(latitudes, longitudes))]
+  keys = [f'https://www.bbc.com/weather/{3000000 + i}' for i in range(500)]
+  index = weather_index.StationIndex(rows, keys)
+  assert len(index) == 500 and index.stats() == {'stations': 500, 'pending': 0, 'removed': 0, 'rebuilds': 1}
+  #testing single and batch queries against a linear scan of the rows
+  points_latitude = random.uniform(50.5, 53.8, 200)
+  points_longitude = random.uniform(3.0, 7.5, 200)
+  distances, found = index.query(points_latitude, points_longitude, k=3)
+  assert distances.shape == (200, 3) and found.shape == (200, 3)
+  for position in range(200):
+    scan = haversine(points_latitude[position], points_longitude[position], latitudes, longitudes)
+    nearest = np.argsort(scan)[:3]
+    assert list(found[position]) == [keys[i] for i in nearest]
+    assert np.allclose(distances[position], scan[nearest])
+  (key, row, distance), = index.nearest(rows[42][3], rows[42][4])
+  assert key == keys[42] and row is rows[42] and distance < 1e-6
+  #testing that refreshed weather does not touch the tree and moved or new stations are found right away
+  index.update(keys[42], ['Station 42', 31, 'Fog', rows[42][3], rows[42][4]])
+  assert index.stats()['pending'] == 0 and index.row(keys[42])[1:3] == [31, 'Fog']
+  index.update(keys[42], ['Station 42', 31, 'Fog', 53.4, 7.0])
+  index.update('https://www.bbc.com/weather/0000001', ['Delft', 12, 'Rain', 52.01167, 4.35833])
+  assert index.stats() == {'stations': 501, 'pending': 2, 'removed': 1, 'rebuilds': 1}
+  assert index.nearest(53.4, 7.0)[0][0] == keys[42]
+  assert index.nearest(52.01, 4.36)[0][1][0] == 'Delft'
+  #testing that removed stations are skipped and many changes trigger a rebuild
+  index.remove(keys[7])
+  index.remove('unknown')
+  assert keys[7] not in index and index.nearest(rows[7][3], rows[7][4])[0][0] != keys[7]
+  for i in range(200):
+    index.update(keys[i], rows[i][:3] + [rows[i][3] + 0.01, rows[i][4]])
+  stats = index.stats()
+  assert stats['rebuilds'] > 1 and stats['stations'] == 501 and stats['pending'] + stats['removed'] <= 125
+  assert index.nearest(rows[100][3] + 0.01, rows[100][4])[0][0] == keys[100]
+  #testing an index with fewer stations than asked for
+  small = weather_index.StationIndex([['Amsterdam', 14, 'Sunny', 52.37403, 4.88969]])
+  distances, found = small.query([52.0], [4.0], k=2)
+  assert found.tolist() == [['Amsterdam', None]] and np.isinf(distances[0, 1])
+  assert weather_index.StationIndex().nearest(52.0, 5.0) == []
+  #testing if errors are raised correctly
+  with pytest.raises(ValueError, match='Invalid number of neighbours'):
+    index.nearest(52.0, 5.0, k=0)
+  with pytest.raises(ValueError, match='Every row needs a key'):
+    weather_index.StationIndex(rows, keys[:10])
+test_station_index()#running the testing function so the file can be run as a standalone
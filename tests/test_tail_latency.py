@@ -0,0 +1,116 @@
+import time
+import pytest
+import weather_http
+from fake_web import FakeWeb, geodatos_page
+
+class UnreliableWeb(FakeWeb):
+  '''FakeWeb that can fail, answer 503 or stall the next requests, and remembers the timeouts it was given.'''
+  def __init__(self, pages):
+    super().__init__(pages)
+    self.error = None
+    self.status = None
+    self.stalls = 0
+    self.timeouts = []
+
+  def send(self, request, **kwargs):
+    self.timeouts.append(kwargs.get('timeout'))
+    if self.error is not None:
+      raise self.error
+    with self.lock:
+      stall = self.stalls > 0
+      self.stalls -= stall
+    if stall:
+      time.sleep(0.5)
+    response = super().send(request, **kwargs)
+    if self.status is not None:
+      response.status_code = self.status
+    return response
+
+def test_circuit_breaker():
+  now = [0.0]
+  breaker = weather_http.CircuitBreaker(threshold=2, reset_seconds=30, clock=lambda: now[0])
+  breaker.failure()
+  assert breaker.allow() and breaker.state == 'closed'
+  breaker.failure()
+  assert not breaker.allow() and breaker.state == 'open'
+  #testing that a failure of a request still in flight does not keep the circuit open longer
+  now[0] = 20
+  breaker.failure()
+  #testing that a single trial request is let through after the reset period
+  now[0] = 30
+  assert breaker.allow() and breaker.state == 'half-open' and not breaker.allow()
+  breaker.failure()
+  assert breaker.state == 'open' and not breaker.allow()
+  now[0] = 60
+  assert breaker.allow()
+  breaker.success()
+  assert breaker.state == 'closed' and breaker.allow()
+  with pytest.raises(ValueError, match='Invalid circuit breaker'):
+    weather_http.CircuitBreaker(threshold=0)
+  for timeout in (0, -1, (5, 0), '5', (1, 2, 3)):
+    with pytest.raises(ValueError, match='Invalid timeout'):
+      weather_http.HttpClient(timeout=timeout)
+
+def test_tail_latency():
+  url = 'https://www.geodatos.net/en/coordinates/netherlands/utrecht'
+  other = 'https://www.geodatos.net/en/coordinates/netherlands/delft'
+  page = geodatos_page(52.09083, 5.12222)
+  web = UnreliableWeb({url: page, other: page})
+  client = weather_http.HttpClient(adapter=web, timeout=(1, 3), failure_threshold=2)
+  #testing that every request has its deadlines
+  assert client.get_text(url) == page and web.timeouts == [(1, 3)]
+  #testing that failing requests fall back to the last page, until the circuit opens and requests fail fast
+  web.error = ConnectionError('connection refused')
+  assert client.get_text(url) == page
+  with pytest.raises(ConnectionError):
+    client.get_text(other)
+  assert client.stats()['hosts']['www.geodatos.net']['state'] == 'open'
+  sent = len(web.timeouts)
+  assert client.get_text(url) == page and len(web.timeouts) == sent
+  with pytest.raises(ValueError, match='www.geodatos.net is unavailable'):
+    client.get_text(other)
+  stats = client.stats()
+  assert stats['failures'] == 2 and stats['rejected'] == 2 and stats['fallbacks'] == 2
+  #testing that 503 answers count as failures and are replaced by the last page
+  web.error = None
+  client = weather_http.HttpClient(adapter=web)
+  client.get_text(url)
+  web.status = 503
+  assert client.get_text(url) == page and client.stats()['failures'] == 1 and client.stats()['fallbacks'] == 1
+  #testing that an error answer without a last page raises instead of returning the error page
+  with pytest.raises(ValueError, match='www.geodatos.net answered 503'):
+    client.get_text(other)
+  web.status = 429
+  with pytest.raises(ValueError, match='www.geodatos.net answered 429'):
+    weather_http.HttpClient(adapter=web).get_text(other)
+  web.status = None
+
+def test_hedged_requests():
+  url = 'https://www.bbc.com/weather/2759794'
+  web = UnreliableWeb({url: 'forecast'})
+  client = weather_http.HttpClient(adapter=web, hedge=True)
+  assert client.hedge_delay('www.bbc.com') == weather_http.DEFAULT_HEDGE_DELAY
+  for _ in range(weather_http.HEDGE_MIN_SAMPLES):
+    client.get_text(url)
+  assert client.hedge_delay('www.bbc.com') < 0.2 and client.stats()['hedged'] == 0
+  #testing that a stalled request is sent again after the p95 delay and the second answer wins
+  web.stalls = 1
+  start = time.perf_counter()
+  assert client.get_text(url) == 'forecast'
+  assert time.perf_counter() - start < 0.4
+  stats = client.stats()
+  assert stats['hedged'] == 1 and stats['hedge_wins'] == 1
+  client.close()
+  #testing that waiting for the rate limit does not count as a slow request, only a slow answer is hedged
+  client = weather_http.HttpClient(adapter=web, hedge=True, rate_limit=50, burst=1)
+  for _ in range(weather_http.HEDGE_MIN_SAMPLES + 10):
+    client.get_text(url)
+  stats = client.stats()
+  assert stats['throttled'] >= 10 and stats['hedged'] == 0
+  web.stalls = 1
+  assert client.get_text(url) == 'forecast' and client.stats()['hedged'] == 1
+  client.close()
+
+test_circuit_breaker()#running the testing functions so the file can be run as a standalone
+test_tail_latency()
+test_hedged_requests()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import weather_map
+import weather_surface
+import weather_table
+
+rows = [['Amsterdam', 14, 'Sunny', 52.37403, 4.88969], ['Haarlem', 9, 'Fog', 52.38084, 4.63683],
+        ['Groningen', 6, 'Rain', 53.21917, 6.56667], ['Maastricht', 21, 'Sunny', 50.84833, 5.68889]]
+
+def test_temperature_surface():
+  table = weather_table.WeatherTable.from_rows(rows)
+  surface = weather_surface.TemperatureSurface(shape=(70, 98), neighbours=3, max_distance=None)
+  grid = surface.interpolate(table)
+  assert grid.shape == (70, 98) and np.isfinite(grid).all()
+  #testing that the surface stays between the coldest and warmest station and follows the nearest one
+  assert grid.min() >= 6 and grid.max() <= 21
+  row = np.argmin(np.abs(surface.latitudes - 53.21917))
+  column = np.argmin(np.abs(surface.longitudes - 6.56667))
+  assert abs(grid[row, column] - 6) < 1
+  #testing against plain inverse distance weighting over every station
+  everyone = weather_surface.TemperatureSurface(shape=(7, 9), max_distance=None)
+  latitudes, longitudes = np.meshgrid(everyone.latitudes, everyone.longitudes, indexing='ij')
+  scale = np.cos(np.radians(sum(corner[0] for corner in weather_surface.SURFACE_BOUNDS) / 2))
+  weights = np.stack([1 / ((latitudes - row[3])**2 + ((longitudes - row[4]) * scale)**2) for row in rows])
+  expected = (weights * np.array([row[1] for row in rows])[:, None, None]).sum(axis=0) / weights.sum(axis=0)
+  assert np.allclose(everyone.interpolate(table), expected)
+  #testing that the weights are reused for new temperatures of the same stations
+  warmer = weather_table.WeatherTable.from_rows([row[:1] + [row[1] + 5] + row[2:] for row in rows])
+  assert np.allclose(surface.interpolate(warmer), grid + 5)
+  assert surface.stats() == {'computed': 1, 'reused': 1}
+  surface.interpolate(weather_table.WeatherTable.from_rows(rows[:3]))
+  assert surface.stats() == {'computed': 2, 'reused': 1}
+  #testing that small chunks give the same surface
+  chunk_elements = weather_surface.CHUNK_ELEMENTS
+  try:
+    weather_surface.CHUNK_ELEMENTS = 50
+    assert np.allclose(weather_surface.TemperatureSurface(shape=(70, 98), neighbours=3, max_distance=None).interpolate(table), grid)
+  finally:
+    weather_surface.CHUNK_ELEMENTS = chunk_elements
+  #testing that cells far from every station stay empty and become transparent
+  near = weather_surface.TemperatureSurface(shape=(70, 98), max_distance=0.3).interpolate(table)
+  assert np.isnan(near).any() and not np.isnan(near[row, column])
+  image = weather_surface.surface_image(near)
+  assert image.shape == (70, 98, 4) and image.dtype == np.uint8
+  assert (image[np.isnan(near), 3] == 0).all() and image[row, column, 3] == 128
+  assert weather_surface.surface_image(np.array([[-5.0, 25.0]]))[0, :, :3].tolist() == [[128, 0, 128], [255, 0, 0]]
+  #testing that the surface is drawn below the stations
+  html = weather_map.build_map(table, surface=surface).get_root().render()
+  assert 'L.imageOverlay' in html and 'data:image/png;base64' in html and 'Groningen - 6 - Rain' in html
+  #testing if errors are raised correctly
+  with pytest.raises(ValueError, match='Invalid surface shape'):
+    weather_surface.TemperatureSurface(shape=(0, 10))
+  with pytest.raises(ValueError, match='Invalid surface bounds'):
+    weather_surface.TemperatureSurface(bounds=((53, 3), (50, 7)))
+  with pytest.raises(ValueError, match='No stations to interpolate'):
+    surface.interpolate(weather_table.WeatherTable.from_rows([]))
+  with pytest.raises(ValueError, match='Palette needs one colour per edge'):
+    weather_surface.surface_image(grid, palette=('blue', 'red'))
+test_temperature_surface()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,101 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import pytest
+import weather_map
+import weather_scraper
+import weather_table
+
+cities = {'1': 'Amsterdam', '2': 'Haarlem', '3': 'Utrecht', '4': 'Zwolle', '5': 'Groningen', '6': 'Leiden'}
+
+class Scrapers:
+  '''Fake scrapers that fail for unknown cities and count the pages they download.'''
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.calls = 0
+
+  def bbc_weather_scraper(self, url):
+    with self.lock:
+      self.calls += 1
+    time.sleep(random.uniform(0.001, 0.02))#random delays make the rows finish out of order
+    if url[28:] not in cities:
+      raise ValueError('Location not found')
+    return [cities[url[28:]], int(url[28:]), 'Sunny']
+
+  def dutch_coordinates(self, city):
+    return [52.0 + len(city), 4.0 + len(city)]
+
+def test_weather_array_stream():
+  scrapers = Scrapers()
+  original = (weather_scraper.bbc_weather_scraper, weather_scraper.dutch_coordinates)
+  weather_scraper.bbc_weather_scraper = scrapers.bbc_weather_scraper
+  weather_scraper.dutch_coordinates = scrapers.dutch_coordinates
+  try:
+    url_list = ['https://www.bbc.com/weather/' + key for key in ['1', '2', '0', '3', '4', '5', '6']]
+    #testing that a failing city yields its error and the other rows are those of the stacker
+    ordered = [(position, url, row, str(error)) for position, url, row, error in weather_scraper.weather_array_stream(url_list)]
+    assert [(position, url) for position, url, _, _ in ordered] == list(enumerate(url_list))
+    assert ordered[2][3] == 'Location not found' and ordered[2][2] is None
+    good = [url for url in url_list if url[28:] != '0']
+    assert [row for _, _, row, _ in ordered if row is not None] == weather_scraper.weather_array_stacker(good)
+    concurrent = weather_scraper.weather_array_stream(url_list, max_workers=4, ordered=True)
+    assert [(position, url, row, str(error)) for position, url, row, error in concurrent] == ordered
+    #testing that the unordered stream yields every row once, from a generator of urls
+    streamed = weather_scraper.weather_array_stream((url for url in url_list), max_workers=4)
+    assert sorted((position, url, row, str(error)) for position, url, row, error in streamed) == ordered
+    #testing that a consumer stopping early leaves only the cities of the in-flight window scraped
+    scrapers.calls = 0
+    stream = weather_scraper.weather_array_stream(url_list * 20, max_workers=2)
+    next(stream)
+    stream.close()
+    assert scrapers.calls <= 5
+    #testing if errors are raised correctly
+    with pytest.raises(ValueError, match='Invalid number of workers'):
+      weather_scraper.weather_array_stream(url_list, max_workers=0)
+    with pytest.raises(ValueError, match='Invalid input'):
+      weather_scraper.weather_array_stream('https://www.bbc.com/weather/1')
+    #testing that map_generator skips the failing city and fills the data file while scraping
+    folder = os.getcwd()
+    try:
+      with tempfile.TemporaryDirectory() as temporary:
+        os.chdir(temporary)
+        failures = weather_scraper.map_generator(url_list, max_workers=3, stream=True)
+        assert [url for url, _ in failures] == ['https://www.bbc.com/weather/0']
+        with open(weather_scraper.MAP_FILE, encoding='utf-8') as file:
+          assert 'Groningen - 5 - Sunny' in file.read()
+        assert weather_scraper.map_generator(url_list, data_file='weather.json', stream=True)[0][0] == 'https://www.bbc.com/weather/0'
+        with open('weather.json', encoding='utf-8') as file:
+          stations = json.load(file)['stations']
+        assert sorted(stations) == ['1', '2', '3', '4', '5', '6'] and stations['6']['popup'] == 'Leiden - 6 - Sunny'
+        #testing that a failed city keeps its last station and an unchanged stream does not touch the file
+        cities['7'] = 'Delft'
+        weather_scraper.map_generator(url_list + ['https://www.bbc.com/weather/7'], data_file='weather.json', stream=True)
+        del cities['7']
+        os.utime('weather.json', (0, 0))
+        results = weather_scraper.weather_array_stream(url_list + ['https://www.bbc.com/weather/7'])
+        changed, failures = weather_map.stream_map_data(results, 'weather.json')
+        assert changed == [] and len(failures) == 2 and os.path.getmtime('weather.json') == 0
+        assert weather_map.stream_map_data(weather_scraper.weather_array_stream(url_list[:2]), 'weather.json', flush_seconds=0)[0] == ['3', '4', '5', '6', '7']
+        #testing that a place name is keyed by its location ID, and a failed place name keeps its station
+        utrecht = ['Utrecht', 3, 'Sunny', 52.09083, 5.12222]
+        assert weather_map.stream_map_data([(0, 'Utrecht', utrecht, None)], 'places.json', flush_seconds=0)[0] == ['2745912']
+        results = [(0, 'Utrecht', None, ValueError('Location not found')), (1, 'https://www.bbc.com/weather/2745912', utrecht, None)]
+        assert weather_map.stream_map_data(results, 'places.json') == ([], [('Utrecht', results[0][3])])
+        results = [(0, 'Utrecht', None, ValueError('Location not found'))]
+        assert weather_map.stream_map_data(results, 'places.json')[0] == []
+        with open('places.json', encoding='utf-8') as file:
+          assert list(json.load(file)['stations']) == ['2745912']
+        table = weather_table.WeatherTable.from_rows([utrecht])
+        assert weather_map.station_payload(table, ['Utrecht']) == weather_map.station_payload(table, ['2745912'])
+        assert list(weather_map.station_payload(table, ['Utrecht'])) == ['2745912']
+        os.chdir(folder)
+    finally:
+      os.chdir(folder)
+    with pytest.raises(ValueError, match='The forecast map cannot be streamed'):
+      weather_scraper.map_generator(url_list, forecast=True, stream=True)
+  finally:
+    weather_scraper.bbc_weather_scraper, weather_scraper.dutch_coordinates = original
+test_weather_array_stream()#running the testing function so the file can be run as a standalone
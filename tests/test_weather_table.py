@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import weather_table
+
+rows = [['Amsterdam', 14, 'Sunny', 52.37403, 4.88969],
+        ['Haarlem', 9, 'Fog', 52.38084, 4.63683],
+        ['Utrecht', 17, 'Sunny', 52.09083, 5.12222]]
+
+def test_weather_table():
+  table = weather_table.WeatherTable.from_rows(rows)
+  #testing that the list of lists view is identical to the matrix, including the python types
+  assert table.tolist() == rows
+  assert [type(value) for value in table.tolist()[0]] == [str, int, str, float, float]
+  assert table[1] == rows[1] and list(table) == rows
+  #testing the columns and filtering without per row objects
+  assert table.temperature.dtype == np.int32 and table.latitude.dtype == np.float64
+  assert (table.description == 'Sunny').tolist() == [True, False, True]
+  assert (table.description == 'Snow').tolist() == [False, False, False]
+  assert (table.city != 'Haarlem').sum() == 2
+  warm = table[table.temperature > 10]
+  assert warm.city.tolist() == ['Amsterdam', 'Utrecht'] and len(warm) == 2
+  assert table[table.city.isin(['Haarlem', 'Delft'])].tolist() == [rows[1]]
+  assert table[::2].description.tolist() == ['Sunny', 'Sunny']
+  assert table.description.values == ['Sunny', 'Fog'] and table.description.codes.tolist() == [0, 1, 0]
+  #testing that the numpy export shares memory with the table
+  exported = table.to_numpy()
+  assert np.shares_memory(exported, table.latitude)
+  exported['temperature'][0] = 20
+  assert table[0][1] == 20
+  #testing edge cases
+  assert weather_table.WeatherTable.from_rows([]).tolist() == []
+  with pytest.raises(ValueError, match='Columns of different length'):
+    weather_table.WeatherTable(table.city, table.description[:1], table.numeric)
+
+def test_weather_table_pandas():
+  pd = pytest.importorskip('pandas')
+  frame = weather_table.WeatherTable.from_rows(rows).to_pandas()
+  assert list(frame.columns) == list(weather_table.COLUMNS)
+  assert frame['city'].tolist() == ['Amsterdam', 'Haarlem', 'Utrecht']
+  assert frame['temperature'].tolist() == [14, 9, 17]
+test_weather_table()#running the testing function so the file can be run as a standalone
@@ -0,0 +1,403 @@
+from collections import OrderedDict
+import os
+import re
+import sqlite3
+import threading
+import time
+
+#coordinates of the larger Dutch municipalities, taken from the GeoNames gazetteer (the source also used by geodatos.net)
+#every entry is stored under the normalised form of its name, aliases share the coordinates of their city
+GAZETTEER = """
+amsterdam,52.37403,4.88969
+rotterdam,51.9225,4.47917
+the-hague,52.07667,4.29861|den-haag|s-gravenhage|'s-gravenhage
+utrecht,52.09083,5.12222
+eindhoven,51.44083,5.47778
+groningen,53.21917,6.56667
+tilburg,51.55551,5.0913
+almere,52.37025,5.21413|almere-stad
+breda,51.58656,4.77596
+nijmegen,51.8425,5.85278
+apeldoorn,52.21,5.96944
+haarlem,52.38084,4.63683
+arnhem,51.98,5.91111
+enschede,52.21833,6.89583
+amersfoort,52.155,5.3875
+zaanstad,52.45313,4.81356|zaandam
+'s-hertogenbosch,51.69917,5.30417|s-hertogenbosch|den-bosch
+haarlemmermeer,52.30083,4.69306|hoofddorp
+zwolle,52.5125,6.09444
+zoetermeer,52.0575,4.49306
+leiden,52.15833,4.49306
+maastricht,50.84833,5.68889
+dordrecht,51.81,4.67361
+ede,52.03333,5.65833
+alphen-aan-den-rijn,52.12917,4.65546
+leeuwarden,53.20139,5.80859
+alkmaar,52.63167,4.74861
+emmen,52.77917,6.90694
+delft,52.00667,4.35556
+venlo,51.37,6.16806
+deventer,52.255,6.16389
+sittard-geleen,51.0,5.86944|sittard
+helmond,51.48167,5.66111
+oss,51.765,5.51806
+amstelveen,52.30083,4.86389
+hilversum,52.22333,5.17639
+heerlen,50.88365,5.98154
+hengelo,52.26583,6.79306
+purmerend,52.505,4.95972
+roosendaal,51.53083,4.46528
+schiedam,51.91917,4.38889
+lelystad,52.50833,5.475
+leidschendam-voorburg,52.08306,4.39583
+gouda,52.01667,4.70833
+vlaardingen,51.9125,4.34167
+assen,52.99667,6.5625
+den-helder,52.95917,4.75972
+hoorn,52.6425,5.05972
+middelburg,51.5,3.61389
+roermond,51.19417,5.9875
+""".strip()
+
+def normalise_city(city):
+  """
+  Normalises a city name into the key used by the coordinate cache and by the geodatos.net urls.
+
+  Args:
+    city (str): The name of a Dutch city.
+
+  Returns:
+    str: The lowercase city name with spaces replaced by dashes.
+
+  Example:
+    >>> normalise_city(' The Hague ')
+    'the-hague'
+  """
+  if type(city) is not str:
+    raise ValueError("Invalid input data type")
+  return city.strip().lower().replace(" ", "-")
+
+def load_gazetteer():
+  """
+  Parses the bundled gazetteer of Dutch municipalities.
+
+  Returns:
+    dict: A dictionary mapping normalised city names and their aliases to [latitude, longitude].
+  """
+  gazetteer={}
+  for line in GAZETTEER.splitlines():
+    entry,*aliases=line.split("|")
+    name,latitude,longitude=entry.split(",")
+    coordinates=[float(latitude),float(longitude)]
+    for key in [name]+aliases:
+      gazetteer[key]=coordinates
+  return gazetteer
+
+class CoordinateCache:
+  """
+  Persistent store of city coordinates, keyed by the normalised city name.
+
+  Coordinates are kept in an SQLite file and mirrored in an in-memory dictionary, so a lookup after the first one
+  is a single dictionary access. Entries of the optional bundled gazetteer are used for cities that were never stored.
+
+  Args:
+    path (str): Location of the SQLite file, or ':memory:' for a cache that only lives as long as the process.
+    gazetteer (bool): Whether the bundled gazetteer of Dutch municipalities is consulted on a miss.
+
+  Example:
+    >>> cache = CoordinateCache('coordinates.sqlite3', gazetteer=True)
+    >>> cache.get('The Hague')
+    [52.07667, 4.29861]
+  """
+  def __init__(self, path, gazetteer=False):
+    self.path=path
+    self.gazetteer=load_gazetteer() if gazetteer else {}
+    self._lock=threading.Lock()
+    if path != ':memory:' and os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    #the connection is shared by the worker threads of weather_array_stacker(), all access goes through the lock
+    self._connection=sqlite3.connect(path, check_same_thread=False)
+    self._connection.execute("CREATE TABLE IF NOT EXISTS coordinates (city TEXT PRIMARY KEY, latitude REAL, longitude REAL)")
+    self._connection.commit()
+    self._memory={city:[latitude,longitude] for city,latitude,longitude in self._connection.execute("SELECT city, latitude, longitude FROM coordinates")}
+
+  def get(self, city):
+    """
+    Looks up the coordinates of a city without any network access.
+
+    Args:
+      city (str): The name of a Dutch city, in any capitalisation.
+
+    Returns:
+      list of float or None: [latitude, longitude], or None when the city is neither stored nor in the gazetteer.
+    """
+    key=normalise_city(city)
+    coordinates=self._memory.get(key)
+    if coordinates is None:
+      #another process may have stored the city since this cache was opened
+      with self._lock:
+        row=self._connection.execute("SELECT latitude, longitude FROM coordinates WHERE city = ?", (key,)).fetchone()
+      if row is not None:
+        coordinates=self._memory[key]=list(row)
+      elif key in self.gazetteer:
+        coordinates=self._memory[key]=self.gazetteer[key]
+    return None if coordinates is None else list(coordinates)
+
+  def put(self, city, coordinates):
+    """
+    Stores the coordinates of a city both in memory and on disk.
+
+    Args:
+      city (str): The name of a Dutch city, in any capitalisation.
+      coordinates (list of float): [latitude, longitude]
+    """
+    key=normalise_city(city)
+    latitude,longitude=coordinates
+    with self._lock:
+      self._connection.execute("INSERT OR REPLACE INTO coordinates VALUES (?, ?, ?)", (key, latitude, longitude))
+      self._connection.commit()
+    self._memory[key]=[latitude,longitude]
+
+  def __len__(self):
+    return len(self._memory)
+
+  def close(self):
+    with self._lock:
+      self._connection.close()
+
+def default_cache_dir():
+  """
+  Returns the directory used for the on-disk caches, which can be moved with the WEATHER_MAP_CACHE_DIR environment variable.
+  """
+  return os.environ.get("WEATHER_MAP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "netherlands_weather_map"))
+
+_default_coordinate_cache=None
+_default_lock=threading.Lock()
+
+def default_coordinate_cache():
+  """
+  Returns the coordinate cache used by `dutch_coordinates()` when no cache is passed, opening it on first use.
+  """
+  global _default_coordinate_cache
+  with _default_lock:
+    if _default_coordinate_cache is None:
+      _default_coordinate_cache=CoordinateCache(os.path.join(default_cache_dir(), "coordinates.sqlite3"))
+    return _default_coordinate_cache
+
+def set_default_coordinate_cache(cache):
+  """
+  Replaces the coordinate cache used by `dutch_coordinates()`, for example with one that includes the gazetteer.
+
+  Args:
+    cache (CoordinateCache or None): The new default cache. None reopens the standard on-disk cache on next use.
+  """
+  global _default_coordinate_cache
+  with _default_lock:
+    _default_coordinate_cache=cache
+
+DEFAULT_FORECAST_TTL = 600 #seconds a scraped forecast is served without asking BBC again
+DEFAULT_FORECAST_ENTRIES = 1024 #forecasts kept in memory
+
+def location_id(url):
+  """
+  Extracts the numeric BBC location ID from a BBC Weather URL.
+
+  Args:
+    url (str): URL of the form 'https://www.bbc.com/weather/xxxxxxx'.
+
+  Returns:
+    int or None: The location ID, or None when the URL does not contain one.
+
+  Example:
+    >>> location_id('https://www.bbc.com/weather/2759794')
+    2759794
+  """
+  if type(url) is not str:
+    return None
+  match=re.match(r'https://www\.bbc\.com/weather/(\d+)', url)
+  return int(match.group(1)) if match else None
+
+class ForecastCache:
+  """
+  Time-limited cache of scraped BBC forecasts, keyed by the numeric BBC location ID.
+
+  Forecasts are kept in memory in least-recently-used order, and optionally also in an SQLite file so that separate runs
+  of the program share them. A forecast younger than `ttl` seconds is served without any request. With
+  `stale_while_revalidate` seconds, an expired forecast that is not older than `ttl + stale_while_revalidate` is still
+  returned immediately while a background thread downloads the new one.
+
+  Args:
+    ttl (float): Seconds a forecast stays fresh.
+    max_entries (int): Maximum number of forecasts kept in memory, the least recently used are evicted.
+    path (str): Optional location of an SQLite file that persists the forecasts between runs.
+    stale_while_revalidate (float): Seconds an expired forecast may still be served while it is refreshed. 0 disables it.
+    clock (callable): Function returning the current time in seconds, `time.time` by default.
+
+  Example:
+    >>> cache = ForecastCache(ttl=900, path='forecasts.sqlite3', stale_while_revalidate=300)
+    >>> bbc_weather_scraper('https://www.bbc.com/weather/2759794', cache=cache)
+    ['Amsterdam', 14, 'Sunny and light winds']
+  """
+  def __init__(self, ttl=DEFAULT_FORECAST_TTL, max_entries=DEFAULT_FORECAST_ENTRIES, path=None, stale_while_revalidate=0, clock=time.time):
+    if ttl<0 or stale_while_revalidate<0 or type(max_entries) is not int or max_entries<1:
+      raise ValueError('Invalid cache settings')
+    self.ttl=ttl
+    self.max_entries=max_entries
+    self.path=path
+    self.stale_while_revalidate=stale_while_revalidate
+    self.clock=clock
+    self._entries=OrderedDict() #location id -> (row, stored at)
+    self._refreshing=set()
+    self._lock=threading.Lock()
+    self._counters={'hits':0,'stale_hits':0,'misses':0,'evictions':0,'revalidation_errors':0}
+    self._connection=None
+    if path is not None:
+      if path != ':memory:' and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+      self._connection=sqlite3.connect(path, check_same_thread=False)
+      self._connection.execute("CREATE TABLE IF NOT EXISTS forecasts (location_id INTEGER PRIMARY KEY, city TEXT, temperature INTEGER, description TEXT, stored_at REAL)")
+      #forecasts that can no longer be served are dropped when the file is opened
+      self._connection.execute("DELETE FROM forecasts WHERE stored_at < ?", (self.clock()-self.ttl-self.stale_while_revalidate,))
+      self._connection.commit()
+
+  def _lookup(self, key):
+    with self._lock:
+      entry=self._entries.get(key)
+      if entry is not None:
+        self._entries.move_to_end(key)
+        return entry
+      if self._connection is None:
+        return None
+      row=self._connection.execute("SELECT city, temperature, description, stored_at FROM forecasts WHERE location_id = ?", (key,)).fetchone()
+    if row is None:
+      return None
+    entry=([row[0],row[1],row[2]],row[3])
+    self._remember(key, entry)
+    return entry
+
+  def _remember(self, key, entry):
+    with self._lock:
+      self._entries[key]=entry
+      self._entries.move_to_end(key)
+      while len(self._entries)>self.max_entries:
+        self._entries.popitem(last=False)
+        self._counters['evictions']+=1
+
+  def get(self, key):
+    """
+    Returns a fresh forecast without any request.
+
+    Args:
+      key (int): The BBC location ID.
+
+    Returns:
+      list or None: [City (str), max_temp (int), description (str)], or None when nothing fresh is stored.
+    """
+    entry=self._lookup(key)
+    if entry is None or self.clock()-entry[1] >= self.ttl:
+      return None
+    return list(entry[0])
+
+  def put(self, key, row):
+    """
+    Stores a freshly scraped forecast.
+
+    Args:
+      key (int): The BBC location ID.
+      row (list): [City (str), max_temp (int), description (str)]
+    """
+    stored_at=self.clock()
+    self._remember(key, (list(row),stored_at))
+    if self._connection is not None:
+      with self._lock:
+        self._connection.execute("INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?)", (key, row[0], row[1], row[2], stored_at))
+        self._connection.commit()
+
+  def fetch(self, key, loader):
+    """
+    Returns the forecast of a location, only calling `loader` when no usable forecast is stored.
+
+    Args:
+      key (int): The BBC location ID.
+      loader (callable): Function without arguments that scrapes the forecast, for example `lambda: bbc_weather_scraper(url, cache=False)`.
+
+    Returns:
+      list: [City (str), max_temp (int), description (str)]
+    """
+    entry=self._lookup(key)
+    if entry is not None:
+      age=self.clock()-entry[1]
+      if age<self.ttl:
+        with self._lock:
+          self._counters['hits']+=1
+        return list(entry[0])
+      if age<self.ttl+self.stale_while_revalidate:
+        with self._lock:
+          self._counters['stale_hits']+=1
+        self._revalidate(key, loader)
+        return list(entry[0])
+    with self._lock:
+      self._counters['misses']+=1
+    row=loader()
+    self.put(key, row)
+    return list(row)
+
+  def _revalidate(self, key, loader):
+    with self._lock:
+      if key in self._refreshing:
+        return
+      self._refreshing.add(key)
+    def refresh():
+      try:
+        self.put(key, loader())
+      except Exception:
+        #the stale forecast keeps being served until a refresh succeeds or it expires
+        with self._lock:
+          self._counters['revalidation_errors']+=1
+      finally:
+        with self._lock:
+          self._refreshing.discard(key)
+    threading.Thread(target=refresh, daemon=True).start()
+
+  def stats(self):
+    """
+    Returns the hit, stale hit, miss, eviction and failed revalidation counters.
+    """
+    with self._lock:
+      stats=dict(self._counters)
+      stats['entries']=len(self._entries)
+    return stats
+
+  def __len__(self):
+    return len(self._entries)
+
+  def close(self):
+    if self._connection is not None:
+      with self._lock:
+        self._connection.close()
+        self._connection=None
+
+_default_forecast_cache=None
+
+def default_forecast_cache():
+  """
+  Returns the in-memory forecast cache used by `bbc_weather_scraper()` when no cache is passed, creating it on first use.
+  """
+  global _default_forecast_cache
+  with _default_lock:
+    if _default_forecast_cache is None:
+      _default_forecast_cache=ForecastCache()
+    return _default_forecast_cache
+
+def set_default_forecast_cache(cache):
+  """
+  Replaces the forecast cache used by `bbc_weather_scraper()`, for example with one persisted on disk.
+
+  Args:
+    cache (ForecastCache or bool or None): The new default cache. False disables caching, so every call downloads its
+      page, as the tests do to see every request. None creates a fresh in-memory cache on next use.
+  """
+  global _default_forecast_cache
+  with _default_lock:
+    _default_forecast_cache=cache
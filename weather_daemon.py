@@ -0,0 +1,217 @@
+import heapq
+import logging
+import os
+import random
+import threading
+import time
+import weather_history
+import weather_index
+import weather_metrics
+import weather_scraper
+from weather_scraper import MAP_FILE
+
+DEFAULT_INTERVAL = 900 #seconds between two refreshes of the same city
+DEFAULT_JITTER = 0.2 #fraction by which every refresh interval is randomly stretched or shortened
+DEFAULT_STARTUP = 60 #seconds over which the first refresh of all cities is spread
+RENDER_DELAY = 2 #seconds a render waits for further changes, so a group of changed cities gives one render
+
+logger = logging.getLogger(__name__)
+
+class RefreshDaemon:
+  """
+  Keeps the weather of a list of cities in memory and refreshes every city on its own jittered schedule.
+
+  Running `map_generator()` from cron scrapes every city at the same moment and pays the full start-up cost each time.
+  The daemon instead gives every city its own timer: the first refreshes are spread evenly over `startup` seconds and
+  every following refresh of a city is due `interval` seconds later, stretched or shortened by a random `jitter`,
+  so the requests of all cities stay spread evenly over time. The map is only rendered again when a refresh actually
+  changed a city, and changes that arrive within `RENDER_DELAY` seconds of each other are rendered together.
+
+  The forecasts bypass the forecast cache (the daemon decides when a city is fresh), the coordinates are looked up in
+  the coordinate cache as usual. A city whose refresh fails keeps its last known weather on the map and is tried again
+  after `retry` seconds.
+
+  Every refreshed row is also kept in a `weather_index.StationIndex`, so other threads can ask for the weather at any
+  point with `weather_at()` while the daemon runs, and appended to `weather_history.default_store()` when one is installed.
+
+  Args:
+    url_list (list of str): The BBC Weather URLs of the cities, see `weather_scraper.weather_array_stacker()`.
+    interval (float): Seconds between two refreshes of the same city.
+    jitter (float): Fraction between 0 and 1 by which every interval is randomly varied.
+    startup (float): Seconds over which the first refresh of all cities is spread.
+    retry (float): Seconds before a failed refresh is tried again. Defaults to a tenth of `interval`.
+    output (str): Path of the HTML map.
+    mode (str): 'markers', 'geojson' or 'cluster', see `weather_map.build_map()`.
+    data_file (str): Path of the JSON data file of the incremental map. None renders the complete map.
+    clock (callable): Returns the current time in seconds, `time.monotonic` by default.
+    seed (int): Seed of the jitter, for reproducible schedules.
+    server (MapServer): A `weather_server.MapServer` every render is published to, so its viewers see it at once.
+    surface (bool or TemperatureSurface): Also draw the interpolated temperature surface, see
+      `weather_scraper.map_generator()`. Not drawn by the incremental map.
+
+  Example:
+    >>> daemon = RefreshDaemon(url_list, interval=600, data_file='netherlands_weather_data.json')
+    >>> daemon.run() #until daemon.stop() is called from another thread or a signal handler
+    >>> daemon.stats()
+    {'refreshes': 440, 'changes': 31, 'errors': 2, 'renders': 17}
+  """
+  def __init__(self, url_list, interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER, startup=DEFAULT_STARTUP, retry=None,
+               output=MAP_FILE, mode='markers', data_file=None, clock=time.monotonic, seed=None, server=None, surface=False):
+    if type(url_list) is not list or len(url_list) == 0:
+      raise ValueError('Invalid input')
+    if not interval > 0 or not 0 <= jitter < 1 or not startup >= 0 or (retry is not None and not retry > 0):
+      raise ValueError('Invalid schedule')
+    if mode not in weather_scraper.MAP_MODES:
+      raise ValueError('Invalid map mode')
+    self.url_list=list(dict.fromkeys(url_list)) #every city is scheduled once
+    self.interval=interval
+    self.jitter=jitter
+    self.retry=interval/10 if retry is None else retry
+    self.output=output
+    self.mode=mode
+    self.data_file=data_file
+    self.clock=clock
+    self.server=server
+    self.surface=surface
+    self.rows={} #url -> last scraped row
+    self.index=weather_index.StationIndex() #the same rows, keyed by url, for queries by coordinates
+    self._random=random.Random(seed)
+    self._stopped=threading.Event()
+    self._render_due=None
+    self._counters={'refreshes':0,'changes':0,'errors':0,'renders':0}
+    start=clock()
+    count=len(self.url_list)
+    #(due time, url), spread evenly over the start-up period
+    self._schedule=[(start+startup*position/count, url) for position,url in enumerate(self.url_list)]
+    heapq.heapify(self._schedule)
+
+  def _next_interval(self):
+    return self.interval*self._random.uniform(1-self.jitter, 1+self.jitter)
+
+  def refresh(self, url):
+    """
+    Scrapes one city and remembers its row.
+
+    Args:
+      url (str): The BBC Weather URL of the city, or its place name.
+
+    Returns:
+      bool: True when the weather of the city changed since its last refresh.
+    """
+    page,coordinates=weather_scraper.resolve_location(url)
+    current=weather_scraper.bbc_weather_scraper(page, cache=False)
+    if coordinates is None:
+      coordinates=weather_scraper.dutch_coordinates(current[0])
+    row=current+coordinates
+    self._counters['refreshes']+=1
+    history=weather_history.default_store()
+    if history is not None:
+      history.append_rows([url], [row])
+    if self.rows.get(url) == row:
+      return False
+    self.rows[url]=row
+    self.index.update(url, row)
+    self._counters['changes']+=1
+    return True
+
+  def weather_at(self, latitude, longitude, k=1):
+    """
+    Returns the weather of the stations nearest to a point, see `weather_index.StationIndex.nearest()`.
+
+    Args:
+      latitude (float): Latitude of the point in degrees.
+      longitude (float): Longitude of the point in degrees.
+      k (int): Number of stations.
+
+    Returns:
+      list of tuple: (url, row, distance in km) of the refreshed stations nearest to the point, nearest first.
+    """
+    return self.index.nearest(latitude, longitude, k)
+
+  def render(self):
+    """
+    Draws the map, or the data file of the incremental map, from the rows in memory.
+    """
+    import weather_map #Folium is only loaded when a map is drawn
+    import weather_table
+    urls=[url for url in self.url_list if url in self.rows]
+    table=weather_table.WeatherTable.from_rows([self.rows[url] for url in urls])
+    with weather_metrics.stage('map_render', mode=self.mode if self.data_file is None else 'incremental') as event:
+      if self.data_file is None:
+        surface=self.surface
+        if surface is True:
+          import weather_surface
+          surface=weather_surface.default_surface() #keeps its interpolation weights while the cities stay the same
+        weather_map.save_map(table, self.output, self.mode, surface or None)
+      else:
+        if not os.path.exists(self.output):
+          weather_map.write_map_shell(self.output, self.data_file)
+        weather_map.write_map_data(table, urls, self.data_file)
+      event.set(rows=len(table))
+    if self.server is not None:
+      self.server.publish_map(self.output, self.data_file)
+    self._counters['renders']+=1
+
+  def tick(self):
+    """
+    Refreshes every city that is due and renders the map when a change has waited `RENDER_DELAY` seconds.
+
+    Returns:
+      float: The clock time at which the next refresh or render is due.
+    """
+    now=self.clock()
+    while self._schedule and self._schedule[0][0] <= now and not self._stopped.is_set():
+      _,url=heapq.heappop(self._schedule)
+      try:
+        changed=self.refresh(url)
+        delay=self._next_interval()
+      except Exception as error:
+        #one failing city must not stop the others, it keeps its last known weather
+        self._counters['errors']+=1
+        logger.warning('Refreshing %s failed: %s', url, error)
+        changed=False
+        delay=self.retry
+      heapq.heappush(self._schedule, (self.clock()+delay, url))
+      if changed and self._render_due is None:
+        self._render_due=self.clock()+RENDER_DELAY
+      now=self.clock()
+    if self._render_due is not None and self._render_due <= now:
+      self._render_due=None
+      try:
+        self.render()
+      except Exception as error:
+        self._counters['errors']+=1
+        logger.warning('Rendering the map failed: %s', error)
+    due=self._schedule[0][0]
+    return due if self._render_due is None else min(due, self._render_due)
+
+  def run(self):
+    """
+    Refreshes the cities on their schedules until `stop()` is called.
+    """
+    while not self._stopped.is_set():
+      due=self.tick()
+      self._stopped.wait(max(0.0, due-self.clock()))
+    if self._render_due is not None:
+      #changes still waiting for their render are not lost when the daemon stops
+      self._render_due=None
+      self.render()
+
+  def stop(self):
+    """
+    Makes `run()` return after the refresh in progress, can be called from another thread or a signal handler.
+    """
+    self._stopped.set()
+
+  def stats(self):
+    """
+    Reports the work done so far.
+
+    Returns:
+      dict: A dictionary with:
+        - refreshes (int): Cities scraped.
+        - changes (int): Refreshes that changed the weather of a city.
+        - errors (int): Failed refreshes and renders.
+        - renders (int): Times the map was drawn.
+    """
+    return dict(self._counters)
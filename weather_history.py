@@ -0,0 +1,341 @@
+import json
+import os
+import threading
+import time
+import weather_cache
+
+MAGIC = b'WXHIST\x00\x01' #first bytes of a history file, the last one is the format version
+HEADER_SIZE = 16 #magic, record size and reserved bytes before the first record
+#one observation: seconds since the epoch, BBC location ID, temperature in degrees Celsius and description code
+RECORD_FIELDS = [('timestamp', '<f8'), ('location', '<i4'), ('temperature', '<i2'), ('description', '<u2')]
+MISSING_TEMPERATURE = -32768 #stored instead of a temperature BBC did not show
+CHAIN_TYPE = '<i8' #position of the previous record of the same city, -1 for its first record
+DEFAULT_WINDOW = 86400 #seconds before the snapshot time in which a city must have been observed
+
+_dtype = None
+
+def _record_dtype():
+  global _dtype
+  if _dtype is None:
+    import numpy as np #NumPy is only loaded once a history file is used
+    _dtype=np.dtype(RECORD_FIELDS)
+  return _dtype
+
+class HistoryStore:
+  """
+  Append-only binary file of weather observations, read through a memory map.
+
+  Every observation takes 16 bytes: the time it was scraped, the BBC location ID of the city, today's maximum
+  temperature and a code for the weather description. The distinct descriptions are kept once, one per line, in a text
+  file next to the store (`path` + '.descriptions'). Observations are appended in time order, which lets `snapshot()`
+  find the requested period by binary search and read only the pages of the file that cover it.
+
+  Two more files next to the store index the records by city: `path` + '.chain' holds for every record the position of
+  the previous record of the same city, and `path` + '.heads' the position of the last record of every city. `history()`
+  follows that chain backwards from the last record of its city, so it reads the records of that city only, however
+  long the store has grown. A year of hourly observations of a thousand cities takes about 210 MB with the index. A
+  missing or outdated index, such as after a crash, is rebuilt from the records in one pass when the store is opened.
+
+  A store is written by one process at a time, but any number of processes can read it while it grows. A record that
+  was cut short by a crash is discarded when the store is opened again.
+
+  Args:
+    path (str): The history file, created when it does not exist.
+
+  Example:
+    >>> store = HistoryStore('weather.history')
+    >>> weather_array_stacker(url_list, history=store)
+    >>> store.history('https://www.bbc.com/weather/2759794')[-1]
+    [1760691600.0, 14, 'Sunny and light winds']
+    >>> store.snapshot(time.time()-86400)[2759794]
+    [1760605200.0, 12, 'Light rain']
+  """
+  def __init__(self, path):
+    self.path=path
+    self._lock=threading.Lock()
+    self._map=None
+    self._mapped=0
+    dtype=_record_dtype()
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+      with open(path, 'wb') as file:
+        file.write(MAGIC+dtype.itemsize.to_bytes(4, 'little')+bytes(HEADER_SIZE-len(MAGIC)-4))
+    with open(path, 'rb') as file:
+      header=file.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE or header[:len(MAGIC)] != MAGIC or int.from_bytes(header[len(MAGIC):len(MAGIC)+4], 'little') != dtype.itemsize:
+      raise ValueError('Not a weather history file')
+    size=os.path.getsize(path)
+    complete=HEADER_SIZE+(size-HEADER_SIZE)//dtype.itemsize*dtype.itemsize
+    if complete != size:
+      os.truncate(path, complete) #the tail of an interrupted append
+    self._descriptions=[]
+    if os.path.exists(path+'.descriptions'):
+      with open(path+'.descriptions', encoding='utf-8') as file:
+        self._descriptions=file.read().split('\n')[:-1]
+    self._codes={description:code for code,description in enumerate(self._descriptions)}
+    records=self._records()
+    self._last=float(records['timestamp'][-1]) if len(records) else float('-inf')
+    self._chain_map=None
+    self._chain_mapped=0
+    self._heads={} #BBC location ID -> position of its last record
+    self._indexed=0 #records covered by the chain and the heads
+    if not (self._read_heads(len(records)) and self._indexed == len(records)):
+      self._rebuild_index(records) #heads that do not cover every record were left by a crash
+
+  def _records(self):
+    """
+    Returns the records as a memory-mapped structured array, remapped when the file has grown.
+    """
+    import numpy as np
+    dtype=_record_dtype()
+    count=(os.path.getsize(self.path)-HEADER_SIZE)//dtype.itemsize
+    if count != self._mapped or self._map is None:
+      if count == 0:
+        self._map=np.empty(0, dtype=dtype)
+      else:
+        self._map=np.memmap(self.path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(count,))
+      self._mapped=count
+    return self._map
+
+  def _chain(self, count):
+    """
+    Returns the first `count` entries of the chain as a memory-mapped array, remapped when the index has grown.
+    """
+    import numpy as np
+    if count != self._chain_mapped or self._chain_map is None:
+      if count == 0:
+        self._chain_map=np.empty(0, dtype=CHAIN_TYPE)
+      else:
+        self._chain_map=np.memmap(self.path+'.chain', dtype=CHAIN_TYPE, mode='r', shape=(count,))
+      self._chain_mapped=count
+    return self._chain_map
+
+  def _read_heads(self, count):
+    """
+    Loads the heads written by the last append, when they cover no fewer records than the ones loaded before and
+    no more than the `count` records and the chain hold.
+
+    Returns:
+      bool: False when the heads file is missing, unreadable or does not fit the records.
+    """
+    import numpy as np
+    try:
+      with open(self.path+'.heads', encoding='utf-8') as file:
+        index=json.load(file)
+      indexed=index['records']
+      chained=os.path.getsize(self.path+'.chain')//np.dtype(CHAIN_TYPE).itemsize
+    except (OSError, ValueError, KeyError, TypeError):
+      return False
+    if not self._indexed <= indexed <= min(count, chained):
+      return False
+    self._heads={int(location):position for location,position in index['heads'].items()}
+    self._indexed=indexed
+    return True
+
+  def _write_heads(self):
+    temporary=self.path+'.heads.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+      json.dump({'records':self._indexed, 'heads':self._heads}, file, separators=(',', ':'))
+    os.replace(temporary, self.path+'.heads') #readers always find a complete file
+
+  def _rebuild_index(self, records):
+    """
+    Writes the chain and the heads of all records, with one sort of the location column.
+    """
+    import numpy as np
+    locations=np.asarray(records['location'])
+    order=np.argsort(locations, kind='stable') #the records of every city together, oldest first
+    ordered=locations[order]
+    same=ordered[1:] == ordered[:-1]
+    chain=np.full(len(records), -1, dtype=CHAIN_TYPE)
+    chain[order[1:][same]]=order[:-1][same]
+    last=np.append(~same, True) if len(records) else np.zeros(0, dtype=bool)
+    with open(self.path+'.chain', 'wb') as file:
+      file.write(chain.tobytes())
+    self._chain_map=None
+    self._heads={int(location):int(position) for location,position in zip(ordered[last], order[last])}
+    self._indexed=len(records)
+    self._write_heads()
+
+  def _code(self, description):
+    description=description.replace('\n', ' ') #one description per line in the descriptions file
+    code=self._codes.get(description)
+    if code is None:
+      code=len(self._descriptions)
+      if code > 65535:
+        raise ValueError('Too many weather descriptions')
+      #the description is on disk before any record refers to it
+      with open(self.path+'.descriptions', 'a', encoding='utf-8') as file:
+        file.write(description+'\n')
+      self._descriptions.append(description)
+      self._codes[description]=code
+    return code
+
+  def append(self, observations, timestamp=None):
+    """
+    Appends observations of one moment to the store.
+
+    Args:
+      observations (iterable of tuple): (location, temperature, description) per city, the location being a BBC
+        location ID or Weather URL, the temperature an int or None.
+      timestamp (float): Seconds since the epoch, the current time by default. Must not be older than the last observation.
+
+    Returns:
+      int: The number of observations written.
+    """
+    import numpy as np
+    timestamp=time.time() if timestamp is None else float(timestamp)
+    with self._lock:
+      if timestamp < self._last:
+        raise ValueError('Observations must be appended in time order')
+      rows=[]
+      for location,temperature,description in observations:
+        key=_location(location)
+        if key is None:
+          raise ValueError(f'Invalid location {location}')
+        rows.append((timestamp, key, MISSING_TEMPERATURE if temperature is None else temperature, self._code(description)))
+      if not rows:
+        return 0
+      records=np.array(rows, dtype=_record_dtype())
+      stored=self._records()
+      if self._indexed != len(stored) and not (self._read_heads(len(stored)) and self._indexed == len(stored)):
+        self._rebuild_index(stored) #the index was left behind, by a crash or by another writer
+      chain=np.empty(len(rows), dtype=CHAIN_TYPE)
+      for position,key in enumerate(records['location'].tolist()):
+        chain[position]=self._heads.get(key, -1)
+        self._heads[key]=self._indexed+position
+      #records, chain and heads are written in that order, so the heads never point past the other two files
+      with open(self.path, 'ab') as file:
+        file.write(records.tobytes())
+      with open(self.path+'.chain', 'ab') as file:
+        file.write(chain.tobytes())
+      self._indexed+=len(rows)
+      self._write_heads()
+      self._last=timestamp
+      return len(rows)
+
+  def append_rows(self, url_list, rows, timestamp=None):
+    """
+    Appends the rows of `weather_scraper.weather_array_stacker()`, scraped from `url_list`, as observations of one moment.
+
+    Returns:
+      int: The number of observations written.
+    """
+    return self.append(((url, row[1], row[2]) for url,row in zip(url_list, rows)), timestamp)
+
+  def __len__(self):
+    with self._lock:
+      return len(self._records())
+
+  def _observation(self, record):
+    temperature=int(record['temperature'])
+    return [float(record['timestamp']), None if temperature == MISSING_TEMPERATURE else temperature, self._descriptions[record['description']]]
+
+  def _period(self, records, start, end):
+    """
+    Returns the first and last+1 positions of the records between `start` and `end`, by binary search on the timestamps.
+    """
+    import numpy as np
+    timestamps=records['timestamp']
+    first=0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+    last=len(records) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+    return first,last
+
+  def history(self, location, start=None, end=None):
+    """
+    Returns the observations of one city, oldest first, reading only the records of that city.
+
+    Args:
+      location (int or str): The BBC location ID, Weather URL or place name of the city.
+      start (float): Only observations at or after this time (seconds since the epoch). None starts at the beginning.
+      end (float): Only observations at or before this time. None ends with the last observation.
+
+    Returns:
+      list of list: [timestamp (float), temperature (int or None), description (str)] per observation.
+    """
+    key=_location(location)
+    if key is None:
+      raise ValueError(f'Invalid location {location}')
+    import numpy as np
+    with self._lock:
+      records=self._records()
+      count=len(records)
+      if self._indexed < count:
+        self._read_heads(count) #another process appended, its heads cover its records
+      indexed=self._indexed
+      chain=self._chain(indexed)
+      first,last=self._period(records, start, end)
+      positions=[]
+      position=self._heads.get(key, -1)
+      while position >= first:
+        if position < last:
+          positions.append(position)
+        position=int(chain[position])
+      positions.reverse()
+      if indexed < last:
+        #records of an append still in progress in another process, which has not written their index yet
+        tail=max(first, indexed)
+        positions+=(tail+np.flatnonzero(records['location'][tail:last] == key)).tolist()
+      return [self._observation(record) for record in records[positions]]
+
+  def snapshot(self, at=None, window=DEFAULT_WINDOW):
+    """
+    Returns the weather of every city as last observed at a moment in time.
+
+    Args:
+      at (float): The moment, in seconds since the epoch. None is the latest observation.
+      window (float): Cities not observed in the `window` seconds before `at` are left out. None looks back to the beginning.
+
+    Returns:
+      dict: A dictionary mapping every BBC location ID to its [timestamp, temperature, description].
+    """
+    import numpy as np
+    with self._lock:
+      records=self._records()
+      if at is None:
+        at=float(records['timestamp'][-1]) if len(records) else 0.0
+      first,last=self._period(records, None if window is None else at-window, at)
+      locations=np.asarray(records['location'][first:last])
+      #the last observation of every city is the first one in reverse order
+      _,latest=np.unique(locations[::-1], return_index=True)
+      return {int(locations[last-first-1-position]):self._observation(records[last-1-position]) for position in latest}
+
+  def close(self):
+    """
+    Releases the memory maps.
+    """
+    with self._lock:
+      self._map=None
+      self._mapped=0
+      self._chain_map=None
+      self._chain_mapped=0
+
+def _location(location):
+  if type(location) is int:
+    return location
+  if type(location) is str and location.isdigit():
+    return int(location)
+  key=weather_cache.location_id(location)
+  if key is None and type(location) is str and '/' not in location:
+    import weather_places
+    place=weather_places.default_place_index().get(location) #a city given by its name
+    if place is not None:
+      key=place[1]
+  return key
+
+_default_store=None
+
+def default_store():
+  """
+  Returns the store `weather_scraper.weather_array_stacker()` writes to by default, or None while history is disabled (the default).
+  """
+  return _default_store
+
+def set_default_store(store):
+  """
+  Installs the store every `weather_scraper.weather_array_stacker()` run appends its rows to.
+
+  Args:
+    store (HistoryStore or None): The new store. None disables the history.
+  """
+  global _default_store
+  _default_store=store
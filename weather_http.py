@@ -0,0 +1,514 @@
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+import logging
+import threading
+import time
+import weather_metrics
+
+DEFAULT_POOL_SIZE = 10 #connections kept alive per host
+DEFAULT_CACHED_BODIES = 256 #pages remembered for conditional requests
+DEFAULT_BURST = 5 #requests a rate limited host may receive at once after a quiet period
+DEFAULT_TIMEOUT = (5, 20) #seconds to open a connection and between two received bytes of the answer
+DEFAULT_HEDGE_DELAY = 2.0 #seconds before a request is hedged while too few latencies of its host are known
+HEDGE_QUANTILE = 0.95 #latency of its host after which a request is hedged
+HEDGE_MIN_SAMPLES = 20 #latencies of a host needed before the quantile replaces DEFAULT_HEDGE_DELAY
+LATENCY_SAMPLES = 200 #most recent latencies kept per host
+DEFAULT_FAILURE_THRESHOLD = 5 #consecutive failures of a host that open its circuit
+DEFAULT_RESET_SECONDS = 30 #seconds an open circuit rejects requests before one trial request is let through
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+  """
+  Token bucket that spaces requests to one host at `rate` per second, while allowing bursts of up to `burst` requests.
+
+  The bucket holds at most `burst` tokens and gains `rate` tokens per second. Every request takes one token, and when
+  none is left it waits until its token has been refilled. Tokens are reserved in the order the requests arrive, so
+  waiting threads are served first come, first served and the long-run rate never exceeds `rate`.
+
+  Args:
+    rate (float): Requests per second.
+    burst (int): Size of the bucket.
+    clock (callable): Returns the current time in seconds, `time.monotonic` by default.
+    sleep (callable): Waits a number of seconds, `time.sleep` by default.
+
+  Example:
+    >>> bucket = TokenBucket(2, burst=1)
+    >>> bucket.acquire(), bucket.acquire()
+    (0.0, 0.5)
+  """
+  def __init__(self, rate, burst=DEFAULT_BURST, clock=time.monotonic, sleep=time.sleep):
+    if not rate > 0 or type(burst) is not int or burst<1:
+      raise ValueError('Invalid rate limit')
+    self.rate=rate
+    self.burst=burst
+    self.clock=clock
+    self.sleep=sleep
+    self._tokens=float(burst)
+    self._updated=clock()
+    self._lock=threading.Lock()
+
+  def acquire(self):
+    """
+    Takes a token, waiting for it when the bucket is empty.
+
+    Returns:
+      float: The seconds waited.
+    """
+    with self._lock:
+      now=self.clock()
+      self._tokens=min(self.burst, self._tokens+(now-self._updated)*self.rate)
+      self._updated=now
+      self._tokens-=1 #a negative balance is the queue of requests waiting for their token
+      wait=max(0.0, -self._tokens/self.rate)
+    if wait > 0:
+      self.sleep(wait)
+    return wait
+
+class CircuitBreaker:
+  """
+  Circuit breaker of one host: after `threshold` consecutive failures the circuit opens and requests fail fast for
+  `reset_seconds`, then a single trial request is let through, which closes the circuit again when it succeeds.
+
+  Args:
+    threshold (int): Consecutive failures that open the circuit.
+    reset_seconds (float): Seconds the circuit stays open before the trial request.
+    clock (callable): Returns the current time in seconds, `time.monotonic` by default.
+
+  Example:
+    >>> breaker = CircuitBreaker(threshold=1)
+    >>> breaker.failure()
+    >>> breaker.allow(), breaker.state
+    (False, 'open')
+  """
+  def __init__(self, threshold=DEFAULT_FAILURE_THRESHOLD, reset_seconds=DEFAULT_RESET_SECONDS, clock=time.monotonic):
+    if type(threshold) is not int or threshold<1 or not reset_seconds >= 0:
+      raise ValueError('Invalid circuit breaker')
+    self.threshold=threshold
+    self.reset_seconds=reset_seconds
+    self.clock=clock
+    self.state='closed' #'closed', 'open' or 'half-open' while the trial request runs
+    self._failures=0
+    self._opened=None
+    self._lock=threading.Lock()
+
+  def allow(self):
+    """
+    Whether a request may be sent now.
+    """
+    with self._lock:
+      if self.state == 'closed':
+        return True
+      if self.state == 'open' and self.clock()-self._opened >= self.reset_seconds:
+        self.state='half-open'
+        return True
+      return False
+
+  def success(self):
+    with self._lock:
+      self.state='closed'
+      self._failures=0
+
+  def failure(self):
+    with self._lock:
+      self._failures+=1
+      if self.state != 'open' and (self.state == 'half-open' or self._failures >= self.threshold):
+        #late failures of requests sent before the circuit opened do not postpone the trial request
+        logger.warning('Circuit opened after %d failures', self._failures)
+        self.state='open'
+        self._opened=self.clock()
+
+class _Flight:
+  """
+  A download in progress, shared by every caller asking for the same url meanwhile.
+  """
+  def __init__(self):
+    self.done=threading.Event()
+    self.text=None
+    self.error=None
+
+class HttpClient:
+  """
+  Shared HTTP layer for the scrapers, with one keep-alive session per host and conditional requests.
+
+  Every host gets its own `requests.Session`, so consecutive requests to bbc.com or geodatos.net reuse the open TCP/TLS
+  connection instead of performing a new handshake. When a page was served with an `ETag` or `Last-Modified` header,
+  the next request for it sends `If-None-Match`/`If-Modified-Since`, and a 304 answer is served from the remembered body.
+
+  Callers asking for a url that is already being downloaded do not send a request of their own, they wait for the
+  download in progress and share its page (or its exception). So concurrent lookups of the same BBC location or the
+  same city by overlapping runs cost one request. With `rate_limit`, the requests to every host are spaced by a
+  `TokenBucket`, which smooths bursts before the website answers them with 429 Too Many Requests.
+
+  Every request has a connect and a read deadline (`timeout`), so a hung connection fails instead of stalling the
+  batch. With `hedge`, a request that has not been answered after the `HEDGE_QUANTILE` latency of its host is sent a
+  second time and the first answer wins, which cuts the slow tail at the cost of about 5% more requests. Timeouts,
+  connection errors, 429 and 5xx answers count as failures of the host's `CircuitBreaker`: while it is open, requests
+  to that host fail fast. A failed or rejected request falls back to the last page downloaded from its url when
+  there is one, so the map keeps the last known weather of a city while its website is unhealthy, and raises otherwise.
+
+  Args:
+    pool_size (int): Maximum number of connections kept alive per host.
+    max_cached_bodies (int): Number of page bodies remembered for conditional requests, the least recently used are dropped.
+    adapter (requests.adapters.BaseAdapter): Optional transport adapter mounted on every session, used to replace the network in tests.
+    rate_limit (float or dict): Maximum requests per second, either one value for every host or a dictionary such as
+      {'www.bbc.com': 5, 'www.geodatos.net': 2}, hosts missing from it are not limited. None disables the limit.
+    burst (int): Requests a host may receive at once before the rate limit spaces them.
+    coalesce (bool): Share concurrent downloads of the same url.
+    timeout (float or tuple): Seconds to wait for the connection and for the answer, as (connect, read) or one value for both.
+      None waits forever.
+    hedge (bool): Send a second request when the first one is slower than usual.
+    failure_threshold (int): Consecutive failures after which a host is considered unhealthy, see `CircuitBreaker`.
+    reset_seconds (float): Seconds requests to an unhealthy host fail fast before it is tried again.
+
+  Example:
+    >>> client = HttpClient()
+    >>> html = client.get_text('https://www.bbc.com/weather/2759794')
+    >>> client.stats()['conditional_hit_rate']
+    0.0
+  """
+  def __init__(self, pool_size=DEFAULT_POOL_SIZE, max_cached_bodies=DEFAULT_CACHED_BODIES, adapter=None, rate_limit=None,
+               burst=DEFAULT_BURST, coalesce=True, timeout=DEFAULT_TIMEOUT, hedge=False, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+               reset_seconds=DEFAULT_RESET_SECONDS):
+    rates=list(rate_limit.values()) if type(rate_limit) is dict else [] if rate_limit is None else [rate_limit]
+    if any(type(rate) not in (int, float) or not rate > 0 for rate in rates) or type(burst) is not int or burst<1:
+      raise ValueError('Invalid rate limit')
+    deadlines=[] if timeout is None else list(timeout) if type(timeout) is tuple else [timeout]
+    if any(type(deadline) not in (int, float) or not deadline > 0 for deadline in deadlines) or len(deadlines) > 2:
+      raise ValueError('Invalid timeout')
+    CircuitBreaker(failure_threshold, reset_seconds) #validates the settings of the breakers
+    self.pool_size=pool_size
+    self.max_cached_bodies=max_cached_bodies
+    self.adapter=adapter
+    self.rate_limit=rate_limit
+    self.burst=burst
+    self.coalesce=coalesce
+    self.timeout=timeout
+    self.hedge=hedge
+    self.failure_threshold=failure_threshold
+    self.reset_seconds=reset_seconds
+    self._sessions={}
+    self._breakers={} #host -> CircuitBreaker
+    self._latencies={} #host -> recent request durations
+    self._executor=None #threads of the hedged requests, started on first use
+    self._buckets={} #host -> TokenBucket, None for hosts without limit
+    self._flights={} #url -> _Flight of the download in progress
+    self._validators=OrderedDict() #url -> (etag, last_modified, text, size) of the last page downloaded
+    self._lock=threading.Lock()
+    self._counters={'requests':0,'not_modified':0,'bytes_downloaded':0,'bytes_saved':0,'coalesced':0,'throttled':0,'throttle_wait_seconds':0.0,
+      'failures':0,'rejected':0,'fallbacks':0,'hedged':0,'hedge_wins':0}
+
+  def _session(self, host):
+    with self._lock:
+      session=self._sessions.get(host)
+      if session is None:
+        #requests is only loaded once the first page is downloaded, which keeps importing the scrapers cheap
+        import requests
+        from requests.adapters import HTTPAdapter
+        session=requests.Session()
+        adapter=self.adapter or HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self._sessions[host]=session
+      return session
+
+  def _bucket(self, host):
+    with self._lock:
+      if host not in self._buckets:
+        rate=self.rate_limit.get(host) if type(self.rate_limit) is dict else self.rate_limit
+        self._buckets[host]=None if rate is None else TokenBucket(rate, self.burst)
+      return self._buckets[host]
+
+  def _breaker(self, host):
+    with self._lock:
+      breaker=self._breakers.get(host)
+      if breaker is None:
+        breaker=self._breakers[host]=CircuitBreaker(self.failure_threshold, self.reset_seconds)
+      return breaker
+
+  def hedge_delay(self, host):
+    """
+    Returns the seconds after which a request to `host` is hedged: the `HEDGE_QUANTILE` of its recent latencies, or
+    `DEFAULT_HEDGE_DELAY` while fewer than `HEDGE_MIN_SAMPLES` are known.
+    """
+    with self._lock:
+      samples=sorted(self._latencies.get(host, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+      return DEFAULT_HEDGE_DELAY
+    return samples[min(len(samples)-1, int(HEDGE_QUANTILE*len(samples)))]
+
+  def get_text(self, url):
+    """
+    Downloads a page and returns its decoded text, exactly like `requests.get(url).text`.
+
+    Args:
+      url (str): The address of the page.
+
+    Returns:
+      str: The body of the page. On a 304 answer this is the body remembered from the previous download, on a 429 or 5xx
+        answer the last page downloaded from the url, and a ValueError is raised when there is none.
+    """
+    if not self.coalesce:
+      return self._download(url)
+    with self._lock:
+      flight=self._flights.get(url)
+      leader=flight is None
+      if leader:
+        flight=self._flights[url]=_Flight()
+      else:
+        self._counters['coalesced']+=1
+    if not leader:
+      flight.done.wait()
+      if flight.error is not None:
+        raise flight.error
+      return flight.text
+    try:
+      flight.text=self._download(url)
+      return flight.text
+    except BaseException as error:
+      flight.error=error #the waiting callers raise the same exception
+      raise
+    finally:
+      with self._lock:
+        del self._flights[url]
+      flight.done.set()
+
+  def _download(self, url):
+    """
+    Sends the request of `get_text()` unless the circuit of its host is open, and falls back to the last page of the
+    url when it fails.
+    """
+    host=urlsplit(url).netloc
+    breaker=self._breaker(host)
+    if not breaker.allow():
+      with self._lock:
+        self._counters['rejected']+=1
+      fallback=self._fallback(url)
+      if fallback is None:
+        raise ValueError(f'{host} is unavailable')
+      return fallback
+    try:
+      if self.hedge:
+        text,status=self._hedged(url, host)
+      else:
+        self._throttle(host)
+        text,status=self._request(url, host)
+    except Exception as error:
+      breaker.failure()
+      with self._lock:
+        self._counters['failures']+=1
+      fallback=self._fallback(url)
+      if fallback is None:
+        raise
+      logger.warning('Serving the last page of %s: %s', url, error)
+      return fallback
+    if status == 429 or status >= 500:
+      breaker.failure()
+      with self._lock:
+        self._counters['failures']+=1
+      fallback=self._fallback(url)
+      if fallback is None:
+        raise ValueError(f'{host} answered {status}') #the body of an error page is not a weather page
+      logger.warning('Serving the last page of %s: %s answered %s', url, host, status)
+      return fallback
+    breaker.success()
+    return text
+
+  def _fallback(self, url):
+    """
+    Returns the last page downloaded from `url`, or None.
+    """
+    with self._lock:
+      remembered=self._validators.get(url)
+      if remembered is None:
+        return None
+      self._counters['fallbacks']+=1
+      return remembered[2]
+
+  def _throttle(self, host):
+    """
+    Waits for the rate limit of the host, if it has one.
+    """
+    bucket=self._bucket(host)
+    if bucket is not None:
+      waited=bucket.acquire()
+      if waited > 0:
+        with self._lock:
+          self._counters['throttled']+=1
+          self._counters['throttle_wait_seconds']+=waited
+
+  def _hedged(self, url, host):
+    """
+    Sends the request and, when it is slower than `hedge_delay()`, a second one, returning the first answer.
+
+    Both requests wait for the rate limit before they are sent and before the delay of the hedge starts, so only
+    the latency of the network can trigger a hedge.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+    with self._lock:
+      if self._executor is None:
+        self._executor=ThreadPoolExecutor(max_workers=4*self.pool_size, thread_name_prefix='hedge')
+      executor=self._executor
+    self._throttle(host)
+    first=executor.submit(self._request, url, host)
+    done,_=wait([first], timeout=self.hedge_delay(host))
+    if done:
+      return first.result()
+    self._throttle(host)
+    done,_=wait([first], timeout=0) #the first answer may have come while waiting for a token
+    if done:
+      return first.result()
+    with self._lock:
+      self._counters['hedged']+=1
+    pending={first, executor.submit(self._request, url, host)}
+    while pending:
+      done,pending=wait(pending, return_when=FIRST_COMPLETED)
+      for future in done:
+        if future.exception() is None:
+          if future is not first:
+            with self._lock:
+              self._counters['hedge_wins']+=1
+          return future.result() #the slower request finishes in the background, its answer is dropped
+    return first.result() #both failed, the error of the first is raised
+
+  def _request(self, url, host):
+    """
+    Sends one request, the caller has waited for the rate limit of the host.
+
+    Returns:
+      tuple: (text, status), the status code of the answer.
+    """
+    with self._lock:
+      remembered=self._validators.get(url)
+      if remembered is not None:
+        self._validators.move_to_end(url)
+    headers={}
+    if remembered is not None:
+      etag,last_modified,_,_=remembered
+      if etag:
+        headers['If-None-Match']=etag
+      if last_modified:
+        headers['If-Modified-Since']=last_modified
+    session=self._session(host)
+    with weather_metrics.stage('http', host=host) as event:
+      if event.enabled:
+        opened=self._connections(session, url)
+      start=time.perf_counter()
+      response=session.get(url, headers=headers, timeout=self.timeout)
+      size=len(response.content)
+      duration=time.perf_counter()-start
+      if event.enabled:
+        #a new connection means this request paid for the DNS lookup and the TLS handshake, `wait` includes both
+        event.set(bytes=size, status=response.status_code, wait=response.elapsed.total_seconds(),
+          new_connection=self._connections(session, url)>opened, cache='hit' if response.status_code == 304 else 'miss')
+    failed=response.status_code == 429 or response.status_code >= 500
+    with self._lock:
+      self._counters['requests']+=1
+      self._counters['bytes_downloaded']+=size
+      self._latencies.setdefault(host, deque(maxlen=LATENCY_SAMPLES)).append(duration)
+      if response.status_code == 304 and remembered is not None:
+        self._counters['not_modified']+=1
+        self._counters['bytes_saved']+=remembered[3]
+        return remembered[2],304
+      etag=response.headers.get('ETag')
+      last_modified=response.headers.get('Last-Modified')
+      if response.status_code == 200:
+        #pages without validators are remembered too, as the fallback of a failing host
+        self._validators[url]=(etag,last_modified,response.text,size)
+        self._validators.move_to_end(url)
+        while len(self._validators)>self.max_cached_bodies:
+          self._validators.popitem(last=False)
+      elif not failed:
+        self._validators.pop(url, None)
+    return response.text,response.status_code
+
+  def _connections(self, session, url):
+    """
+    Returns the number of connections the pool of `url` has opened so far, 0 for adapters without a pool.
+    """
+    manager=getattr(session.get_adapter(url), 'poolmanager', None)
+    return 0 if manager is None else manager.connection_from_url(url).num_connections
+
+  def stats(self):
+    """
+    Reports how much work the session layer saved.
+
+    Returns:
+      dict: A dictionary with:
+        - requests (int): Requests sent.
+        - not_modified (int): Requests answered with 304 and served from the remembered body.
+        - conditional_hit_rate (float): Fraction of requests answered with 304.
+        - bytes_downloaded (int): Body bytes received.
+        - bytes_saved (int): Body bytes that did not have to be downloaded again thanks to a 304.
+        - connections_opened (int): New TCP connections made by the pools.
+        - connection_reuse_rate (float): Fraction of requests sent over an already open connection.
+        - coalesced (int): Calls that shared the download of another call instead of sending a request.
+        - throttled (int): Requests that waited for the rate limit of their host.
+        - throttle_wait_seconds (float): Total time requests waited for the rate limit.
+        - failures (int): Requests that timed out, could not connect or were answered with 429 or 5xx.
+        - rejected (int): Requests not sent because the circuit of their host was open.
+        - fallbacks (int): Failed or rejected requests answered with the last page of their url.
+        - hedged (int): Requests sent a second time because the first was slow.
+        - hedge_wins (int): Hedged requests whose second request answered first.
+        - hosts (dict): For every contacted host its circuit state ('closed', 'open' or 'half-open') and the
+          seconds after which its requests are hedged, as {'state': str, 'hedge_delay': float}.
+    """
+    with self._lock:
+      stats=dict(self._counters)
+      sessions=list(self._sessions.values())
+      breakers=dict(self._breakers)
+    stats['hosts']={host:{'state':breaker.state, 'hedge_delay':self.hedge_delay(host)} for host,breaker in breakers.items()}
+    opened=0
+    for session in sessions:
+      for adapter in set(session.adapters.values()):
+        manager=getattr(adapter, 'poolmanager', None)
+        if manager is None:
+          continue
+        for key in manager.pools.keys():
+          pool=manager.pools.get(key)
+          if pool is not None:
+            opened+=pool.num_connections
+    requests_sent=stats['requests']
+    stats['conditional_hit_rate']=stats['not_modified']/requests_sent if requests_sent else 0.0
+    stats['connections_opened']=opened
+    stats['connection_reuse_rate']=max(0.0, 1-opened/requests_sent) if requests_sent else 0.0
+    return stats
+
+  def close(self):
+    with self._lock:
+      for session in self._sessions.values():
+        session.close()
+      self._sessions={}
+      executor,self._executor=self._executor,None
+    if executor is not None:
+      executor.shutdown(wait=False)
+
+_default_client=None
+_default_lock=threading.Lock()
+
+def default_client():
+  """
+  Returns the client shared by `bbc_weather_scraper()` and `dutch_coordinates()`, creating it on first use.
+  """
+  global _default_client
+  with _default_lock:
+    if _default_client is None:
+      _default_client=HttpClient()
+    return _default_client
+
+def set_default_client(client):
+  """
+  Replaces the client shared by the scrapers.
+
+  Args:
+    client (HttpClient or None): The new client. None creates a fresh default client on next use.
+  """
+  global _default_client
+  with _default_lock:
+    _default_client=client
+
+def get_text(url):
+  """
+  Downloads a page through the shared client, see `HttpClient.get_text()`.
+  """
+  return default_client().get_text(url)
@@ -0,0 +1,257 @@
+import heapq
+import threading
+import numpy as np
+
+EARTH_RADIUS = 6371.0 #mean radius of the earth in km
+LEAF_SIZE = 16 #stations below which a branch of the tree is scanned at once
+REBUILD_FRACTION = 0.25 #share of moved, added or removed stations after which the tree is rebuilt
+
+def _unit_vectors(latitude, longitude):
+  """
+  Converts coordinates in degrees to points on the unit sphere, whose straight-line distances order exactly like great-circle distances.
+  """
+  latitude=np.radians(np.asarray(latitude, dtype=float))
+  longitude=np.radians(np.asarray(longitude, dtype=float))
+  return np.stack([np.cos(latitude)*np.cos(longitude), np.cos(latitude)*np.sin(longitude), np.sin(latitude)], axis=-1)
+
+def _kilometres(squared_chord):
+  return 2*EARTH_RADIUS*np.arcsin(np.minimum(1.0, np.sqrt(squared_chord)/2))
+
+class StationIndex:
+  """
+  KD-tree over the coordinates of the weather stations, answering "what is the weather at this point" without scanning every row.
+
+  The stations are rows of `weather_scraper.weather_array_stacker()` ([City, temp_max, weather, latitude, longitude]),
+  each stored under a key such as its BBC Weather URL. Coordinates are placed on the unit sphere, so the nearest
+  stations are exact great-circle neighbours and distances are reported in kilometres. A query visits O(log n) nodes
+  of the tree.
+
+  Refreshing a station whose coordinates did not change only replaces its row. A station that moved or is new is kept
+  in a small side list that every query scans, and removed stations are skipped, until they make up `REBUILD_FRACTION`
+  of the index and the tree is rebuilt, so a stream of refreshes costs amortised O(log n) per row.
+  All methods can be called from several threads.
+
+  Args:
+    rows (list of list): The initial stations.
+    keys (list): The key of every row, for example the `url_list` the rows were scraped from. Defaults to the city names.
+
+  Example:
+    >>> index = StationIndex(weather_array_stacker(url_list), url_list)
+    >>> index.nearest(52.09, 5.12, k=2)
+    [('https://www.bbc.com/weather/2745912', ['Utrecht', 15, 'Sunny', 52.09083, 5.12222], 0.21), ...]
+    >>> distances, keys = index.query([52.09, 51.44], [5.12, 5.48])
+  """
+  def __init__(self, rows=(), keys=None):
+    rows=list(rows)
+    if keys is None:
+      keys=[row[0] for row in rows]
+    if len(keys) != len(rows):
+      raise ValueError('Every row needs a key')
+    self._lock=threading.Lock()
+    self._rows={} #key -> row
+    self._slots={} #key -> position of its point
+    self._keys=[] #position -> key, None for a removed station
+    self._points=np.empty((0, 3))
+    self._order=np.empty(0, dtype=np.intp) #positions in tree order
+    self._split=np.empty(0, dtype=np.int8) #split axis of the node stored at each tree position
+    self._pending=[] #positions added since the last rebuild, scanned by every query
+    self._removed=0 #removed positions still in the tree
+    self._rebuilds=0
+    for key,row in zip(keys, rows):
+      self._put(key, row)
+    self._rebuild()
+
+  def _put(self, key, row):
+    latitude,longitude=row[3],row[4]
+    slot=self._slots.get(key)
+    if slot is not None:
+      old=self._rows[key]
+      if old[3] == latitude and old[4] == longitude:
+        self._rows[key]=row #only the weather changed, the tree stays valid
+        return
+      self._drop(key)
+    slot=len(self._keys)
+    self._keys.append(key)
+    self._slots[key]=slot
+    self._rows[key]=row
+    if slot >= len(self._points):
+      grown=np.empty((max(16, 2*len(self._points)), 3))
+      grown[:len(self._points)]=self._points
+      self._points=grown
+    self._points[slot]=_unit_vectors(latitude, longitude)
+    self._pending.append(slot)
+
+  def _drop(self, key):
+    slot=self._slots.pop(key)
+    del self._rows[key]
+    self._keys[slot]=None
+    if slot in self._pending:
+      self._pending.remove(slot)
+    else:
+      self._removed+=1
+
+  def _rebuild(self):
+    """
+    Rebuilds the tree from the live stations, discarding the positions of removed ones.
+    """
+    keys=list(self._rows)
+    points=self._points[[self._slots[key] for key in keys]] if keys else np.empty((0, 3))
+    self._keys=keys
+    self._slots={key:slot for slot,key in enumerate(keys)}
+    self._points=points
+    self._pending=[]
+    self._removed=0
+    self._rebuilds+=1
+    order=np.arange(len(keys))
+    split=np.zeros(len(keys), dtype=np.int8)
+    branches=[(0, len(keys))]
+    while branches:
+      low,high=branches.pop()
+      if high-low <= LEAF_SIZE:
+        continue
+      branch=points[order[low:high]]
+      axis=int(np.argmax(branch.max(axis=0)-branch.min(axis=0))) #split along the widest side
+      middle=(low+high)//2
+      order[low:high]=order[low:high][np.argpartition(branch[:, axis], middle-low)]
+      split[middle]=axis
+      branches+=[(low, middle), (middle+1, high)]
+    self._order=order
+    self._split=split
+
+  def _maybe_rebuild(self):
+    if len(self._pending)+self._removed > max(LEAF_SIZE, REBUILD_FRACTION*len(self._rows)):
+      self._rebuild()
+
+  def update(self, key, row):
+    """
+    Adds a station or replaces its row after a refresh.
+
+    Args:
+      key: The key of the station, for example its BBC Weather URL.
+      row (list): [City (str), temp_max (int), weather (str), latitude (float), longitude (float)]
+    """
+    with self._lock:
+      self._put(key, row)
+      self._maybe_rebuild()
+
+  def remove(self, key):
+    """
+    Removes a station, unknown keys are ignored.
+    """
+    with self._lock:
+      if key in self._slots:
+        self._drop(key)
+        self._maybe_rebuild()
+
+  def __len__(self):
+    return len(self._rows)
+
+  def __contains__(self, key):
+    return key in self._rows
+
+  def _search(self, target, count):
+    """
+    Returns the (squared chord, position) pairs of the `count` nearest live stations, nearest first.
+    """
+    points=self._points
+    order=self._order
+    split=self._split
+    keys=self._keys
+    heap=[] #(-squared chord, position), the farthest of the best candidates on top
+
+    def consider(slots):
+      distances=((points[slots]-target)**2).sum(axis=1)
+      for slot,distance in zip(slots.tolist(), distances.tolist()):
+        if keys[slot] is None:
+          continue
+        if len(heap) < count:
+          heapq.heappush(heap, (-distance, slot))
+        elif distance < -heap[0][0]:
+          heapq.heapreplace(heap, (-distance, slot))
+
+    def descend(low, high):
+      if high-low <= LEAF_SIZE:
+        if high > low:
+          consider(order[low:high])
+        return
+      middle=(low+high)//2
+      consider(order[middle:middle+1])
+      axis=split[middle]
+      difference=target[axis]-points[order[middle], axis]
+      near,far=((low, middle), (middle+1, high)) if difference < 0 else ((middle+1, high), (low, middle))
+      descend(*near)
+      #the other side can only hold a closer station when the splitting plane is closer than the current worst
+      if len(heap) < count or difference*difference < -heap[0][0]:
+        descend(*far)
+
+    descend(0, len(order))
+    if self._pending:
+      consider(np.array(self._pending))
+    return sorted((-distance, slot) for distance,slot in heap)
+
+  def nearest(self, latitude, longitude, k=1):
+    """
+    Finds the stations nearest to a point.
+
+    Args:
+      latitude (float): Latitude of the point in degrees.
+      longitude (float): Longitude of the point in degrees.
+      k (int): Number of stations.
+
+    Returns:
+      list of tuple: (key, row, distance in km) of at most `k` stations, nearest first.
+    """
+    if type(k) is not int or k<1:
+      raise ValueError('Invalid number of neighbours')
+    target=_unit_vectors(latitude, longitude)
+    with self._lock:
+      found=self._search(target, k)
+      return [(self._keys[slot], self._rows[self._keys[slot]], float(_kilometres(distance))) for distance,slot in found]
+
+  def query(self, latitudes, longitudes, k=1):
+    """
+    Finds the nearest stations of many points at once.
+
+    Args:
+      latitudes (array-like): Latitudes of the points in degrees.
+      longitudes (array-like): Longitudes of the points, in the same order.
+      k (int): Number of stations per point.
+
+    Returns:
+      tuple: (distances, keys), two arrays of shape (points, k) with the distances in km and the keys of the
+        stations, nearest first. When the index holds fewer than `k` stations the missing ones are inf and None.
+    """
+    if type(k) is not int or k<1:
+      raise ValueError('Invalid number of neighbours')
+    targets=_unit_vectors(latitudes, longitudes).reshape(-1, 3)
+    distances=np.full((len(targets), k), np.inf)
+    keys=np.full((len(targets), k), None, dtype=object)
+    with self._lock:
+      for position,target in enumerate(targets):
+        for rank,(distance,slot) in enumerate(self._search(target, k)):
+          distances[position, rank]=distance
+          keys[position, rank]=self._keys[slot]
+    finite=np.isfinite(distances)
+    distances[finite]=_kilometres(distances[finite])
+    return distances,keys
+
+  def row(self, key):
+    """
+    Returns the current row of a station, or None for an unknown key.
+    """
+    with self._lock:
+      return self._rows.get(key)
+
+  def stats(self):
+    """
+    Reports the state of the index.
+
+    Returns:
+      dict: A dictionary with:
+        - stations (int): Stations in the index.
+        - pending (int): Moved or added stations not yet in the tree.
+        - removed (int): Removed stations still taking a place in the tree.
+        - rebuilds (int): Times the tree was built.
+    """
+    with self._lock:
+      return {'stations':len(self._rows), 'pending':len(self._pending), 'removed':self._removed, 'rebuilds':self._rebuilds}
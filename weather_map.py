@@ -0,0 +1,376 @@
+import json
+import os
+import time
+from branca.element import MacroElement
+import folium
+from folium.plugins import FastMarkerCluster
+from folium.utilities import JsCode
+from jinja2 import Template
+import weather_cache
+import weather_scraper
+import weather_table
+from weather_scraper import DATA_FILE, DEFAULT_HOST_CONCURRENCY, MAP_FILE, MAP_MODES
+
+MAP_CENTRE = [52.3784, 4.9009] #centre of the Netherlands map
+MAP_ZOOM = 7
+
+#client-side construction of the temperature icons, shared by the geojson and cluster modes
+_ICON_JS = """L.marker(latlng, {icon: L.divIcon({className: '', html: '<div style="font-size: 16pt; color: ' + colour + ';">' + temperature + '</div>'})}).bindPopup(popup)"""
+_GEOJSON_POINT_JS = "function(feature, latlng) { var colour = feature.properties.colour, temperature = feature.properties.temperature, popup = feature.properties.popup; return " + _ICON_JS + "; }"
+_CLUSTER_POINT_JS = "function(row) { var latlng = L.latLng(row[0], row[1]), temperature = row[2], colour = row[3], popup = row[4]; return " + _ICON_JS + "; }"
+
+def build_map(table, mode='markers', surface=None):
+  """
+  Draws the stations of a weather table on a Folium map of The Netherlands.
+
+  Three rendering modes are available:
+    - 'markers': one `folium.Marker` with its own `DivIcon` per station, as the map always had. Fine for tens of cities.
+    - 'geojson': all stations in a single GeoJSON layer, the icons and popups are built by the browser from the feature properties.
+    - 'cluster': all stations in a `FastMarkerCluster`, which also groups nearby stations while zoomed out.
+  The last two keep the generated HTML small and fast to load for thousands of stations.
+
+  Args:
+      table (WeatherTable): The stations, as returned by `weather_scraper.weather_table_stacker()`.
+      mode (str): One of `MAP_MODES`.
+      surface (TemperatureSurface): Also draws the temperatures interpolated by a `weather_surface.TemperatureSurface`
+        as a coloured image below the stations. None draws the stations only.
+
+  Returns:
+      folium.Map: The map, ready to be saved.
+
+  Example:
+      >>> build_map(weather_scraper.weather_table_stacker(url_list), mode='geojson').save('map.html')
+      >>> build_map(table, surface=weather_surface.default_surface()).save('surface.html')
+  """
+  if mode not in MAP_MODES:
+    raise ValueError('Invalid map mode')
+  netherlands_map = folium.Map(location=MAP_CENTRE, zoom_start=MAP_ZOOM)#location of the map
+  if surface is not None:
+    _add_surface(netherlands_map, table, surface)
+  _add_stations(netherlands_map, table, mode)
+  return netherlands_map
+
+def _add_surface(parent, table, surface):
+  """
+  Adds the interpolated temperature surface of a weather table to a map as an image overlay.
+  """
+  import weather_surface
+  image = weather_surface.surface_image(surface.interpolate(table))
+  #the grid is regular in latitude, the overlay is stretched to the Web Mercator projection of the tiles
+  folium.raster_layers.ImageOverlay(image, bounds=[list(corner) for corner in surface.bounds], mercator_project=True,
+    pixelated=False, name='Temperature').add_to(parent)
+
+def _add_stations(parent, table, mode):
+  """
+  Adds the stations of a weather table to a map or a feature group, in one of the `MAP_MODES`.
+  """
+  colours = weather_scraper.marker_colours(table.temperature).tolist()#determines the colour of every marker based on temperature
+  if mode == 'markers':
+    for (city, temperature, description, latitude, longitude), colour in zip(table, colours):#creates a marker for each point
+      folium.Marker(
+          location=[latitude,longitude],#places marker on coordinates
+          popup=f"{city} - {temperature} - {description}",  # Weather description is added to the pop up
+          icon=folium.DivIcon(html=f'<div style="font-size: 16pt; color: {colour};">{temperature}</div>')#uses temperature as number icon of the correct colour
+      ).add_to(parent)
+  elif mode == 'geojson':
+    features = [{'type':'Feature', 'geometry':{'type':'Point', 'coordinates':[longitude, latitude]},
+                 'properties':{'temperature':temperature, 'colour':colour, 'popup':f"{city} - {temperature} - {description}"}}
+                for (city, temperature, description, latitude, longitude), colour in zip(table, colours)]
+    folium.GeoJson({'type':'FeatureCollection', 'features':features}, name='Weather', point_to_layer=JsCode(_GEOJSON_POINT_JS)).add_to(parent)
+  else:
+    points = [[latitude, longitude, temperature, colour, f"{city} - {temperature} - {description}"]
+              for (city, temperature, description, latitude, longitude), colour in zip(table, colours)]
+    FastMarkerCluster(points, callback=_CLUSTER_POINT_JS, name='Weather').add_to(parent)
+
+def forecast_tables(forecasts):
+  """
+  Splits the multi-day forecasts of `weather_scraper.weather_forecast_stacker()` into one weather table per day.
+
+  The temperature of a station is its maximum of the day, or its minimum when BBC no longer shows today's maximum.
+
+  Args:
+      forecasts (list of list): Rows of the form [City (str), days (list), latitude (float), longitude (float)].
+
+  Returns:
+      list of tuple: (date (str), WeatherTable) for every day, dated as on the page of the first city.
+        A station with a shorter forecast is left out of the days it does not cover.
+  """
+  count = max(len(days) for _, days, _, _ in forecasts)
+  dates = {}
+  rows = [[] for _ in range(count)]
+  for city, days, latitude, longitude in forecasts:
+    for position, (date, high, low, description) in enumerate(days):
+      dates.setdefault(position, date)
+      temperature = high if high is not None else low
+      if temperature is not None:
+        rows[position].append([city, temperature, description, latitude, longitude])
+  return [(dates[position], weather_table.WeatherTable.from_rows(rows[position])) for position in range(count)]
+
+def build_forecast_map(forecasts, mode='markers'):
+  """
+  Draws the multi-day forecasts on one map with a day selector: every day is a layer of its own and the radio buttons
+  in the corner switch between them, today is shown first.
+
+  Args:
+      forecasts (list of list): The rows of `weather_scraper.weather_forecast_stacker()`.
+      mode (str): One of `MAP_MODES`, used for every day.
+
+  Returns:
+      folium.Map: The map, ready to be saved.
+
+  Example:
+      >>> build_forecast_map(weather_scraper.weather_forecast_stacker(url_list)).save('forecast.html')
+  """
+  if mode not in MAP_MODES:
+    raise ValueError('Invalid map mode')
+  netherlands_map = folium.Map(location=MAP_CENTRE, zoom_start=MAP_ZOOM, tiles=None)
+  #the tiles stay out of the selector, which would otherwise offer them as one more choice
+  folium.TileLayer('OpenStreetMap', control=False).add_to(netherlands_map)
+  for position, (date, table) in enumerate(forecast_tables(forecasts)):
+    day = folium.FeatureGroup(name=date, overlay=False, show=position == 0)
+    _add_stations(day, table, mode)
+    day.add_to(netherlands_map)
+  folium.LayerControl(collapsed=False).add_to(netherlands_map)
+  return netherlands_map
+
+class _StationDataLayer(MacroElement):
+  """
+  Script of the map shell that loads the stations from the JSON data file and only redraws the stations that changed.
+  """
+  _template = Template("""
+    {% macro script(this, kwargs) %}
+    (function() {
+      var map = {{ this._parent.get_name() }};
+      var markers = {}, versions = {};
+      function draw(id, station) {
+        var latlng = L.latLng(station.latitude, station.longitude), temperature = station.temperature, colour = station.colour, popup = station.popup;
+        if (markers[id]) { map.removeLayer(markers[id]); }
+        markers[id] = """ + _ICON_JS + """.addTo(map);
+      }
+      function refresh() {
+        fetch({{ this.data_url|tojson }}, {cache: 'no-cache'}).then(function(response) { return response.json(); }).then(function(data) {
+          for (var id in markers) {
+            if (!(id in data.stations)) { map.removeLayer(markers[id]); delete markers[id]; delete versions[id]; }
+          }
+          for (var id in data.stations) {
+            var version = JSON.stringify(data.stations[id]);
+            if (versions[id] !== version) { draw(id, data.stations[id]); versions[id] = version; }
+          }
+        });
+      }
+      refresh();
+      {% if this.refresh_seconds %}setInterval(refresh, {{ this.refresh_seconds * 1000 }});{% endif %}
+    })();
+    {% endmacro %}
+  """)
+
+  def __init__(self, data_url, refresh_seconds):
+    super().__init__()
+    self._name = 'StationDataLayer'
+    self.data_url = data_url
+    self.refresh_seconds = refresh_seconds
+
+def save_map(table, output=MAP_FILE, mode='markers', surface=None):
+  """
+  Draws the stations with `build_map()` and replaces the HTML map in one step.
+
+  Args:
+      table (WeatherTable): The stations to draw.
+      output (str): Path of the HTML map.
+      mode (str): 'markers', 'geojson' or 'cluster'.
+      surface (TemperatureSurface): Optional interpolated temperature surface, see `build_map()`.
+
+  Returns:
+      None
+  """
+  _atomic_write(output, build_map(table, mode, surface).get_root().render())
+
+def save_forecast_map(forecasts, output=MAP_FILE, mode='markers'):
+  """
+  Draws the multi-day forecasts with `build_forecast_map()` and replaces the HTML map in one step, see `save_map()`.
+  """
+  _atomic_write(output, build_forecast_map(forecasts, mode).get_root().render())
+
+def _atomic_write(path, text):
+  """
+  Replaces a file in one step, so a browser or server reading it never sees a half written file.
+  """
+  folder=os.path.dirname(os.path.abspath(path))
+  try:
+    mode=os.stat(path).st_mode & 0o7777 #a replaced file keeps its permissions
+  except FileNotFoundError:
+    mode=None
+  while True:
+    temporary=os.path.join(folder, '.'+os.path.basename(path)+'.'+os.urandom(6).hex()+'.tmp')
+    try:
+      #unlike mkstemp, which creates 0600, a new file gets the permissions of open() as the umask allows
+      handle=os.open(temporary, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+      break
+    except FileExistsError:
+      continue
+  try:
+    with os.fdopen(handle, 'w', encoding='utf-8') as file:
+      file.write(text)
+    if mode is not None:
+      os.chmod(temporary, mode)
+    os.replace(temporary, path)
+  except BaseException:
+    os.remove(temporary)
+    raise
+
+def write_map_shell(shell_path=MAP_FILE, data_path=DATA_FILE, refresh_seconds=300):
+  """
+  Writes the HTML shell of the incremental map: the Folium map without any station, plus a script that loads the
+  stations from the JSON data file written by `refresh_map_data()` and polls it for changes.
+
+  Browsers do not allow a page opened from disk to load a data file, so the folder has to be served over HTTP,
+  for example with `python -m http.server`.
+
+  Args:
+      shell_path (str): Where the HTML shell is written.
+      data_path (str): The JSON data file, referenced relative to the shell.
+      refresh_seconds (int): How often the page checks the data file for changes. 0 loads it only once.
+
+  Returns:
+      None
+  """
+  netherlands_map = folium.Map(location=MAP_CENTRE, zoom_start=MAP_ZOOM)#location of the map
+  data_url = os.path.relpath(os.path.abspath(data_path), os.path.dirname(os.path.abspath(shell_path))).replace(os.sep, '/')
+  _StationDataLayer(data_url, refresh_seconds).add_to(netherlands_map)
+  _atomic_write(shell_path, netherlands_map.get_root().render())
+
+def _station_key(location):
+  """
+  Returns the key of a station in the JSON data file: the BBC location ID of a URL, location ID or place name, as a
+  string, so a city has one entry however it was given. None when there is no location ID, such as for an unknown name.
+  """
+  try:
+    url,_ = weather_scraper.resolve_location(location)
+  except ValueError:
+    return None
+  key = weather_cache.location_id(url)
+  return None if key is None else str(key)
+
+def station_payload(table, url_list):
+  """
+  Converts a weather table into the stations of the JSON data file, keyed by BBC location ID.
+
+  Args:
+      table (WeatherTable): The stations, in the same order as `url_list`.
+      url_list (list of str): The BBC Weather URLs, location IDs or place names the stations were scraped from.
+
+  Returns:
+      dict: A dictionary mapping the location ID (as a string) to the city, temperature, description, coordinates,
+        marker colour and popup text of the station.
+  """
+  colours = weather_scraper.marker_colours(table.temperature).tolist()
+  stations = {}
+  for url, (city, temperature, description, latitude, longitude), colour in zip(url_list, table, colours):
+    key = _station_key(url)
+    stations[key if key is not None else city] = {'city':city, 'temperature':temperature, 'description':description,
+      'latitude':latitude, 'longitude':longitude, 'colour':colour, 'popup':f"{city} - {temperature} - {description}"}
+  return stations
+
+def refresh_map_data(url_list, data_path=DATA_FILE, max_workers=1, per_host_limit=DEFAULT_HOST_CONCURRENCY, pipeline=None):
+  """
+  Scrapes the cities and rewrites the JSON data file of the incremental map, but only when a station changed.
+
+  The previous data file is compared station by station with the new data. When nothing changed the file is not
+  touched at all, otherwise it is replaced atomically. No map HTML is generated.
+
+  Args:
+      url_list (list of str): A list of BBC Weather URLs, see `weather_scraper.weather_array_stacker()`.
+      data_path (str): The JSON data file loaded by the map shell.
+      max_workers (int): Number of cities scraped at the same time.
+      per_host_limit (int or dict): Maximum simultaneous requests per host.
+      pipeline (PipelinedStacker): Optional pipelined executor, see `weather_scraper.weather_array_stacker()`.
+
+  Returns:
+      list of str: The location IDs of the stations that were added, changed or removed.
+  """
+  return write_map_data(weather_scraper.weather_table_stacker(url_list, max_workers, per_host_limit, pipeline), url_list, data_path)
+
+def write_map_data(table, url_list, data_path=DATA_FILE):
+  """
+  Rewrites the JSON data file of the incremental map from stations that were already scraped, but only when a station changed.
+
+  Args:
+      table (WeatherTable): The stations, in the same order as `url_list`.
+      url_list (list of str): The BBC Weather URLs the stations were scraped from.
+      data_path (str): The JSON data file loaded by the map shell.
+
+  Returns:
+      list of str: The location IDs of the stations that were added, changed or removed.
+  """
+  stations = station_payload(table, url_list)
+  previous = {}
+  if os.path.exists(data_path):
+    try:
+      with open(data_path, encoding='utf-8') as file:
+        previous = json.load(file).get('stations', {})
+    except (ValueError, OSError):
+      previous = {} #a corrupt or unreadable data file is simply rewritten
+  changed = [key for key in stations if previous.get(key) != stations[key]]
+  changed += [key for key in previous if key not in stations]
+  if changed:
+    _atomic_write(data_path, json.dumps({'updated':time.time(), 'stations':stations}, separators=(',', ':')))
+  return changed
+
+def stream_map_data(results, data_path=DATA_FILE, flush_seconds=5):
+  """
+  Writes the JSON data file of the incremental map while the stations are still being scraped.
+
+  `results` is consumed one station at a time, as yielded by `weather_scraper.weather_array_stream()`, and the data file
+  is rewritten every `flush_seconds` seconds when a station changed, so an open map fills up during a long scrape.
+  A station that failed keeps its entry of the previous data file, stations that were not in the stream are removed
+  at the end.
+
+  Args:
+      results (iterable of tuple): (position, url, row, error) tuples, see `weather_scraper.weather_array_stream()`.
+      data_path (str): The JSON data file loaded by the map shell.
+      flush_seconds (float): Minimum seconds between two rewrites of the data file, 0 rewrites it after every change.
+
+  Returns:
+      tuple: (changed, failures), the location IDs of the stations that were added, changed or removed,
+        and the (url, error) pairs of the stations that failed.
+  """
+  previous = {}
+  if os.path.exists(data_path):
+    try:
+      with open(data_path, encoding='utf-8') as file:
+        previous = json.load(file).get('stations', {})
+    except (ValueError, OSError):
+      previous = {} #a corrupt or unreadable data file is simply rewritten
+  stations = dict(previous)
+  seen = set()
+  changed = []
+  failures = []
+  pending = False
+  flushed = time.monotonic()
+  for _, url, row, error in results:
+    key = _station_key(url)
+    if error is not None:
+      failures.append((url, error))
+      if key is not None:
+        seen.add(key)
+      continue
+    city, temperature, description, latitude, longitude = row
+    key = key if key is not None else city
+    seen.add(key)
+    station = {'city':city, 'temperature':temperature, 'description':description, 'latitude':latitude, 'longitude':longitude,
+      'colour':weather_scraper.marker_colour(temperature), 'popup':f"{city} - {temperature} - {description}"}
+    if stations.get(key) != station:
+      stations[key] = station
+      changed.append(key)
+      pending = True
+    if pending and time.monotonic()-flushed >= flush_seconds:
+      _atomic_write(data_path, json.dumps({'updated':time.time(), 'stations':stations}, separators=(',', ':')))
+      pending = False
+      flushed = time.monotonic()
+  for key in [key for key in stations if key not in seen]:
+    del stations[key]
+    changed.append(key)
+    pending = True
+  if pending:
+    _atomic_write(data_path, json.dumps({'updated':time.time(), 'stations':stations}, separators=(',', ':')))
+  return changed, failures
@@ -0,0 +1,225 @@
+import json
+import threading
+import time
+
+#upper bounds of the latency histogram buckets in seconds, from a parsed page to a rendered map of thousands of stations
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class _Stage:
+  """
+  Times one run of a stage and hands the resulting event to the recorder when it ends.
+  """
+  __slots__ = ('recorder', 'event', 'start')
+  enabled = True
+
+  def __init__(self, recorder, stage, labels):
+    self.recorder=recorder
+    self.event=dict(labels, stage=stage)
+
+  def set(self, **fields):
+    """
+    Adds fields to the event, for example the city once the page has been parsed or the number of bytes received.
+    """
+    self.event.update(fields)
+
+  def __enter__(self):
+    self.start=time.perf_counter()
+    return self
+
+  def __exit__(self, kind, error, traceback):
+    self.event['seconds']=time.perf_counter()-self.start
+    if kind is not None:
+      self.event['error']=kind.__name__
+    self.recorder.record(self.event)
+    return False
+
+class _DisabledStage:
+  """
+  Stands in for `_Stage` while no recorder is installed, so instrumented code costs one attribute lookup.
+  """
+  __slots__ = ()
+  enabled = False
+
+  def set(self, **fields):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, kind, error, traceback):
+    return False
+
+DISABLED = _DisabledStage() #the stage handed out while instrumentation is disabled
+
+class MetricsRecorder:
+  """
+  Collects the timings, byte counts, cache hits and errors of every stage of the weather pipeline.
+
+  Instrumented stages are 'http' (one download, `wait` is the time until the headers arrived, including DNS and the
+  TLS handshake of a `new_connection`), 'bbc_parse' and 'geodatos_parse' (extracting the data from a page),
+  'bbc_weather_scraper', 'dutch_coordinates', 'weather_array_stacker', 'map_render' (building and saving the Folium map)
+  and 'map_generator'. Every finished stage produces an event such as
+  {'stage': 'dutch_coordinates', 'host': 'www.geodatos.net', 'city': 'Haarlem', 'cache': 'miss', 'seconds': 0.21}.
+
+  Events are aggregated per stage, host and city into a latency histogram and counters, available from `stats()` and
+  `prometheus_text()`. With a logger, every event is also logged as one JSON line.
+
+  Args:
+    logger (logging.Logger): Optional logger receiving every event at INFO level, the event dict is also attached as `record.metrics`.
+    city_labels (bool): Keep the city as a label of the aggregated metrics. Turn it off for thousands of cities,
+      the log events always contain it.
+
+  Example:
+    >>> recorder = MetricsRecorder()
+    >>> set_default_recorder(recorder)
+    >>> map_generator(url_list)
+    >>> recorder.stats()['bbc_weather_scraper']['count']
+    11
+    >>> open('weather.prom', 'w').write(recorder.prometheus_text())
+  """
+  def __init__(self, logger=None, city_labels=True):
+    self.logger=logger
+    self.city_labels=city_labels
+    self._series={} #(stage, host, city) -> [bucket counts, count, seconds, bytes, hits, misses, {error: count}]
+    self._lock=threading.Lock()
+
+  def record(self, event):
+    """
+    Adds one finished event to the metrics and logs it.
+
+    Args:
+      event (dict): At least 'stage' and 'seconds', optionally 'host', 'city', 'bytes', 'cache' ('hit' or 'miss') and 'error'.
+    """
+    key=(event['stage'],event.get('host', ''),event.get('city', '') if self.city_labels else '')
+    seconds=event['seconds']
+    with self._lock:
+      series=self._series.get(key)
+      if series is None:
+        series=self._series[key]=[[0]*len(SECONDS_BUCKETS),0,0.0,0,0,0,{}]
+      for position,bound in enumerate(SECONDS_BUCKETS):
+        if seconds <= bound:
+          series[0][position]+=1
+          break
+      series[1]+=1
+      series[2]+=seconds
+      series[3]+=event.get('bytes', 0)
+      cache=event.get('cache')
+      if cache == 'hit':
+        series[4]+=1
+      elif cache == 'miss':
+        series[5]+=1
+      error=event.get('error')
+      if error is not None:
+        series[6][error]=series[6].get(error, 0)+1
+    if self.logger is not None:
+      self.logger.info(json.dumps(event, sort_keys=True, default=str), extra={'metrics':event})
+
+  def stats(self):
+    """
+    Sums the metrics of every stage over all hosts and cities.
+
+    Returns:
+      dict: A dictionary mapping every stage that ran to a dictionary with:
+        - count (int): Number of runs.
+        - seconds (float): Total time spent in the stage.
+        - bytes (int): Bytes received.
+        - cache_hits (int): Runs answered from a cache.
+        - cache_misses (int): Runs that had to do the work.
+        - errors (int): Runs that raised an exception.
+    """
+    totals={}
+    with self._lock:
+      for (stage,_,_),series in self._series.items():
+        total=totals.setdefault(stage, {'count':0,'seconds':0.0,'bytes':0,'cache_hits':0,'cache_misses':0,'errors':0})
+        total['count']+=series[1]
+        total['seconds']+=series[2]
+        total['bytes']+=series[3]
+        total['cache_hits']+=series[4]
+        total['cache_misses']+=series[5]
+        total['errors']+=sum(series[6].values())
+    return totals
+
+  def prometheus_text(self):
+    """
+    Exports the metrics in the Prometheus text exposition format, for example for the textfile collector of node_exporter.
+
+    Returns:
+      str: The histogram `weather_stage_seconds` and the counters `weather_stage_bytes_total`,
+        `weather_cache_requests_total` and `weather_stage_errors_total`, labelled by stage, host and city.
+    """
+    with self._lock:
+      series=sorted((key, [list(value[0])]+value[1:6]+[dict(value[6])]) for key,value in self._series.items())
+    lines=['# HELP weather_stage_seconds Time spent in a stage of the weather pipeline.', '# TYPE weather_stage_seconds histogram']
+    for key,(buckets,count,seconds,_,_,_,_) in series:
+      labels=_labels(key)
+      cumulative=0
+      for bound,bucket in zip(SECONDS_BUCKETS, buckets):
+        cumulative+=bucket
+        lines.append(f'weather_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+      lines.append(f'weather_stage_seconds_bucket{{{labels},le="+Inf"}} {count}')
+      lines.append(f'weather_stage_seconds_sum{{{labels}}} {seconds!r}')
+      lines.append(f'weather_stage_seconds_count{{{labels}}} {count}')
+    lines+=['# HELP weather_stage_bytes_total Bytes received by a stage of the weather pipeline.', '# TYPE weather_stage_bytes_total counter']
+    lines+=[f'weather_stage_bytes_total{{{_labels(key)}}} {value[3]}' for key,value in series if value[3]]
+    lines+=['# HELP weather_cache_requests_total Cache lookups of a stage of the weather pipeline.', '# TYPE weather_cache_requests_total counter']
+    for key,value in series:
+      if value[4] or value[5]:
+        lines.append(f'weather_cache_requests_total{{{_labels(key)},result="hit"}} {value[4]}')
+        lines.append(f'weather_cache_requests_total{{{_labels(key)},result="miss"}} {value[5]}')
+    lines+=['# HELP weather_stage_errors_total Failed runs of a stage of the weather pipeline.', '# TYPE weather_stage_errors_total counter']
+    for key,value in series:
+      for error,count in sorted(value[6].items()):
+        lines.append(f'weather_stage_errors_total{{{_labels(key)},error="{_escape(error)}"}} {count}')
+    return '\n'.join(lines)+'\n'
+
+def _escape(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(key):
+  stage,host,city=key
+  labels=f'stage="{_escape(stage)}",host="{_escape(host)}"'
+  if city:
+    labels+=f',city="{_escape(city)}"'
+  return labels
+
+_default_recorder=None
+
+def default_recorder():
+  """
+  Returns the recorder the pipeline reports to, or None while instrumentation is disabled (the default).
+  """
+  return _default_recorder
+
+def set_default_recorder(recorder):
+  """
+  Installs the recorder every instrumented stage reports to.
+
+  Args:
+    recorder (MetricsRecorder or None): The new recorder. None disables the instrumentation.
+  """
+  global _default_recorder
+  _default_recorder=recorder
+
+def stage(name, **labels):
+  """
+  Times one run of a stage, to be used as a context manager around the instrumented code.
+
+  When no recorder is installed, a shared do-nothing object is returned, so disabled instrumentation neither reads
+  the clock nor allocates anything.
+
+  Args:
+    name (str): The name of the stage.
+    **labels: Fields known before the stage runs, such as 'host' and 'city'.
+
+  Returns:
+    A context manager whose `set(**fields)` adds fields known only while the stage runs. Its `enabled` attribute is
+    False while no recorder is installed, fields that are expensive to compute should only be gathered when it is True.
+
+  Example:
+    >>> with stage('dutch_coordinates', host='www.geodatos.net', city='Delft') as event:
+    ...   event.set(cache='hit')
+  """
+  recorder=_default_recorder
+  if recorder is None:
+    return DISABLED
+  return _Stage(recorder, name, labels)
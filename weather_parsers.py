@@ -0,0 +1,394 @@
+from html.parser import HTMLParser
+import re
+
+BBC_LOCATION_CLASS = 'wr-c-location__name gel-paragon'
+BBC_DAY_CLASS = 'wr-day__details'
+BBC_DESCRIPTION_CLASS = 'wr-day__details__weather-type-description'
+BBC_TEMPERATURE_CLASS = 'wr-value--temperature--c'
+BBC_DAY_LIST_CLASS = 'wr-day-carousel__list' #list holding the forecast of every day
+BBC_DAY_ITEM_CLASS = 'wr-day' #one day of the forecast
+BBC_DATE_CLASS = 'wr-date__longish'
+BBC_HIGH_CLASS = 'wr-day-temperature__high-value'
+BBC_LOW_CLASS = 'wr-day-temperature__low-value'
+GEODATOS_COORDINATES_CLASS = 'font-bold text-blue-500 mt-3 lg:text-lg'
+
+BACKENDS = ('soup', 'strainer', 'stream')
+DEFAULT_BACKEND = 'stream'
+STREAM_CHUNK_SIZE = 16384 #characters fed to the streaming tokenizer at a time
+
+#elements without a closing tag, they never change the nesting depth
+VOID_ELEMENTS = {'area','base','br','col','embed','hr','img','input','link','meta','param','source','track','wbr'}
+
+def _temperature(contents):
+  """
+  Reads the temperature out of the contents of a temperature element, in the same way for every backend.
+  """
+  #the sign of temperatures below zero is kept, digits that are part of a class or other name are skipped
+  num_temp = re.search(r'(?<![\w-])[-\u2212]?\d+', contents)
+  if num_temp is None:
+    raise ValueError('Temperature not found')
+  return int(num_temp.group().replace('\u2212', '-'))
+
+def _first_text(tag):
+  """
+  Returns the first child of a BeautifulSoup tag stripped of whitespace, the equivalent of `tag.contents[0].strip()`.
+  """
+  if tag is None or not tag.contents or not isinstance(tag.contents[0], str):
+    raise ValueError('Forecast not found')
+  return tag.contents[0].strip()
+
+def _bbc_strained(value):
+  """
+  Tells the `SoupStrainer` which elements to build: the location heading and the daily forecast blocks.
+  """
+  return value is not None and (' '.join(value.split()) == BBC_LOCATION_CLASS or BBC_DAY_CLASS in value.split())
+
+def _bbc_forecast_strained(value):
+  """
+  Tells the `SoupStrainer` which elements to build for the multi-day forecast: the location heading, the list of days and the days themselves.
+  """
+  return value is not None and (' '.join(value.split()) == BBC_LOCATION_CLASS or BBC_DAY_LIST_CLASS in value.split() or BBC_DAY_ITEM_CLASS in value.split())
+
+def _geodatos_strained(value):
+  """
+  Tells the `SoupStrainer` which paragraph to build: the one holding the coordinates.
+  """
+  return value is not None and ' '.join(value.split()) == GEODATOS_COORDINATES_CLASS
+
+def _bbc_from_soup(doc):
+  location=doc.find(class_=BBC_LOCATION_CLASS)
+  if location is None:
+    raise ValueError('Location not found')
+  city=_first_text(location)
+  #selecting the relevant location for today's weather
+  clasa=doc.find(class_=BBC_DAY_CLASS)
+  if clasa is None:
+    raise ValueError('Forecast not found')
+  description=_first_text(clasa.find(class_=BBC_DESCRIPTION_CLASS))
+  temperature=clasa.find(class_=BBC_TEMPERATURE_CLASS)
+  if temperature is None:
+    raise ValueError('Forecast not found')
+  return [city,_temperature(str(temperature.contents)),description]
+
+def _day_temperature(section):
+  """
+  Reads the temperature in Celsius out of the high or low part of a day, None when the day has no such part.
+  """
+  temperature=None if section is None else section.find(class_=BBC_TEMPERATURE_CLASS)
+  return None if temperature is None else _temperature(str(temperature.contents))
+
+def _bbc_forecast_from_soup(doc):
+  location=doc.find(class_=BBC_LOCATION_CLASS)
+  if location is None:
+    raise ValueError('Location not found')
+  days=[[_first_text(day.find(class_=BBC_DATE_CLASS)),_day_temperature(day.find(class_=BBC_HIGH_CLASS)),
+         _day_temperature(day.find(class_=BBC_LOW_CLASS)),_first_text(day.find(class_=BBC_DESCRIPTION_CLASS))]
+        for day in (doc.find(class_=BBC_DAY_LIST_CLASS) or doc).find_all(class_=BBC_DAY_ITEM_CLASS)]
+  if not days:
+    raise ValueError('Forecast not found')
+  return [_first_text(location),days]
+
+def _geodatos_from_soup(doc):
+  unprocessed_coordinates=doc.find('p', class_=GEODATOS_COORDINATES_CLASS)
+  if unprocessed_coordinates is None:
+    return None
+  return [float(a) for a in unprocessed_coordinates.contents[0].split(",")]
+
+class _StopParsing(Exception):
+  """
+  Raised by the streaming tokenizer as soon as everything it looks for has been found.
+  """
+
+class _TargetedParser(HTMLParser):
+  """
+  Streaming tokenizer that only follows the elements needed by the scrapers and stops once all of them were seen.
+
+  Subclasses name the elements they want in `wanted()` and say when they are done in `complete()`. Elements listed in
+  `first_text_only` yield their first child when it is text (the equivalent of `tag.contents[0]`) or None when it is a tag,
+  the other elements yield their text and the markup of their children (the same digits as `str(tag.contents)`).
+
+  Args:
+    first_text_only (set): Names of the wanted elements for which only the first text child is needed.
+  """
+  def __init__(self, first_text_only=()):
+    super().__init__(convert_charrefs=True)
+    self.first_text_only=set(first_text_only)
+    self.open=[] #[name, depth, collected pieces] for every wanted element being read
+    self.depth=0
+    self.results={}
+
+  def wanted(self, tag, classes):
+    raise NotImplementedError
+
+  def complete(self):
+    raise NotImplementedError
+
+  def first_text(self, name):
+    """
+    Tells whether only the first text child of the wanted element `name` is needed.
+    """
+    return name in self.first_text_only
+
+  def _finish(self, element):
+    self.open.remove(element)
+    name,_,pieces=element
+    if self.first_text(name):
+      self.results.setdefault(name, ''.join(pieces) if pieces else None)
+    else:
+      self.results.setdefault(name, ''.join(pieces))
+
+  def _markup(self, text):
+    #a tag ends the first text child, the text may have arrived in several pieces when it crossed a chunk boundary
+    for element in list(self.open):
+      if self.first_text(element[0]):
+        self._finish(element)
+      else:
+        element[2].append(text)
+
+  def handle_starttag(self, tag, attrs):
+    self._markup(self.get_starttag_text())
+    if tag not in VOID_ELEMENTS:
+      self.depth+=1
+      classes=' '.join((dict(attrs).get('class') or '').split())
+      name=self.wanted(tag, classes)
+      if name is not None and name not in self.results:
+        self.open.append([name,self.depth,[]])
+    if self.complete():
+      raise _StopParsing()
+
+  def handle_startendtag(self, tag, attrs):
+    self._markup(self.get_starttag_text())
+    if self.complete():
+      raise _StopParsing()
+
+  def handle_endtag(self, tag):
+    if tag in VOID_ELEMENTS:
+      return
+    for element in [element for element in self.open if element[1] == self.depth]:
+      self._finish(element)
+    self._markup(f'</{tag}>')
+    self.ended(self.depth)
+    self.depth-=1
+    if self.complete():
+      raise _StopParsing()
+
+  def ended(self, depth):
+    """
+    Called when the element opened at `depth` is closed.
+    """
+
+  def handle_data(self, data):
+    for element in self.open:
+      element[2].append(data)
+
+  def run(self, html):
+    try:
+      for start in range(0, len(html), STREAM_CHUNK_SIZE):
+        self.feed(html[start:start+STREAM_CHUNK_SIZE])
+      self.close()
+      for element in list(self.open):
+        self._finish(element)
+    except _StopParsing:
+      pass
+    return self.results
+
+class _BBCStreamParser(_TargetedParser):
+  def __init__(self):
+    super().__init__(first_text_only={'city','description'})
+    self.day_depth=None #depth of the first wr-day__details element, None before it and False after it
+
+  def wanted(self, tag, classes):
+    if classes == BBC_LOCATION_CLASS:
+      return 'city'
+    if self.day_depth is None and BBC_DAY_CLASS in classes.split():
+      self.day_depth=self.depth
+    elif self.day_depth:
+      #the forecast of today is only read inside the first wr-day__details element
+      if BBC_DESCRIPTION_CLASS in classes.split():
+        return 'description'
+      if BBC_TEMPERATURE_CLASS in classes.split():
+        return 'temperature'
+    return None
+
+  def ended(self, depth):
+    if depth == self.day_depth:
+      self.day_depth=False
+
+  def complete(self):
+    return len(self.results) == 3 or ('city' in self.results and self.day_depth is False)
+
+class _BBCForecastStreamParser(_TargetedParser):
+  """
+  Reads the date, high and low temperature and description of every day, under names such as ('high', 0).
+  """
+  def __init__(self):
+    super().__init__(first_text_only={'city','date','description'})
+    self.days=0
+    self.section=None #('high' or 'low', depth) while inside the high or low temperature of a day
+    self.list_depth=None
+    self.finished=False
+
+  def first_text(self, name):
+    return (name[0] if type(name) is tuple else name) in self.first_text_only
+
+  def wanted(self, tag, classes):
+    if classes == BBC_LOCATION_CLASS:
+      return 'city'
+    names=classes.split()
+    if BBC_DAY_LIST_CLASS in names and self.list_depth is None:
+      self.list_depth=self.depth
+    if BBC_DAY_ITEM_CLASS in names:
+      self.days+=1
+      return None
+    if not self.days or self.finished:
+      return None
+    day=self.days-1
+    if BBC_DATE_CLASS in names:
+      return ('date',day)
+    if BBC_DESCRIPTION_CLASS in names:
+      return ('description',day)
+    if BBC_HIGH_CLASS in names:
+      self.section=('high',self.depth)
+    elif BBC_LOW_CLASS in names:
+      self.section=('low',self.depth)
+    elif BBC_TEMPERATURE_CLASS in names and self.section is not None:
+      return (self.section[0],day)
+    return None
+
+  def ended(self, depth):
+    if self.section is not None and depth == self.section[1]:
+      self.section=None
+    if depth == self.list_depth:
+      #the rest of the page holds the hourly details, which are not needed
+      self.finished=True
+
+  def complete(self):
+    return self.finished and 'city' in self.results
+
+class _GeodatosStreamParser(_TargetedParser):
+  def __init__(self):
+    super().__init__(first_text_only={'coordinates'})
+
+  def wanted(self, tag, classes):
+    if tag == 'p' and classes == GEODATOS_COORDINATES_CLASS:
+      return 'coordinates'
+    return None
+
+  def complete(self):
+    return 'coordinates' in self.results
+
+def _bbc_from_stream(html):
+  results=_BBCStreamParser().run(html)
+  if 'city' not in results:
+    raise ValueError('Location not found')
+  city,description,temperature=results['city'],results.get('description'),results.get('temperature')
+  if city is None or description is None or temperature is None:
+    raise ValueError('Forecast not found')
+  return [city.strip(),_temperature(temperature),description.strip()]
+
+def _bbc_forecast_from_stream(html):
+  parser=_BBCForecastStreamParser()
+  results=parser.run(html)
+  if results.get('city') is None:
+    raise ValueError('Location not found')
+  days=[]
+  for day in range(parser.days):
+    date,description=results.get(('date',day)),results.get(('description',day))
+    if date is None or description is None:
+      raise ValueError('Forecast not found')
+    high,low=results.get(('high',day)),results.get(('low',day))
+    days.append([date.strip(),None if high is None else _temperature(high),None if low is None else _temperature(low),description.strip()])
+  if not days:
+    raise ValueError('Forecast not found')
+  return [results['city'].strip(),days]
+
+def _geodatos_from_stream(html):
+  contents=_GeodatosStreamParser().run(html).get('coordinates')
+  if contents is None:
+    return None
+  return [float(a) for a in contents.split(",")]
+
+def _check_backend(backend):
+  backend=DEFAULT_BACKEND if backend is None else backend
+  if backend not in BACKENDS:
+    raise ValueError('Invalid parser backend')
+  return backend
+
+def parse_bbc_page(html, backend=None):
+  """
+  Extracts the city, today's maximum temperature and the weather description from a BBC Weather page.
+
+  Three interchangeable backends give identical results:
+    - 'soup': builds the complete BeautifulSoup tree, as the scraper always did.
+    - 'strainer': lets BeautifulSoup build only the location and forecast elements (`SoupStrainer`).
+    - 'stream': a tokenizer that follows only the needed elements and stops as soon as they were read.
+
+  Args:
+    html (str): The text of a 'https://www.bbc.com/weather/xxxxxxx' page.
+    backend (str): One of `BACKENDS`. Defaults to `DEFAULT_BACKEND`.
+
+  Returns:
+    list: [City (str), max_temp (int), description (str)]
+
+  Example:
+    >>> parse_bbc_page(requests.get('https://www.bbc.com/weather/2759794').text)
+    ['Amsterdam', 14, 'Sunny and light winds']
+  """
+  backend=_check_backend(backend)
+  if backend == 'stream':
+    return _bbc_from_stream(html)
+  from bs4 import BeautifulSoup, SoupStrainer #BeautifulSoup is only loaded when one of its backends is used
+  if backend == 'strainer':
+    strainer=SoupStrainer(class_=_bbc_strained)
+    return _bbc_from_soup(BeautifulSoup(html, "html.parser", parse_only=strainer))
+  return _bbc_from_soup(BeautifulSoup(html, "html.parser"))
+
+def parse_bbc_forecast(html, backend=None):
+  """
+  Extracts the city and the forecast of every day from a BBC Weather page, the same page read by `parse_bbc_page()`.
+
+  Args:
+    html (str): The text of a 'https://www.bbc.com/weather/xxxxxxx' page.
+    backend (str): One of `BACKENDS`, see `parse_bbc_page()`. Defaults to `DEFAULT_BACKEND`.
+
+  Returns:
+    list: [City (str), days (list)], every day being [date (str), max_temp (int or None), min_temp (int or None), description (str)].
+      The maximum of today is None late in the day, when BBC only shows the minimum.
+
+  Example:
+    >>> city, days = parse_bbc_forecast(requests.get('https://www.bbc.com/weather/2759794').text)
+    >>> days[:2]
+    [['Today', 14, 7, 'Sunny and light winds'], ['Tomorrow', 16, 9, 'Light cloud and a gentle breeze']]
+  """
+  backend=_check_backend(backend)
+  if backend == 'stream':
+    return _bbc_forecast_from_stream(html)
+  from bs4 import BeautifulSoup, SoupStrainer
+  if backend == 'strainer':
+    strainer=SoupStrainer(class_=_bbc_forecast_strained)
+    return _bbc_forecast_from_soup(BeautifulSoup(html, "html.parser", parse_only=strainer))
+  return _bbc_forecast_from_soup(BeautifulSoup(html, "html.parser"))
+
+def parse_geodatos_page(html, backend=None):
+  """
+  Extracts the coordinates of a city from a geodatos.net coordinates page.
+
+  Args:
+    html (str): The text of a 'https://www.geodatos.net/en/coordinates/netherlands/xxx' page.
+    backend (str): One of `BACKENDS`, see `parse_bbc_page()`. Defaults to `DEFAULT_BACKEND`.
+
+  Returns:
+    list of float or None: [latitude, longitude], or None when the page contains no coordinates.
+
+  Example:
+    >>> parse_geodatos_page(requests.get('https://www.geodatos.net/en/coordinates/netherlands/the-hague').text)
+    [52.07667, 4.29861]
+  """
+  backend=_check_backend(backend)
+  if backend == 'stream':
+    return _geodatos_from_stream(html)
+  from bs4 import BeautifulSoup, SoupStrainer
+  if backend == 'strainer':
+    strainer=SoupStrainer('p', class_=_geodatos_strained)
+    return _geodatos_from_soup(BeautifulSoup(html, "html.parser", parse_only=strainer))
+  return _geodatos_from_soup(BeautifulSoup(html, "html.parser"))
@@ -0,0 +1,284 @@
+from contextlib import nullcontext
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+import weather_cache
+import weather_http
+import weather_parsers
+import weather_scraper
+from weather_scraper import BBC_WEATHER_URL, DEFAULT_HOST_CONCURRENCY
+
+DEFAULT_FETCH_WORKERS = 16 #threads downloading pages, they mostly wait for the network
+DEFAULT_QUEUE_SIZE = 64 #downloaded pages waiting to be parsed, the downloads pause when it is full
+
+_DONE = (2, -1, None, None) #sorts after every job, tells a fetch thread to stop
+
+def _parse(kind, html, backend):
+  """
+  Parses one page, runs in a worker process of the parse stage.
+  """
+  if kind == 'bbc':
+    return weather_parsers.parse_bbc_page(html, backend)
+  return weather_parsers.parse_geodatos_page(html, backend)
+
+class PipelinedStacker:
+  """
+  Scrapes large batches of cities with separate download and parse stages, for `weather_scraper.weather_array_stacker()`.
+
+  Downloading is I/O-bound, parsing is CPU-bound and holds the GIL, so with a thread pool alone the parsing of
+  thousands of pages runs on one core. Here `fetch_workers` threads only download pages and put them on a bounded
+  queue, from which `parse_workers` threads hand them to a pool of as many worker processes. When parsing falls behind,
+  the full queue pauses the downloads, so memory stays bounded. A parsed BBC page queues the download of the coordinates
+  of its city ahead of the remaining BBC pages, so started rows are finished first. Both caches are used exactly as by
+  `bbc_weather_scraper()` and `dutch_coordinates()`: cached cities are neither downloaded nor parsed.
+
+  After every run, `stats()` reports how busy each stage was, which shows the stage worth more workers.
+
+  Args:
+    fetch_workers (int): Threads downloading pages.
+    parse_workers (int): Pages parsed at the same time. Defaults to the number of CPUs.
+    queue_size (int): Downloaded pages that may wait for a parse worker.
+    per_host_limit (int or dict): Maximum simultaneous requests per host, see `weather_scraper.weather_array_stacker()`.
+    backend (str): HTML extraction backend, see `weather_parsers.parse_bbc_page()`.
+    processes (bool): Parse in worker processes. False parses in the parse threads, which only pays off for small batches.
+
+  Example:
+    >>> pipeline = PipelinedStacker(fetch_workers=32)
+    >>> rows = weather_array_stacker(url_list, pipeline=pipeline)
+    >>> pipeline.stats()['parse']['utilisation']
+    0.97
+    >>> pipeline.close()
+  """
+  def __init__(self, fetch_workers=DEFAULT_FETCH_WORKERS, parse_workers=None, queue_size=DEFAULT_QUEUE_SIZE,
+               per_host_limit=DEFAULT_HOST_CONCURRENCY, backend=None, processes=True):
+    if parse_workers is None:
+      parse_workers=os.cpu_count() or 1
+    if type(fetch_workers) is not int or fetch_workers<1 or type(parse_workers) is not int or parse_workers<1:
+      raise ValueError('Invalid number of workers')
+    if type(queue_size) is not int or queue_size<1:
+      raise ValueError('Invalid queue size')
+    backend=weather_parsers.DEFAULT_BACKEND if backend is None else backend
+    if backend not in weather_parsers.BACKENDS:
+      raise ValueError('Invalid parser backend')
+    self.fetch_workers=fetch_workers
+    self.parse_workers=parse_workers
+    self.queue_size=queue_size
+    self.per_host_limit=per_host_limit
+    self.backend=backend
+    self.processes=processes
+    self._executor=None #the worker processes are started once and reused by every run
+    self._stats=None
+
+  def run(self, url_list):
+    """
+    Scrapes the cities, the result is identical to `weather_scraper.weather_array_stacker(url_list)`.
+
+    Args:
+      url_list (list of str): BBC Weather URLs of Dutch cities, or place names (`weather_scraper.resolve_location()`).
+
+    Returns:
+      list of list: One row [City (str), temp_max (int), weather (str), latitude (float), longitude (float)] per URL,
+        in the order of `url_list`. The first failing city aborts the run and its exception is raised.
+    """
+    if type(url_list) is not list or len(url_list) == 0:
+      raise ValueError('Invalid input')
+    if self.processes and self._executor is None:
+      self._executor=ProcessPoolExecutor(max_workers=self.parse_workers)
+    run=_Run(self, url_list)
+    return run.execute()
+
+  def stats(self):
+    """
+    Reports the utilisation of both stages during the last run.
+
+    Returns:
+      dict or None: None before the first run, otherwise a dictionary with:
+        - seconds (float): Duration of the run.
+        - fetch, parse (dict): For each stage:
+          - workers (int): Threads of the stage.
+          - pages (int): Pages downloaded or parsed.
+          - busy_seconds (float): Time the workers spent downloading or parsing.
+          - utilisation (float): busy_seconds divided by workers times seconds, 1.0 means the stage never waited.
+        - fetch also has blocked_seconds (float): Time downloaded pages waited for room in the full queue.
+        - queue_peak (int): Largest number of pages waiting to be parsed.
+    """
+    if self._stats is None:
+      return None
+    return {key:(dict(value) if type(value) is dict else value) for key,value in self._stats.items()}
+
+  def close(self):
+    """
+    Stops the worker processes.
+    """
+    if self._executor is not None:
+      self._executor.shutdown(wait=True, cancel_futures=True)
+      self._executor=None
+
+class _Run:
+  """
+  The state of one `PipelinedStacker.run()`.
+  """
+  def __init__(self, pipeline, url_list):
+    self.pipeline=pipeline
+    self.url_list=url_list
+    self.forecasts=weather_cache.default_forecast_cache()
+    self.coordinates=weather_cache.default_coordinate_cache()
+    self.slots=weather_scraper._host_slots(url_list, pipeline.per_host_limit)
+    self.jobs=queue.PriorityQueue() #(priority, position, kind, payload), coordinates before new cities
+    self.pages=queue.Queue(maxsize=pipeline.queue_size) #(position, kind, key, html)
+    self.rows=[None]*len(url_list)
+    self.known={} #position -> coordinates of the cities given by name
+    self.remaining=len(url_list)
+    self.error=None
+    self.lock=threading.Lock()
+    self.finished=threading.Event()
+    self.counters={'fetch':[0,0.0,0.0], 'parse':[0,0.0,0.0]} #pages, busy seconds, blocked seconds
+    self.queue_peak=0
+
+  def execute(self):
+    start=time.perf_counter()
+    for position,url in enumerate(self.url_list):
+      self.jobs.put((1, position, 'bbc', url))
+    fetchers=[threading.Thread(target=self.fetcher, daemon=True) for _ in range(self.pipeline.fetch_workers)]
+    parsers=[threading.Thread(target=self.parser, daemon=True) for _ in range(self.pipeline.parse_workers)]
+    for thread in fetchers+parsers:
+      thread.start()
+    try:
+      self.finished.wait()
+    finally:
+      #the fetch threads stop first, the parse threads keep emptying the queue so no download stays blocked
+      for _ in fetchers:
+        self.jobs.put(_DONE)
+      for thread in fetchers:
+        thread.join()
+      for _ in parsers:
+        self.pages.put(None)
+      for thread in parsers:
+        thread.join()
+      seconds=time.perf_counter()-start
+      stats={'seconds':seconds, 'queue_peak':self.queue_peak}
+      for stage,workers in (('fetch', self.pipeline.fetch_workers), ('parse', self.pipeline.parse_workers)):
+        pages,busy,blocked=self.counters[stage]
+        stats[stage]={'workers':workers, 'pages':pages, 'busy_seconds':busy, 'utilisation':busy/(workers*seconds) if seconds else 0.0}
+      stats['fetch']['blocked_seconds']=self.counters['fetch'][2]
+      self.pipeline._stats=stats
+    if self.error is not None:
+      raise self.error
+    return self.rows
+
+  def fail(self, error):
+    with self.lock:
+      if self.error is None:
+        self.error=error
+    self.finished.set()
+
+  def complete(self, position, row):
+    with self.lock:
+      self.rows[position]=row
+      self.remaining-=1
+      if self.remaining == 0:
+        self.finished.set()
+
+  def count(self, stage, busy, blocked=0.0):
+    with self.lock:
+      counter=self.counters[stage]
+      counter[0]+=1
+      counter[1]+=busy
+      counter[2]+=blocked
+
+  def download(self, url):
+    with self.slots.get(urlsplit(url).netloc, nullcontext()):
+      start=time.perf_counter()
+      html=weather_http.get_text(url)
+    self.count('fetch', time.perf_counter()-start)
+    return html
+
+  def enqueue(self, page):
+    start=time.perf_counter()
+    self.pages.put(page) #blocks while the parse stage is behind
+    with self.lock:
+      self.counters['fetch'][2]+=time.perf_counter()-start
+      self.queue_peak=max(self.queue_peak, self.pages.qsize())
+
+  def fetcher(self):
+    while True:
+      job=self.jobs.get()
+      if job is _DONE:
+        return
+      if self.error is not None:
+        continue #the run failed, the remaining jobs are dropped
+      _,position,kind,payload=job
+      try:
+        if kind == 'bbc':
+          self.fetch_forecast(position, payload)
+        else:
+          self.fetch_coordinates(position, payload)
+      except Exception as error:
+        self.fail(error)
+
+  def fetch_forecast(self, position, url):
+    url,coordinates=weather_scraper.resolve_location(url)
+    if url[0:28] != BBC_WEATHER_URL:
+      raise ValueError('Invalid website')
+    if coordinates is not None:
+      self.known[position]=coordinates #a place name, its coordinates are not downloaded
+    key=weather_cache.location_id(url)
+    if self.forecasts is not False and key is not None:
+      current=self.forecasts.get(key)
+      if current is not None:
+        with self.lock:
+          self.rows[position]=current
+        if coordinates is not None:
+          self.complete(position, current+coordinates)
+        else:
+          self.fetch_coordinates(position, current[0])
+        return
+    self.enqueue((position, 'bbc', key, self.download(url)))
+
+  def fetch_coordinates(self, position, city):
+    if type(city) is not str:
+      raise ValueError(f"Invalid input data type")
+    if self.coordinates is not False:
+      cached=self.coordinates.get(city)
+      if cached is not None:
+        self.complete(position, self.rows[position]+cached)
+        return
+    key,url=weather_scraper._geodatos_url(city)
+    self.enqueue((position, 'geodatos', key, self.download(url)))
+
+  def parser(self):
+    executor=self.pipeline._executor
+    while True:
+      page=self.pages.get()
+      if page is None:
+        return
+      if self.error is not None:
+        continue
+      position,kind,key,html=page
+      try:
+        start=time.perf_counter()
+        if executor is None:
+          parsed=_parse(kind, html, self.pipeline.backend)
+        else:
+          parsed=executor.submit(_parse, kind, html, self.pipeline.backend).result()
+        self.count('parse', time.perf_counter()-start)
+        if kind == 'bbc':
+          if self.forecasts is not False and key is not None:
+            self.forecasts.put(key, parsed)
+          with self.lock:
+            self.rows[position]=parsed
+          if position in self.known:
+            self.complete(position, parsed+self.known[position])
+          else:
+            self.jobs.put((0, position, 'geodatos', parsed[0]))
+        else:
+          if parsed is None:
+            raise ValueError(f"Error: Coordinates not found for {key}")
+          if self.coordinates is not False:
+            self.coordinates.put(key, parsed)
+          self.complete(position, self.rows[position]+parsed)
+      except Exception as error:
+        self.fail(error)
@@ -0,0 +1,247 @@
+import bisect
+import os
+import threading
+import unicodedata
+import weather_cache
+
+PLACE_FILE = 'places_nl.tsv' #index built by build_place_index(), in weather_cache.default_cache_dir()
+SEARCH_LIMIT = 10 #places returned by a prefix search
+
+#places known without an index file, the municipalities of weather_cache.GAZETTEER and the cities of url_list:
+#key,BBC location ID,latitude,longitude,population,name|aliases
+#BBC Weather locations are GeoNames IDs, so a complete index is built from the GeoNames dump of the Netherlands
+PLACES = """\
+'s-hertogenbosch,2747351,51.69917,5.30417,134520,'s-Hertogenbosch|s-hertogenbosch|den bosch
+alkmaar,2759899,52.63167,4.74861,94853,Alkmaar
+almere,2759879,52.37025,5.21413,176432,Almere|almere stad
+alphen-aan-den-rijn,2759875,52.12917,4.65546,70000,Alphen aan den Rijn
+amersfoort,2759821,52.155,5.3875,139914,Amersfoort
+amstelveen,2759798,52.30083,4.86389,76000,Amstelveen
+amsterdam,2759794,52.37403,4.88969,741636,Amsterdam
+apeldoorn,2759706,52.21,5.96944,136670,Apeldoorn
+arnhem,2759661,51.98,5.91111,141674,Arnhem
+assen,2759633,52.99667,6.5625,64000,Assen
+breda,2758401,51.58656,4.77596,183873,Breda
+delft,2757345,52.00667,4.35556,96075,Delft
+den-helder,2757244,52.95917,4.75972,56000,Den Helder
+deventer,2757220,52.255,6.16389,86372,Deventer
+dordrecht,2756669,51.81,4.67361,118426,Dordrecht
+ede,2756429,52.03333,5.65833,67670,Ede
+eindhoven,2756253,51.44083,5.47778,209620,Eindhoven
+emmen,2756136,52.77917,6.90694,56113,Emmen
+enschede,2756071,52.21833,6.89583,153655,Enschede
+gouda,2755420,52.01667,4.70833,71000,Gouda
+groningen,2755251,53.21917,6.56667,181194,Groningen
+haarlem,2755003,52.38084,4.63683,147590,Haarlem
+haarlemmermeer,2753801,52.30083,4.69306,73000,Haarlemmermeer|hoofddorp
+heerlen,2754837,50.88365,5.98154,87000,Heerlen
+helmond,2754692,51.48167,5.66111,87000,Helmond
+hengelo,2754681,52.26583,6.79306,76000,Hengelo
+hilversum,2754394,52.22333,5.17639,83000,Hilversum
+hoorn,2753106,52.6425,5.05972,68000,Hoorn
+leeuwarden,2751792,53.20139,5.80859,90000,Leeuwarden
+leiden,2751773,52.15833,4.49306,117485,Leiden
+leidschendam-voorburg,2751771,52.08306,4.39583,73000,Leidschendam-Voorburg|leidschendam
+lelystad,2751738,52.50833,5.475,72000,Lelystad
+maastricht,2751283,50.84833,5.68889,122378,Maastricht
+middelburg,2750896,51.5,3.61389,46000,Middelburg
+nijmegen,2750053,51.8425,5.85278,158732,Nijmegen
+oss,2749234,51.765,5.51806,56000,Oss
+purmerend,2748392,52.505,4.95972,73000,Purmerend
+roermond,2748000,51.19417,5.9875,55000,Roermond
+roosendaal,2747930,51.53083,4.46528,64000,Roosendaal
+rotterdam,2747891,51.9225,4.47917,598199,Rotterdam
+schiedam,2747599,51.91917,4.38889,76000,Schiedam
+sittard-geleen,2747203,51.0,5.86944,92000,Sittard-Geleen|sittard
+the-hague,2747373,52.07667,4.29861,474292,The Hague|den haag|s-gravenhage|'s-gravenhage
+tilburg,2746301,51.55551,5.0913,199613,Tilburg
+utrecht,2745912,52.09083,5.12222,290529,Utrecht
+venlo,2745641,51.37,6.16806,92403,Venlo
+vlaardingen,2745467,51.9125,4.34167,71000,Vlaardingen
+zaanstad,2744118,52.45313,4.81356,144000,Zaanstad|zaandam
+zoetermeer,2743619,52.0575,4.49306,110470,Zoetermeer
+zwolle,2743477,52.5125,6.09444,111805,Zwolle
+"""
+
+def normalise_place(name):
+  """
+  Returns the key a place name is indexed under: lowercase, without accents, with a dash between the words.
+
+  Example:
+    >>> normalise_place(' Den  Haag ')
+    'den-haag'
+    >>> normalise_place('Zoetermeer') == normalise_place('zoetermeer')
+    True
+  """
+  if type(name) is not str:
+    raise ValueError("Invalid input data type")
+  name=unicodedata.normalize('NFKD', name)
+  name=''.join(character for character in name if not unicodedata.combining(character))
+  return weather_cache.normalise_city(' '.join(name.split()))
+
+class PlaceIndex:
+  """
+  Sorted array of Dutch place names and aliases, resolving them to BBC location IDs and coordinates without any request.
+
+  Every name and alias is a key in one sorted list, next to the place it belongs to. An exact lookup and a prefix search
+  are both a binary search (`bisect`), so a name resolves in microseconds even for the 10,000 populated places of the
+  Netherlands. When a name belongs to several places, the one with the largest population wins.
+
+  Args:
+    places (iterable of tuple): (name, location ID, latitude, longitude, population, aliases) per place, the aliases
+      being a list of other names of the place.
+
+  Example:
+    >>> index = PlaceIndex.load('places_nl.tsv')
+    >>> index.resolve('Den Haag')
+    ('The Hague', 2747373, 52.07667, 4.29861)
+    >>> [place[0] for place in index.search('amster')]
+    ['Amsterdam', 'Amstelveen']
+  """
+  def __init__(self, places=()):
+    entries=[]
+    for name,location,latitude,longitude,population,aliases in places:
+      place=(name, int(location), float(latitude), float(longitude))
+      for key in {normalise_place(name)}|{normalise_place(alias) for alias in aliases}:
+        entries.append((key, -int(population), place))
+    entries.sort(key=lambda entry: entry[:2]) #the largest place first among equal keys
+    self._keys=[key for key,_,_ in entries]
+    self._places=[place for _,_,place in entries]
+    self._sizes=[-population for _,population,_ in entries]
+
+  @classmethod
+  def load(cls, path):
+    """
+    Reads an index file written by `build_place_index()`.
+    """
+    with open(path, encoding='utf-8') as file:
+      return cls(_read_places(file))
+
+  def __len__(self):
+    return len(self._keys)
+
+  def __contains__(self, name):
+    return self.get(name) is not None
+
+  def get(self, name):
+    """
+    Returns the place of a name or alias, or None for an unknown name.
+
+    Returns:
+      tuple or None: (name (str), location ID (int), latitude (float), longitude (float))
+    """
+    key=normalise_place(name)
+    position=bisect.bisect_left(self._keys, key)
+    if position < len(self._keys) and self._keys[position] == key:
+      return self._places[position]
+    return None
+
+  def resolve(self, name):
+    """
+    Same as `get()`, but raises a ValueError for an unknown name.
+    """
+    place=self.get(name)
+    if place is None:
+      raise ValueError(f'Unknown place {name}')
+    return place
+
+  def search(self, prefix, limit=SEARCH_LIMIT):
+    """
+    Finds the places with a name or alias starting with `prefix`, for example to complete what a user is typing.
+
+    Args:
+      prefix (str): The start of the name, matched like `get()`.
+      limit (int): Maximum number of places.
+
+    Returns:
+      list of tuple: The places like `get()`, largest population first, every place once.
+    """
+    key=normalise_place(prefix)
+    position=bisect.bisect_left(self._keys, key)
+    found={}
+    while position < len(self._keys) and self._keys[position].startswith(key):
+      place=self._places[position]
+      found[place]=max(found.get(place, 0), self._sizes[position])
+      position+=1
+    return sorted(found, key=lambda place: -found[place])[:limit]
+
+def _read_places(lines):
+  """
+  Yields the places of lines in the format of `PLACES`, or tab separated like the files of `build_place_index()`.
+  """
+  for line in lines:
+    line=line.rstrip('\n')
+    if not line:
+      continue
+    fields=line.split('\t') if '\t' in line else line.split(',', 5)
+    _,location,latitude,longitude,population,names=fields
+    name,*aliases=names.split('|')
+    yield name,location,latitude,longitude,population,aliases
+
+def build_place_index(dump_path, path=None):
+  """
+  Builds the index file from a GeoNames country dump, such as NL.txt from https://download.geonames.org/export/dump/.
+
+  Only populated places (feature class P) are kept, with their ASCII name and alternate names as aliases. BBC Weather
+  uses the GeoNames ID as its location ID.
+
+  Args:
+    dump_path (str): The tab separated GeoNames file.
+    path (str): The index file, `PLACE_FILE` in `weather_cache.default_cache_dir()` by default, where
+      `default_place_index()` finds it.
+
+  Returns:
+    int: The number of places written.
+  """
+  if path is None:
+    path=os.path.join(weather_cache.default_cache_dir(), PLACE_FILE)
+  lines=[]
+  with open(dump_path, encoding='utf-8') as dump:
+    for line in dump:
+      fields=line.rstrip('\n').split('\t')
+      if len(fields) < 15 or fields[6] != 'P':
+        continue
+      name=fields[1]
+      aliases=[alias for alias in dict.fromkeys([fields[2]]+fields[3].split(',')) if alias and alias != name and '|' not in alias and '\t' not in alias]
+      lines.append('\t'.join([normalise_place(name), fields[0], fields[4], fields[5], fields[14] or '0', '|'.join([name]+aliases)]))
+  os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+  temporary=path+'.tmp'
+  with open(temporary, 'w', encoding='utf-8') as file:
+    file.write(''.join(line+'\n' for line in sorted(lines)))
+  os.replace(temporary, path)
+  return len(lines)
+
+_default_index=None
+_default_lock=threading.Lock()
+
+def default_place_index():
+  """
+  Returns the index `weather_scraper` resolves place names with, loaded on first use: the file written by
+  `build_place_index()` when it exists, otherwise the places of `PLACES`.
+  """
+  global _default_index
+  with _default_lock:
+    if _default_index is None:
+      path=os.path.join(weather_cache.default_cache_dir(), PLACE_FILE)
+      if os.path.exists(path):
+        _default_index=PlaceIndex.load(path)
+      else:
+        _default_index=PlaceIndex(_read_places(PLACES.splitlines()))
+    return _default_index
+
+def set_default_place_index(index):
+  """
+  Replaces the index `weather_scraper` resolves place names with.
+
+  Args:
+    index (PlaceIndex or None): The new index. None loads the default one on next use.
+  """
+  global _default_index
+  with _default_lock:
+    _default_index=index
+
+if __name__ == '__main__':
+  import sys
+  if len(sys.argv) != 2:
+    sys.exit('usage: python -m weather_places NL.txt')
+  print(f'{build_place_index(sys.argv[1])} places written')
@@ -1,13 +1,42 @@
-from bs4 import BeautifulSoup
-import requests
-import folium
-import re
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+import numbers
+import os
+import sys
+import threading
+import weather_cache
+import weather_history
+import weather_http
+import weather_metrics
+import weather_parsers
 
-def bbc_weather_scraper(url):
+BBC_WEATHER_URL = 'https://www.bbc.com/weather/' #prefix of every url accepted by bbc_weather_scraper()
+BBC_HOST = 'www.bbc.com' #host queried by bbc_weather_scraper()
+GEODATOS_HOST = 'www.geodatos.net' #host queried by dutch_coordinates()
+DEFAULT_HOST_CONCURRENCY = 4 #maximum simultaneous requests to a single host in concurrent mode
+DEFAULT_EDGES = (10, 20) #temperature thresholds between the marker colours
+DEFAULT_PALETTE = ('blue', 'green', 'red') #marker colour below, between and above the thresholds
+MISSING_COLOUR = 'gray' #marker colour of a missing (NaN) temperature
+
+#colour names accepted in continuous palettes, other colours have to be given as '#rrggbb'
+NAMED_COLOURS = {'black':'#000000','white':'#ffffff','gray':'#808080','red':'#ff0000','green':'#008000','blue':'#0000ff',
+  'yellow':'#ffff00','orange':'#ffa500','purple':'#800080','darkblue':'#00008b','darkred':'#8b0000','darkgreen':'#006400',
+  'lightblue':'#add8e6','cyan':'#00ffff','magenta':'#ff00ff'}
+MAP_MODES = ('markers', 'geojson', 'cluster') #ways of drawing the stations, see weather_map.build_map()
+MAP_FILE = 'netherlands_weather_map.html' #file written by map_generator()
+DATA_FILE = 'netherlands_weather_data.json' #data file loaded by the map shell in incremental mode
+_HEX_DIGITS = None #'00' to 'ff', built on first use of a continuous palette
+
+def bbc_weather_scraper(url, backend=None, cache=None):
   """
   This function is a web scraper that obtains the current weather data in a specific city from a provided BBC Weather URL. 
+  Results are kept in a `weather_cache.ForecastCache` keyed by the location ID of the URL, so a city scraped less than
+  the cache TTL ago is answered without downloading its page again.
   Args:
     url (str): URL of the form 'https://www.bbc.com/weather/xxxxxxx'.
+    backend (str): HTML extraction backend ('soup', 'strainer' or 'stream'), see `weather_parsers.parse_bbc_page()`.
+    cache (ForecastCache or bool): The cache to use. None uses `weather_cache.default_forecast_cache()`,
+      False always scrapes the website.
   Returns:
       list: A list containing:
         - City (str): The name of the city.
@@ -20,37 +49,105 @@ def bbc_weather_scraper(url):
   """
   #reading of the url
   # A url was chosen as an input instead of a city name because weather websites do not index their results by city name and this makes them much more difficult to scrape.
-  if url[0:28] != 'https://www.bbc.com/weather/':
+  if weather_metrics.default_recorder() is None: #keeps the cache hits that make up most rows of a large map free of timing
+    return _forecast(url, backend, cache, None)
+  with weather_metrics.stage('bbc_weather_scraper', host=BBC_HOST) as event:
+    return _forecast(url, backend, cache, event)
+
+def _forecast(url, backend, cache, event):
+  """
+  The body of `bbc_weather_scraper()`, reporting the cache result and the city to the metrics `event` unless it is None.
+  """
+  if url[0:28] != BBC_WEATHER_URL:
     raise ValueError('Invalid website')
-  results =requests.get(url).text
-  doc= BeautifulSoup(results, "html.parser")
-  #selecting the relevant location for today's weather
-  clasa= doc.find(class_='wr-day__details')
-  #finding the city 
-  location=doc.find(class_='wr-c-location__name gel-paragon')
-  if location is None:
-    raise ValueError('Location not found')
-  city=location.contents[0].strip()
-  #finding description and temperature values
-  desc= clasa.find(class_="wr-day__details__weather-type-description")
-  temperature= clasa.find(class_="wr-value--temperature--c")
-  #selecting the temperature as an integer from a string
-  description=desc.contents[0].strip()
-  num_temp = re.search(r'\d+', str(temperature.contents))
-  if num_temp:
-    temp=int(num_temp.group())
-  #constructing the final results vector
-  results = [city,temp,description]
-  return results
-
-def dutch_coordinates(city):
+  if cache is None:
+    cache=weather_cache.default_forecast_cache()
+  key=weather_cache.location_id(url)
+  if cache is not False and key is not None:
+    if event is None:
+      return cache.fetch(key, lambda: _scraped_forecast(url, backend))
+    event.set(cache='hit')
+    caller=threading.get_ident()
+    def load():
+      if threading.get_ident() != caller:
+        #a stale hit refreshed in the background, after the event of this call has been recorded
+        with weather_metrics.stage('bbc_weather_revalidate', host=BBC_HOST) as refresh:
+          row=_scraped_forecast(url, backend)
+          refresh.set(city=row[0])
+          return row
+      event.set(cache='miss')
+      return _scraped_forecast(url, backend)
+    current=cache.fetch(key, load)
+  else:
+    current=_scraped_forecast(url, backend)
+  if event is not None:
+    event.set(city=current[0])
+  return current
+
+def _scraped_forecast(url, backend):
+  """
+  Downloads and parses a BBC Weather page, the uncached part of `bbc_weather_scraper()`.
+  """
+  results =weather_http.get_text(url) #pooled keep-alive session with conditional requests
+  #only the city, today's description and today's temperature are extracted from the page
+  with weather_metrics.stage('bbc_parse', host=BBC_HOST) as event:
+    current=weather_parsers.parse_bbc_page(results, backend)
+    event.set(city=current[0])
+  return current
+
+def bbc_weather_forecast(url, backend=None, cache=None):
+  """
+  Obtains the forecast of every day shown on a BBC Weather page, from the same single download as `bbc_weather_scraper()`.
+
+  Today's maximum, as returned by `bbc_weather_scraper()`, is stored in the forecast cache along the way, so drawing
+  today's map afterwards does not download the page again.
+
+  Args:
+    url (str): URL of the form 'https://www.bbc.com/weather/xxxxxxx'.
+    backend (str): HTML extraction backend ('soup', 'strainer' or 'stream'), see `weather_parsers.parse_bbc_forecast()`.
+    cache (ForecastCache or bool): The cache today's forecast is stored in. None uses `weather_cache.default_forecast_cache()`,
+      False stores nothing.
+
+  Returns:
+      list: A list containing:
+        - City (str): The name of the city.
+        - days (list of list): For every day [date (str), max_temp (int or None), min_temp (int or None), description (str)],
+          starting with today.
+
+  Example:
+        >>> city, days = bbc_weather_forecast('https://www.bbc.com/weather/2759794')
+        >>> days[1]
+        ['Tomorrow', 16, 9, 'Light cloud and a gentle breeze']
+  """
+  with weather_metrics.stage('bbc_weather_forecast', host=BBC_HOST) as event:
+    if url[0:28] != BBC_WEATHER_URL:
+      raise ValueError('Invalid website')
+    results =weather_http.get_text(url) #pooled keep-alive session with conditional requests
+    with weather_metrics.stage('bbc_parse', host=BBC_HOST):
+      city,days=weather_parsers.parse_bbc_forecast(results, backend)
+    event.set(city=city, days=len(days))
+    if cache is None:
+      cache=weather_cache.default_forecast_cache()
+    key=weather_cache.location_id(url)
+    _,high,low,description=days[0]
+    if cache is not False and key is not None:
+      #the same row `parse_bbc_page()` reads, the first temperature of today
+      cache.put(key, [city,high if high is not None else low,description])
+    return [city,days]
+
+def dutch_coordinates(city, cache=None, backend=None):
   """
   Determines the geographic coordinates of a specified Dutch city using a web scraper.
 
   The function takes the name of a city in the Netherlands, is case-insensitive, and can handle names with multiple words.
+  Coordinates are first looked up in a persistent `weather_cache.CoordinateCache`, so a city is only scraped the first time
+  it is requested. Scraped coordinates are written back into the cache.
 
   Args:
       city (str): The name of a Dutch city.
+      cache (CoordinateCache or bool): The cache to use. None uses `weather_cache.default_coordinate_cache()`,
+        False always scrapes the website.
+      backend (str): HTML extraction backend ('soup', 'strainer' or 'stream'), see `weather_parsers.parse_geodatos_page()`.
 
   Returns:
       list of float: A list containing the coordinates of the city in decimal degree format:
@@ -61,32 +158,141 @@ def dutch_coordinates(city):
       >>> dutch_coordinates('The Hague')
       [52.07667, 4.29861]
   """
-  if type(city) is not str:
-    raise ValueError(f"Invalid input data type")
+  if weather_metrics.default_recorder() is None:
+    return _coordinates(city, cache, backend, None)
+  with weather_metrics.stage('dutch_coordinates', host=GEODATOS_HOST, city=city) as event:
+    return _coordinates(city, cache, backend, event)
+
+def _geodatos_url(city):
+  """
+  Returns the key under which the coordinates of a city are cached and the geodatos.net page they are scraped from.
+  """
   city=city.lower() #the url only works for lowercase city names
   city =city.replace(" ", "-") #for composite names like "the hague"
+  return city,f'https://www.geodatos.net/en/coordinates/netherlands/{city}'
+
+def _coordinates(city, cache, backend, event):
+  """
+  The body of `dutch_coordinates()`, reporting the cache result to the metrics `event` unless it is None.
+  """
+  if type(city) is not str:
+    raise ValueError(f"Invalid input data type")
+  if cache is None:
+    cache=weather_cache.default_coordinate_cache()
+  if cache is not False:
+    cached=cache.get(city)
+    if event is not None:
+      event.set(cache='miss' if cached is None else 'hit')
+    if cached is not None:
+      return cached
+  name=city
+  city,url=_geodatos_url(city)
   #determining coordinates
-  url=f'https://www.geodatos.net/en/coordinates/netherlands/{city}'
-  results =requests.get(url).text
-  doc= BeautifulSoup(results, "html.parser")
-  unprocessed_coordinates=doc.find('p', class_='font-bold text-blue-500 mt-3 lg:text-lg')
+  results =weather_http.get_text(url) #pooled keep-alive session with conditional requests
   #processing coordinates into usable float array format
-  if(unprocessed_coordinates) == None:
+  with weather_metrics.stage('geodatos_parse', host=GEODATOS_HOST, city=name):
+    processed_cooridnates=weather_parsers.parse_geodatos_page(results, backend)
+  if processed_cooridnates is None:
     raise ValueError(f"Error: Coordinates not found for {city}")
-  list_coordinates=unprocessed_coordinates.contents[0].split(",")
-  processed_cooridnates = [float(a) for a in list_coordinates]
+  if cache is not False:
+    cache.put(city, processed_cooridnates)
   return processed_cooridnates
 
-def weather_array_stacker(url_list):
+def _host_slots(url_list, per_host_limit):
+  """
+  Builds the semaphores that bound the number of simultaneous requests sent to each host.
+
+  Args:
+    url_list (list of str): The BBC Weather URLs that will be scraped.
+    per_host_limit (int or dict): Either one limit applied to every host, or a dictionary mapping a host name to its limit.
+      Hosts missing from the dictionary use `DEFAULT_HOST_CONCURRENCY`.
+
+  Returns:
+    dict: A dictionary mapping every host that will be contacted to a `threading.BoundedSemaphore`.
+  """
+  hosts={GEODATOS_HOST}
+  for url in url_list:
+    if type(url) is str:
+      hosts.add(urlsplit(url).netloc)
+  slots={}
+  for host in hosts:
+    if type(per_host_limit) is dict:
+      limit=per_host_limit.get(host, DEFAULT_HOST_CONCURRENCY)
+    else:
+      limit=per_host_limit
+    if type(limit) is not int or limit<1:
+      raise ValueError('Invalid host concurrency limit')
+    slots[host]=threading.BoundedSemaphore(limit)
+  return slots
+
+def resolve_location(location):
+  """
+  Turns a BBC Weather URL, a BBC location ID or the name of a Dutch place into the URL that is scraped.
+
+  Place names are looked up in `weather_places.default_place_index()` without any request, and their coordinates come
+  with them, so `dutch_coordinates()` is not needed for that city. URLs are returned unchanged and checked by the scraper.
+
+  Args:
+      location (str): A URL of the form 'https://www.bbc.com/weather/xxxxxxx', its numeric ID or a place name.
+
+  Returns:
+      tuple: (url (str), coordinates), the coordinates being [latitude, longitude] for a place name and None otherwise.
+
+  Example:
+      >>> resolve_location('Den Haag')
+      ('https://www.bbc.com/weather/2747373', [52.07667, 4.29861])
+  """
+  if type(location) is not str or '/' in location:
+    return location,None
+  if location.isdigit():
+    return BBC_WEATHER_URL + location,None
+  import weather_places
+  _,key,latitude,longitude=weather_places.default_place_index().resolve(location)
+  return BBC_WEATHER_URL + str(key),[latitude,longitude]
+
+def _stacked_row(url, slots, scraper=None):
+  """
+  Scrapes one row of the weather matrix while holding a request slot for every host it contacts.
+
+  Args:
+    url (str): URL of the form 'https://www.bbc.com/weather/xxxxxxx', or a place name, see `resolve_location()`.
+    slots (dict): Host semaphores as returned by `_host_slots()`.
+    scraper (callable): Scrapes the BBC page, `bbc_weather_scraper()` by default.
+
+  Returns:
+    list: [City (str), temp_max (int), weather (str), latitude (float), longitude (float)]
+  """
+  url,coordinates=resolve_location(url)
+  host=urlsplit(url).netloc if type(url) is str else ''
+  with slots.get(host, nullcontext()): #invalid urls are rejected by the scraper without any request
+    current=(scraper or bbc_weather_scraper)(url)
+  if coordinates is None:
+    with slots[GEODATOS_HOST]:
+      coordinates=dutch_coordinates(current[0])
+  return current+coordinates
+
+def weather_array_stacker(url_list, max_workers=1, per_host_limit=DEFAULT_HOST_CONCURRENCY, pipeline=None, history=None):
   """
   Generates a matrix with city names, maximum temperatures, weather conditions, and coordinates using a list of BBC Weather URLs.
 
   This function uses `bbc_weather_scraper()` to obtain weather data and `dutch_coordinates()` to retrieve geographic coordinates.
   Note: The URLs must correspond to cities in the Netherlands for the `dutch_coordinates()` function to work correctly.
 
+  By default the cities are scraped one after the other. With `max_workers` larger than 1 the rows are scraped concurrently
+  by a bounded thread pool, while `per_host_limit` caps the number of simultaneous requests sent to each website.
+  The rows are always returned in the same order as `url_list`, regardless of the order in which they finish.
+
   Args:
      url_list (list of str): A list of BBC Weather URLs in the format 
         ["https://www.bbc.com/weather/xxxxxxx", "https://www.bbc.com/weather/yyyyyyy"], where each URL is specific to a Dutch city.
+        Location IDs and Dutch place names such as "Den Haag" are accepted as well, see `resolve_location()`.
+     max_workers (int): Number of cities scraped at the same time. Defaults to 1 (sequential).
+     per_host_limit (int or dict): Maximum simultaneous requests per host, either as one value for all hosts
+        or as a dictionary such as {'www.bbc.com': 4, 'www.geodatos.net': 2}. Only relevant when `max_workers` > 1.
+     pipeline (PipelinedStacker): Scrape with the download and parse stages of a `weather_pipeline.PipelinedStacker`
+        instead, which parses on every core. Its own worker counts and host limits replace `max_workers` and `per_host_limit`.
+     history (HistoryStore or bool): The `weather_history.HistoryStore` every row is appended to as an observation.
+        None uses `weather_history.default_store()`, False stores nothing.
 
   Returns:
      list of list: A matrix where each inner list contains:
@@ -100,30 +306,266 @@ def weather_array_stacker(url_list):
       >>> weather_array_stacker(["https://www.bbc.com/weather/2988507", "https://www.bbc.com/weather/2759794"])
       [['Paris', 14, 'Sunny and light winds', 52.07667, 4.29861],
       ['Amsterdam', 10, 'Partly cloudy', 52.3676, 4.9041]]
+      >>> weather_array_stacker(url_list, max_workers=8, per_host_limit={'www.bbc.com': 4, 'www.geodatos.net': 2})
+      >>> weather_array_stacker(url_list, pipeline=weather_pipeline.PipelinedStacker(fetch_workers=32))
+  """
+  with weather_metrics.stage('weather_array_stacker', workers=max_workers) as event:
+    if type(url_list) is not list or len(url_list) == 0:
+      raise ValueError('Invalid input')
+    if history is None:
+      history=weather_history.default_store()
+    elif history is False:
+      history=None
+    if pipeline is not None:
+      stacked_results=pipeline.run(url_list)
+      event.set(rows=len(stacked_results), workers=pipeline.fetch_workers, parse_workers=pipeline.parse_workers)
+      if history is not None:
+        history.append_rows(url_list, stacked_results)
+      return stacked_results
+    if type(max_workers) is not int or max_workers<1:
+      raise ValueError('Invalid number of workers')
+    index=len(url_list)#determining number of rows in the matrix
+    if max_workers == 1 or index == 1:
+      stacked_results=[]#initialising stack of results
+      for i in range(index):
+        #determining weather conditions for each url
+        url,coordinates=resolve_location(url_list[i]) #place names come with their coordinates
+        current=bbc_weather_scraper(url)
+        if coordinates is None:
+          coordinates=dutch_coordinates(current[0]) #calculating coordiantes
+        current=current+coordinates #adding coordinates to the city row
+        stacked_results.append(current) #stacking matrix
+      event.set(rows=index)
+      if history is not None:
+        history.append_rows(url_list, stacked_results) #keeping the observations of this run
+      return stacked_results
+    from concurrent.futures import ThreadPoolExecutor
+    slots=_host_slots(url_list, per_host_limit)
+    executor=ThreadPoolExecutor(max_workers=min(max_workers, index))
+    try:
+      futures=[executor.submit(_stacked_row, url, slots) for url in url_list]
+      #collecting in submission order keeps the matrix identical to the sequential one
+      stacked_results=[future.result() for future in futures]
+    finally:
+      #the first failing row aborts the batch, so rows that have not started yet are dropped
+      executor.shutdown(wait=True, cancel_futures=True)
+    event.set(rows=index)
+    if history is not None:
+      history.append_rows(url_list, stacked_results)
+    return stacked_results
+
+def _checked_row(url, slots):
+  """
+  Scrapes one row like `_stacked_row()`, but returns a failure instead of raising it.
+
+  Returns:
+    tuple: (row, None) on success, (None, exception) on failure.
+  """
+  try:
+    return _stacked_row(url, slots),None
+  except Exception as error:
+    return None,error
+
+def weather_array_stream(url_list, max_workers=1, per_host_limit=DEFAULT_HOST_CONCURRENCY, ordered=False):
+  """
+  Streaming version of `weather_array_stacker()`: yields every row as soon as it is scraped, and a failing city
+  yields its error instead of aborting the batch.
+
+  At most twice `max_workers` cities are in progress at any time and the URLs are read from `url_list` only as
+  they are needed, so memory stays flat even for a very long list or a generator of URLs.
+
+  Args:
+     url_list (iterable of str): BBC Weather URLs of Dutch cities, see `weather_array_stacker()`. May be a generator.
+     max_workers (int): Number of cities scraped at the same time. Defaults to 1 (sequential).
+     per_host_limit (int or dict): Maximum simultaneous requests per host, see `weather_array_stacker()`.
+     ordered (bool): Yield the rows in the order of `url_list` instead of the order in which they finish.
+
+  Returns:
+     iterator of tuple: (position (int), url (str), row (list or None), error (Exception or None)) for every URL, where
+       row is [City (str), temp_max (int), weather (str), latitude (float), longitude (float)] and exactly one of row
+       and error is None.
+
+  Example:
+      >>> for position, url, row, error in weather_array_stream(url_list, max_workers=8):
+      ...   print(url, error if error is not None else row)
+  """
+  if type(url_list) is str or not hasattr(url_list, '__iter__'):
+    raise ValueError('Invalid input')
+  if type(max_workers) is not int or max_workers<1:
+    raise ValueError('Invalid number of workers')
+  #every valid url is on the BBC host, the slots are known without reading the urls
+  slots=_host_slots([BBC_WEATHER_URL], per_host_limit)
+  return _row_stream(iter(url_list), max_workers, slots, ordered)
+
+def _row_stream(urls, max_workers, slots, ordered):
+  if max_workers == 1:
+    for position,url in enumerate(urls):
+      row,error=_checked_row(url, slots)
+      yield position,url,row,error
+    return
+  from collections import deque
+  from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+  executor=ThreadPoolExecutor(max_workers=max_workers)
+  window=2*max_workers #cities submitted ahead, so the workers never wait for the consumer
+  pending=deque() #(position, url, future) in submission order
+  numbered=enumerate(urls)
+  try:
+    while True:
+      for position,url in numbered:
+        pending.append((position,url,executor.submit(_checked_row, url, slots)))
+        if len(pending) >= window:
+          break
+      if not pending:
+        return
+      if ordered:
+        finished=[pending.popleft()]
+      else:
+        wait([future for _,_,future in pending], return_when=FIRST_COMPLETED)
+        finished=[item for item in pending if item[2].done()]
+        for item in finished:
+          pending.remove(item)
+      for position,url,future in finished:
+        row,error=future.result()
+        yield position,url,row,error
+  finally:
+    #a consumer that stops early does not leave the remaining cities running
+    executor.shutdown(wait=True, cancel_futures=True)
+
+def weather_table_stacker(url_list, max_workers=1, per_host_limit=DEFAULT_HOST_CONCURRENCY, pipeline=None):
+  """
+  Same as `weather_array_stacker()`, but returns the result as a columnar `weather_table.WeatherTable`.
+
+  The temperatures and coordinates are NumPy arrays and the city names and descriptions are interned string columns,
+  which keeps thousands of stations compact and lets them be filtered without per-row Python objects.
+
+  Args:
+     url_list (list of str): A list of BBC Weather URLs, see `weather_array_stacker()`.
+     max_workers (int): Number of cities scraped at the same time.
+     per_host_limit (int or dict): Maximum simultaneous requests per host.
+     pipeline (PipelinedStacker): Optional pipelined executor, see `weather_array_stacker()`.
+
+  Returns:
+     WeatherTable: The weather matrix in columns, `tolist()` gives back the list-of-lists matrix.
+
+  Example:
+      >>> table = weather_table_stacker(url_list)
+      >>> table[table.temperature > 10].city.tolist()
+      ['Amsterdam', 'Haarlem']
   """
-  index=len(url_list)#determining number of rows in the matrix
-  stacked_results=[]#initialising stack of results
-  if index == 0 or type(url_list) is not list:
+  import weather_table #NumPy is only loaded once a table is built
+  return weather_table.WeatherTable.from_rows(weather_array_stacker(url_list, max_workers, per_host_limit, pipeline))
+
+def weather_forecast_stacker(url_list, max_workers=1, per_host_limit=DEFAULT_HOST_CONCURRENCY):
+  """
+  Same as `weather_array_stacker()`, but with the forecast of every day of `bbc_weather_forecast()` instead of today's weather.
+
+  Args:
+     url_list (list of str): A list of BBC Weather URLs, see `weather_array_stacker()`.
+     max_workers (int): Number of cities scraped at the same time.
+     per_host_limit (int or dict): Maximum simultaneous requests per host.
+
+  Returns:
+     list of list: A matrix where each inner list contains:
+        - City (str): The name of the city.
+        - days (list of list): [date (str), max_temp (int or None), min_temp (int or None), description (str)] for every day.
+        - latitude (float): The latitude of the city in decimal degree format.
+        - longitude (float): The longitude of the city in decimal degree format.
+
+  Example:
+      >>> weather_forecast_stacker(["https://www.bbc.com/weather/2759794"])[0][1][1]
+      ['Tomorrow', 16, 9, 'Light cloud and a gentle breeze']
+  """
+  if type(url_list) is not list or len(url_list) == 0:
     raise ValueError('Invalid input')
-  for i in range(index):
-    #determining weather conditions for each url
-    current=bbc_weather_scraper(url_list[i])
-    coordinates=dutch_coordinates(current[0]) #calculating coordiantes
-    current=current+coordinates #adding coordinates to the city row
-    stacked_results.append(current) #stacking matrix
-  return stacked_results
+  if type(max_workers) is not int or max_workers<1:
+    raise ValueError('Invalid number of workers')
+  slots=_host_slots(url_list, per_host_limit)
+  if max_workers == 1 or len(url_list) == 1:
+    return [_stacked_row(url, slots, bbc_weather_forecast) for url in url_list]
+  from concurrent.futures import ThreadPoolExecutor
+  executor=ThreadPoolExecutor(max_workers=min(max_workers, len(url_list)))
+  try:
+    futures=[executor.submit(_stacked_row, url, slots, bbc_weather_forecast) for url in url_list]
+    return [future.result() for future in futures]
+  finally:
+    executor.shutdown(wait=True, cancel_futures=True)
 
-def marker_colour(temperature):
+def _rgb(colour):
+  """
+  Converts a colour name from `NAMED_COLOURS` or a '#rrggbb' string into its red, green and blue values.
+  """
+  hexadecimal=NAMED_COLOURS.get(colour, colour)
+  if type(hexadecimal) is not str or len(hexadecimal) != 7 or hexadecimal[0] != '#':
+    raise ValueError(f"Invalid colour {colour}")
+  return [int(hexadecimal[i:i+2], 16) for i in (1, 3, 5)]
+
+def marker_colours(temperatures, edges=DEFAULT_EDGES, palette=DEFAULT_PALETTE, continuous=False):
+  """
+  Determines the marker colours of a whole array of temperatures in one vectorized operation.
+
+  In the default binned mode, the temperatures are split by the increasing `edges` and every bin gets one colour of
+  `palette`, which therefore needs one colour more than there are edges. A temperature equal to an edge belongs to the
+  bin above it. In continuous mode, `palette` holds one colour per edge and temperatures are linearly interpolated
+  between them (a colormap), temperatures outside the edges get the first or last colour.
+  Missing temperatures (NaN) get `MISSING_COLOUR`.
+
+  Args:
+    temperatures (array-like): Temperatures in degrees Celsius, as integers or floats.
+    edges (sequence of float): Increasing temperature thresholds.
+    palette (sequence of str): Colours, as names or '#rrggbb' strings. In continuous mode the names must be in `NAMED_COLOURS`.
+    continuous (bool): Interpolate between the colours instead of binning.
+
+  Returns:
+    numpy.ndarray: The colour of every temperature, as strings.
+
+  Example:
+    >>> marker_colours([5, 15.5, 30])
+    array(['blue', 'green', 'red'], dtype='<U5')
+    >>> marker_colours([0, 5, 10], edges=[0, 10], palette=['#0000ff', '#ff0000'], continuous=True)
+    array(['#0000ff', '#800080', '#ff0000'], dtype='<U7')
+  """
+  global _HEX_DIGITS
+  import numpy as np
+  values=np.asarray(temperatures)
+  if values.dtype.kind not in 'iuf':
+    raise ValueError("Invalid input data type")
+  edges=np.asarray(edges, dtype=float)
+  if edges.ndim != 1 or len(edges) == 0 or np.any(np.diff(edges) <= 0):
+    raise ValueError("Invalid temperature edges")
+  missing=np.isnan(values) if values.dtype.kind == 'f' else None
+  if continuous:
+    if len(palette) != len(edges):
+      raise ValueError("Palette needs one colour per edge")
+    stops=np.array([_rgb(colour) for colour in palette], dtype=float)
+    if _HEX_DIGITS is None:
+      _HEX_DIGITS=np.array([f'{value:02x}' for value in range(256)])
+    #interpolating every colour channel separately along the temperature axis
+    channels=[np.rint(np.interp(values, edges, stops[:, channel])).astype(np.intp) for channel in range(3)]
+    colours=np.char.add(np.char.add(np.char.add('#', _HEX_DIGITS[channels[0]]), _HEX_DIGITS[channels[1]]), _HEX_DIGITS[channels[2]])
+  else:
+    if len(palette) != len(edges)+1:
+      raise ValueError("Palette needs one colour more than there are edges")
+    colours=np.asarray(palette)[np.searchsorted(edges, values, side='right')]
+  if missing is not None and missing.any():
+    colours=colours.astype(object)
+    colours[missing]=MISSING_COLOUR
+    colours=colours.astype(str)
+  return colours
+
+def marker_colour(temperature, edges=DEFAULT_EDGES, palette=DEFAULT_PALETTE):
   """
  Determines the color of a marker on the weather map based on the temperature in degrees Celsius.
 
- The function assigns:
+ With the default edges and palette the function assigns:
     - 'blue' for temperatures below 10 degrees,
     - 'green' for temperatures between 10 and 20 degrees,
     - 'red' for temperatures above 20 degrees.
+ It is `marker_colours()` for a single value, with the same binning and the same checks of `edges` and `palette`.
 
   Args:
-    temperature (int): The temperature in degrees Celsius.
+    temperature (int or float): The temperature in degrees Celsius, NumPy numbers are accepted too.
+    edges (sequence of float): Increasing temperature thresholds, see `marker_colours()`.
+    palette (sequence of str): One colour more than there are edges.
 
   Returns:
     colour (str): The color of the marker ('blue', 'green', or 'red').
@@ -132,51 +574,241 @@ def marker_colour(temperature):
     >>> marker_colour(30)
     'red'
   """
-  if type(temperature) is not int:
+  if not isinstance(temperature, numbers.Real) or isinstance(temperature, bool):
     raise ValueError("Invalid input data type")
-  if temperature<10:
-      colour = 'blue'
-  else:
-      if temperature<20:
-       colour='green'
-      else:
-       colour ='red'
-  return colour
+  return str(marker_colours([temperature], edges, palette)[0])
 
-def map_generator(url_list):
+def map_generator(url_list, max_workers=1, per_host_limit=DEFAULT_HOST_CONCURRENCY, mode='markers', data_file=None, output=MAP_FILE, forecast=False, stream=False, pipeline=None, surface=False):
   """
   Creates an interactive weather map of The Netherlands using Folium, where each city is marked with its corresponding temperature and weather description.
 
-  This function uses `weather_array_stacker()` to gather weather data and `marker_colour()` to determine the color of the marker based on the temperature. The map displays:
+  This function uses `weather_table_stacker()` to gather weather data and `weather_map.build_map()` to draw it, with the marker colours of `marker_colours()`. The map displays:
     - A color-coded marker (blue for temperatures below 10°C, green for temperatures between 10-20°C, red for temperatures above 20°C).
     - A popup with weather conditions that appear when clicking on a marker.
 
+  With `data_file`, the map is generated incrementally instead: the HTML shell is written once by `weather_map.write_map_shell()`
+  and every following call only rewrites the small JSON data file, and only when a city changed (`weather_map.refresh_map_data()`).
+
   Args:
       url_list (list of str): A list of BBC Weather URLs in the form 
         ["https://www.bbc.com/weather/xxxxxxx", "https://www.bbc.com/weather/yyyyyyy"], where each URL corresponds to a Dutch city.
+        Dutch place names such as ["Amsterdam", "Den Haag"] are resolved offline by `resolve_location()`, their coordinates
+        are not looked up on geodatos.net.
+      max_workers (int): Number of cities scraped at the same time, passed on to `weather_table_stacker()`.
+      per_host_limit (int or dict): Maximum simultaneous requests per host, passed on to `weather_table_stacker()`.
+      mode (str): 'markers', 'geojson' or 'cluster', see `weather_map.build_map()`. Use one of the last two for hundreds of stations or more.
+      data_file (str): Path of the JSON data file for the incremental mode, for example `DATA_FILE`. None writes a complete map.
+      output (str): Path of the HTML map. Defaults to 'netherlands_weather_map.html' in the working directory.
+      forecast (bool): Draw every day of the forecast with a day selector (`weather_map.build_forecast_map()`) instead of today only.
+        Every page is still downloaded once. Cannot be combined with `data_file`.
+      stream (bool): Consume the rows of `weather_array_stream()` as they arrive: a failing city is left off the map
+        instead of aborting it, and with `data_file` the data file is already rewritten while the scrape is running
+        (`weather_map.stream_map_data()`). Cannot be combined with `forecast`.
+      pipeline (PipelinedStacker): Scrape with a `weather_pipeline.PipelinedStacker`, see `weather_array_stacker()`.
+        Not used by the forecast and stream modes.
+      surface (bool or TemperatureSurface): Also draw a temperature surface interpolated between the cities
+        (`weather_map.build_map()`). True uses `weather_surface.default_surface()`, which keeps its interpolation
+        weights between calls for the same cities. Not drawn by the forecast and incremental maps.
 
   Returns:
       None: The function generates an HTML map and saves it as 'netherlands_weather_map.html' for viewing in a web browser.
+        In stream mode, the list of (url, error) pairs of the cities that failed is returned instead.
 
   Example:
       >>> map_generator(["https://www.bbc.com/weather/2988507", "https://www.bbc.com/weather/2759794"])
       # Creates 'netherlands_weather_map.html' with markers showing weather data for cities in the URLs.
+      >>> map_generator(url_list, data_file='netherlands_weather_data.json')
+      # Writes the shell on the first call, afterwards only 'netherlands_weather_data.json' when a temperature changed.
+      >>> map_generator(url_list, forecast=True)
+      # Creates 'netherlands_weather_map.html' with a selector for the next 14 days.
+      >>> map_generator(['Amsterdam', 'Haarlem', 'Den Haag', 'Utrecht'])
+      # Creates 'netherlands_weather_map.html' without looking up any coordinates.
+      >>> failures = map_generator(url_list, max_workers=8, stream=True)
+      # Creates 'netherlands_weather_map.html' with every city that could be scraped.
    """
-  matrix = weather_array_stacker (url_list)
-  netherlands_map = folium.Map(location=[52.3784, 4.9009], zoom_start=7)#location of the map
-  index = len(matrix)#number of markers
-  for i in range(index):#creates a marker for each point
-    #determines the colour of marker based on temperature
-    colour=marker_colour(int(matrix[i][1]))
-    folium.Marker(
-        location=[matrix[i][3],matrix[i][4]],#places marker on coordinates
-        popup=f"{matrix[i][0]} - {matrix[i][1]} - {matrix[i][2]}",  # Weather description is added to the pop up
-        icon=folium.DivIcon(html=f'<div style="font-size: 16pt; color: {colour};">{matrix[i][1]}</div>')#uses temperature as number icon of the correct colour
-    ).add_to(netherlands_map)
-  netherlands_map.save("netherlands_weather_map.html")#saves complete map
-  return
+  with weather_metrics.stage('map_generator', mode=mode if data_file is None else 'incremental'):
+    if mode not in MAP_MODES:
+      raise ValueError('Invalid map mode')
+    if forecast and data_file is not None:
+      raise ValueError('The forecast map cannot be generated incrementally')
+    if forecast and stream:
+      raise ValueError('The forecast map cannot be streamed')
+    import weather_map #Folium is only loaded when a map is drawn
+    if surface is True:
+      import weather_surface
+      surface = weather_surface.default_surface()
+    elif surface is False:
+      surface = None
+    if stream:
+      results = weather_array_stream(url_list, max_workers, per_host_limit)
+      if data_file is not None:
+        if not os.path.exists(output):
+          weather_map.write_map_shell(output, data_file)
+        return weather_map.stream_map_data(results, data_file)[1]
+      rows, failures = [], []
+      for _, url, row, error in results:
+        if error is not None:
+          failures.append((url, error))
+        else:
+          rows.append(row)
+      import weather_table
+      table = weather_table.WeatherTable.from_rows(rows)
+      with weather_metrics.stage('map_render', mode=mode) as event:
+        weather_map.save_map(table, output, mode, surface)
+        event.set(rows=len(table))
+      return failures
+    if forecast:
+      forecasts = weather_forecast_stacker(url_list, max_workers, per_host_limit)
+      with weather_metrics.stage('map_render', mode=mode) as event:
+        weather_map.save_forecast_map(forecasts, output, mode)
+        event.set(rows=len(forecasts))
+      return
+    if data_file is not None:
+      if not os.path.exists(output):
+        weather_map.write_map_shell(output, data_file)
+      weather_map.refresh_map_data(url_list, data_file, max_workers, per_host_limit, pipeline)
+      return
+    table = weather_table_stacker(url_list, max_workers, per_host_limit, pipeline)
+    with weather_metrics.stage('map_render', mode=mode) as event:
+      weather_map.save_map(table, output, mode, surface)#saves complete map
+      event.set(rows=len(table))
+    return
+
+def bbc_url(location):
+  """
+  Turns a BBC location ID into its BBC Weather URL, URLs are returned unchanged.
+
+  Args:
+      location (str): A URL of the form 'https://www.bbc.com/weather/xxxxxxx' or just its numeric ID.
+
+  Returns:
+      str: The BBC Weather URL.
+
+  Example:
+      >>> bbc_url('2759794')
+      'https://www.bbc.com/weather/2759794'
+  """
+  if type(location) is str and location.isdigit():
+    return BBC_WEATHER_URL + location
+  return location
 
 url_list = ["https://www.bbc.com/weather/2759794","https://www.bbc.com/weather/2755003","https://www.bbc.com/weather/2747373","https://www.bbc.com/weather/2745912",'https://www.bbc.com/weather/2743477','https://www.bbc.com/weather/2755420','https://www.bbc.com/weather/2759706','https://www.bbc.com/weather/2755251','https://www.bbc.com/weather/2751738','https://www.bbc.com/weather/2757220','https://www.bbc.com/weather/2756136']
 
-map_generator(url_list)
+def main(argv=None):
+  """
+  Command line entry point, installed as `netherlands-weather-map`.
+
+  Args:
+      argv (list of str): The command line arguments, `sys.argv[1:]` by default.
+
+  Returns:
+      int: The exit status.
+
+  Example:
+      $ netherlands-weather-map 2759794 https://www.bbc.com/weather/2755003 -o maps/today.html --workers 4
+      $ netherlands-weather-map --metrics /var/lib/node_exporter/weather.prom
+      $ netherlands-weather-map --daemon --interval 600 --data-file netherlands_weather_data.json
+      $ netherlands-weather-map --daemon --serve 0.0.0.0:8000
+  """
+  import argparse
+  parser = argparse.ArgumentParser(prog='netherlands-weather-map', description='Creates an interactive weather map of The Netherlands from BBC Weather pages.')
+  parser.add_argument('locations', nargs='*', help='BBC Weather URLs, location IDs or Dutch place names (default: eleven large Dutch cities)')
+  parser.add_argument('-o', '--output', default=MAP_FILE, help=f'path of the HTML map (default: {MAP_FILE})')
+  parser.add_argument('--mode', choices=MAP_MODES, default='markers', help='how the stations are drawn (default: markers)')
+  parser.add_argument('--workers', type=int, default=1, help='number of cities scraped at the same time (default: 1)')
+  parser.add_argument('--rate-limit', type=float, help='maximum requests per second sent to each website, bursts are spread out instead of being refused')
+  parser.add_argument('--timeout', type=float, help=f'seconds to wait for a website to connect and to answer before the request fails (default: {weather_http.DEFAULT_TIMEOUT[0]} and {weather_http.DEFAULT_TIMEOUT[1]})')
+  parser.add_argument('--hedge', action='store_true', help='send a request a second time when the website is slower than usual, the first answer wins')
+  parser.add_argument('--per-host', type=int, default=DEFAULT_HOST_CONCURRENCY, help=f'maximum simultaneous requests per website (default: {DEFAULT_HOST_CONCURRENCY})')
+  parser.add_argument('--data-file', help='write the map shell once and only refresh this JSON data file afterwards')
+  parser.add_argument('--metrics', help='write the timings of every stage to this file in the Prometheus text format')
+  parser.add_argument('--forecast', action='store_true', help='draw every day of the forecast with a day selector instead of today only')
+  parser.add_argument('--history', help='append every scraped observation to this history file')
+  parser.add_argument('--surface', action='store_true', help='also draw the temperature interpolated between the cities as a coloured surface')
+  parser.add_argument('--parse-workers', type=int, help='parse the pages in this many processes while --workers threads download them, for thousands of cities')
+  parser.add_argument('--stream', action='store_true', help='skip the cities that fail instead of stopping, and fill the data file while scraping')
+  parser.add_argument('--serve', metavar='[HOST:]PORT', help='serve the map over HTTP from memory, compressed and with ETags, until interrupted (with --daemon every new render is served at once)')
+  parser.add_argument('--daemon', action='store_true', help='keep running and refresh every city on its own schedule, the map is redrawn when a city changed')
+  parser.add_argument('--interval', type=float, default=900, help='seconds between two refreshes of a city in daemon mode (default: 900)')
+  parser.add_argument('--jitter', type=float, default=0.2, help='fraction by which the daemon varies every interval (default: 0.2)')
+  args = parser.parse_args(argv)
+  if args.forecast and args.daemon:
+    parser.error('--forecast cannot be combined with --daemon')
+  if args.forecast and args.stream:
+    parser.error('--forecast cannot be combined with --stream')
+  if args.daemon and args.stream:
+    parser.error('--stream cannot be combined with --daemon, the daemon already keeps going when a city fails')
+  if args.daemon and (args.workers != parser.get_default('workers') or args.per_host != parser.get_default('per_host') or args.parse_workers is not None):
+    parser.error('--workers, --per-host and --parse-workers cannot be combined with --daemon, it refreshes one city at a time')
+  locations = [bbc_url(location) for location in args.locations] or url_list
+  client = None
+  if args.rate_limit is not None or args.timeout is not None or args.hedge:
+    try:
+      client = weather_http.HttpClient(rate_limit=args.rate_limit, timeout=weather_http.DEFAULT_TIMEOUT if args.timeout is None else args.timeout, hedge=args.hedge)
+    except ValueError as error:
+      parser.error(str(error))
+    weather_http.set_default_client(client)
+  server = None
+  if args.serve:
+    import weather_server
+    host, _, port = args.serve.rpartition(':')
+    try:
+      server = weather_server.MapServer(host or weather_server.DEFAULT_HOST, int(port), os.path.basename(args.output), os.path.dirname(os.path.abspath(args.output)))
+    except (ValueError, OSError) as error:
+      parser.error(f'cannot serve on {args.serve}: {error}')
+    server.publish_map(args.output, args.data_file) #the previous map is served while the new one is scraped
+  if args.metrics:
+    recorder = weather_metrics.MetricsRecorder()
+    weather_metrics.set_default_recorder(recorder)
+  if args.history:
+    weather_history.set_default_store(weather_history.HistoryStore(args.history))
+  try:
+    if args.daemon:
+      import signal
+      import weather_daemon
+      daemon = weather_daemon.RefreshDaemon(locations, args.interval, args.jitter, output=args.output, mode=args.mode, data_file=args.data_file, server=server, surface=args.surface)
+      signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+      if server is not None:
+        server.start()
+      try:
+        daemon.run()
+      except KeyboardInterrupt:
+        pass
+    elif args.parse_workers is not None:
+      import weather_pipeline
+      pipeline = weather_pipeline.PipelinedStacker(args.workers, args.parse_workers, per_host_limit=args.per_host)
+      try:
+        map_generator(locations, mode=args.mode, data_file=args.data_file, output=args.output, pipeline=pipeline, surface=args.surface)
+      finally:
+        pipeline.close()
+    elif args.stream:
+      failures = map_generator(locations, args.workers, args.per_host, args.mode, args.data_file, args.output, stream=True, surface=args.surface)
+      for url, error in failures:
+        sys.stderr.write(f'{parser.prog}: warning: {url} skipped: {error}\n')
+    else:
+      map_generator(locations, args.workers, args.per_host, args.mode, args.data_file, args.output, args.forecast, surface=args.surface)
+    if server is not None and not args.daemon:
+      server.publish_map(args.output, args.data_file)
+      try:
+        server.serve_forever()
+      except KeyboardInterrupt:
+        pass
+  except ValueError as error:
+    parser.exit(1, f'{parser.prog}: error: {error}\n')
+  finally:
+    if server is not None:
+      server.close()
+    if client is not None:
+      client.close()
+      weather_http.set_default_client(None)
+    if args.history:
+      weather_history.default_store().close()
+      weather_history.set_default_store(None)
+    if args.metrics:
+      weather_metrics.set_default_recorder(None)
+      with open(args.metrics, 'w', encoding='utf-8') as file:
+        file.write(recorder.prometheus_text())
+  return 0
 
+if __name__ == "__main__":
+  raise SystemExit(main())
@@ -0,0 +1,287 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+from weather_scraper import MAP_FILE
+
+DEFAULT_HOST = '127.0.0.1' #only this machine, use '0.0.0.0' to serve the map to other viewers
+DEFAULT_PORT = 8000
+GZIP_LEVEL = 9 #every file is compressed once per render, so the smallest output is worth the time
+BROTLI_QUALITY = 11
+MIN_COMPRESS = 256 #bytes below which a file is only served uncompressed
+BACKLOG = 1024 #connections waiting to be accepted, so a burst of viewers is not refused
+ETAG_SUFFIXES = {'identity':'', 'gzip':'-gz', 'br':'-br'} #a strong tag changes with the content coding (RFC 9110 8.8.3)
+
+logger = logging.getLogger(__name__)
+
+try:
+  import brotli #optional, browsers prefer it over gzip when it is installed
+except ImportError:
+  brotli = None
+
+class _Published:
+  """
+  One published file with its compressed variants, never changed after it is built.
+  """
+  def __init__(self, body, content_type):
+    self.content_type=content_type
+    self.bodies={'identity':body}
+    if len(body) >= MIN_COMPRESS:
+      self.bodies['gzip']=gzip.compress(body, GZIP_LEVEL, mtime=0)
+      if brotli is not None:
+        self.bodies['br']=brotli.compress(body, quality=BROTLI_QUALITY)
+    digest=hashlib.sha256(body).hexdigest()[:32] #strong, the same bytes always give the same tags
+    self.etags={coding:'"'+digest+ETAG_SUFFIXES[coding]+'"' for coding in self.bodies}
+
+def _accepted(header):
+  """
+  Returns the content codings of an Accept-Encoding header that are not refused with q=0.
+  """
+  codings=set()
+  for part in (header or '').split(','):
+    coding,_,parameters=part.partition(';')
+    coding=coding.strip().lower()
+    quality=parameters.strip().lower()
+    if quality.startswith('q='):
+      try:
+        if float(quality[2:]) == 0:
+          continue
+      except ValueError:
+        continue
+    if coding:
+      codings.add(coding)
+  return codings
+
+def _matches(header, etags):
+  """
+  Whether an If-None-Match header matches one of the ETags, with the weak comparison of RFC 9110.
+  """
+  if header is None:
+    return False
+  if header.strip() == '*':
+    return True
+  return any(tag.strip().removeprefix('W/') in etags for tag in header.split(','))
+
+class _Handler(BaseHTTPRequestHandler):
+  protocol_version='HTTP/1.1' #keep-alive, a viewer polling the data file reuses its connection
+  server_version='netherlands-weather-map'
+
+  def do_GET(self):
+    self._respond(True)
+
+  def do_HEAD(self):
+    self._respond(False)
+
+  def _respond(self, send_body):
+    server=self.server.map_server
+    published=server.lookup(urlsplit(self.path).path)
+    if published is None:
+      server._count('not_found', 0)
+      self.send_response(404)
+      self.send_header('Content-Length', '0')
+      self.end_headers()
+      return
+    accepted=_accepted(self.headers.get('Accept-Encoding'))
+    coding='identity'
+    for candidate in ('br', 'gzip'):
+      if candidate in accepted and candidate in published.bodies:
+        coding=candidate
+        break
+    #a viewer holding any coding of this version has the current content
+    if _matches(self.headers.get('If-None-Match'), published.etags.values()):
+      server._count('not_modified', 0)
+      self.send_response(304)
+      self.send_header('ETag', published.etags[coding])
+      self.send_header('Cache-Control', 'no-cache')
+      self.send_header('Vary', 'Accept-Encoding')
+      self.end_headers()
+      return
+    body=published.bodies[coding]
+    self.send_response(200)
+    self.send_header('Content-Type', published.content_type)
+    self.send_header('Content-Length', str(len(body)))
+    self.send_header('ETag', published.etags[coding])
+    self.send_header('Cache-Control', 'no-cache') #viewers revalidate, which costs a 304 until the next render
+    self.send_header('Vary', 'Accept-Encoding')
+    if coding != 'identity':
+      self.send_header('Content-Encoding', coding)
+    self.end_headers()
+    server._count(coding, len(body) if send_body else 0) #before the body, a viewer that has it also finds it counted
+    if send_body:
+      self.wfile.write(body)
+
+  def log_message(self, format, *args):
+    logger.debug('%s - %s', self.address_string(), format % args)
+
+class _Server(ThreadingHTTPServer):
+  request_queue_size=BACKLOG
+  daemon_threads=True #open keep-alive connections do not keep the process running
+
+class MapServer:
+  """
+  Embedded HTTP server that keeps the latest rendered map in memory and serves it to any number of viewers.
+
+  Every file is published once per render: it is compressed with gzip, and with brotli when the `brotli` package is
+  installed, and every variant is tagged with a strong ETag derived from the content, with '-gz' or '-br' appended for
+  the compressed ones. A request then only picks the variant its Accept-Encoding allows and writes the prepared bytes,
+  or answers 304 Not Modified when the viewer already has the content in any coding, so the cost per request does not
+  depend on the size of the map. Publishing a file with unchanged content keeps its tags.
+
+  The published files are held in one dictionary that is replaced as a whole by `publish()`, so a new render becomes
+  visible to all following requests at once, while requests that already started finish with the bytes they found.
+  Every connection is served by its own thread and kept alive between requests.
+
+  Args:
+    host (str): Interface to listen on.
+    port (int): Port to listen on, 0 picks a free one (see `address`).
+    index (str): The file served for '/', the HTML map by default.
+    root (str): Folder the paths of `publish_file()` are taken relative to, the working directory by default.
+
+  Example:
+    >>> server = MapServer(port=8000)
+    >>> server.publish_file('netherlands_weather_map.html')
+    True
+    >>> server.start() #in a background thread, or server.serve_forever()
+    >>> server.stats()['gzip']
+    {'responses': 1520, 'bytes': 40478720}
+    >>> server.close()
+  """
+  def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, index=os.path.basename(MAP_FILE), root='.'):
+    if type(port) is not int or not 0 <= port < 65536:
+      raise ValueError('Invalid port')
+    self.index=index
+    self.root=root
+    self._files={} #url path -> _Published, replaced as a whole
+    self._publish_lock=threading.Lock()
+    self._lock=threading.Lock()
+    self._counters={key:{'responses':0, 'bytes':0} for key in ('br', 'gzip', 'identity', 'not_modified', 'not_found')}
+    self._publishes=0
+    self._thread=None
+    self._server=_Server((host, port), _Handler)
+    self._server.map_server=self
+
+  @property
+  def address(self):
+    """
+    The (host, port) the server listens on.
+    """
+    return self._server.server_address[:2]
+
+  def lookup(self, path):
+    """
+    Returns the published file of a URL path, or None.
+    """
+    path=unquote(path).lstrip('/') or self.index
+    return self._files.get(path)
+
+  def publish(self, name, body, content_type=None):
+    """
+    Makes new content available under a URL path, replacing the previous version in one step.
+
+    Args:
+      name (str): The path, relative to the root of the server, such as 'netherlands_weather_data.json'.
+      body (bytes or str): The content, str is encoded as UTF-8.
+      content_type (str): The Content-Type header, guessed from the name by default.
+
+    Returns:
+      bool: False when the content is identical to the published one and nothing was replaced.
+    """
+    if type(body) is str:
+      body=body.encode('utf-8')
+    if type(body) is not bytes:
+      raise ValueError("Invalid input data type")
+    name=name.replace(os.sep, '/').lstrip('/')
+    if content_type is None:
+      content_type,_=mimetypes.guess_type(name)
+      content_type=content_type or 'application/octet-stream'
+      if content_type.startswith('text/') or content_type == 'application/json':
+        content_type+='; charset=utf-8'
+    current=self._files.get(name)
+    if current is not None and current.bodies['identity'] == body and current.content_type == content_type:
+      return False
+    published=_Published(body, content_type) #compressed before the swap, requests never wait for it
+    with self._publish_lock:
+      files=dict(self._files)
+      files[name]=published
+      self._files=files
+      self._publishes+=1
+    return True
+
+  def publish_file(self, path):
+    """
+    Publishes a file written by `weather_map`, under its path relative to `root`.
+
+    Returns:
+      bool: False when the file did not change since it was last published.
+    """
+    with open(path, 'rb') as file:
+      body=file.read()
+    return self.publish(os.path.relpath(os.path.abspath(path), os.path.abspath(self.root)), body)
+
+  def publish_map(self, output=MAP_FILE, data_file=None):
+    """
+    Publishes the HTML map and, for the incremental map, its data file, as far as they have been written.
+
+    Args:
+      output (str): Path of the HTML map.
+      data_file (str): Path of the JSON data file of the incremental map, or None.
+
+    Returns:
+      int: The number of files whose content changed.
+    """
+    changed=0
+    for path in (output, data_file):
+      if path is not None and os.path.exists(path):
+        changed+=self.publish_file(path)
+    return changed
+
+  def _count(self, key, sent):
+    with self._lock:
+      counter=self._counters[key]
+      counter['responses']+=1
+      counter['bytes']+=sent
+
+  def serve_forever(self):
+    """
+    Answers requests until `close()` is called from another thread.
+    """
+    self._server.serve_forever()
+
+  def start(self):
+    """
+    Answers requests in a background thread.
+    """
+    if self._thread is None:
+      self._thread=threading.Thread(target=self.serve_forever, name='map-server', daemon=True)
+      self._thread.start()
+
+  def close(self):
+    """
+    Stops answering requests and closes the listening socket.
+    """
+    if self._thread is not None:
+      self._server.shutdown()
+      self._thread.join()
+      self._thread=None
+    self._server.server_close()
+
+  def stats(self):
+    """
+    Reports the responses sent so far.
+
+    Returns:
+      dict: A dictionary with:
+        - br, gzip, identity (dict): responses (int) and bytes (int) of the bodies sent in each coding.
+        - not_modified, not_found (dict): responses (int) answered with 304 and 404.
+        - files (int): Files currently published.
+        - publishes (int): Times new content was published.
+    """
+    with self._lock:
+      stats={key:dict(value) for key,value in self._counters.items()}
+    stats['files']=len(self._files)
+    stats['publishes']=self._publishes
+    return stats
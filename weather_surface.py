@@ -0,0 +1,232 @@
+import threading
+import numpy as np
+import weather_scraper
+
+SURFACE_BOUNDS = ((50.75, 3.35), (53.55, 7.25)) #south-west and north-east corner of the Netherlands (latitude, longitude)
+DEFAULT_SHAPE = (280, 390) #grid rows and columns, about 1 km per cell
+DEFAULT_NEIGHBOURS = 8 #stations that contribute to every grid cell
+DEFAULT_POWER = 2 #exponent of the inverse distance weights
+DEFAULT_MAX_DISTANCE = 0.6 #degrees from the nearest station beyond which a cell stays transparent
+CHUNK_ELEMENTS = 2**22 #cell-station distances computed at once, bounds the memory of the weight computation
+TILE_CELLS = 16 #rows and columns of the grid tiles whose nearest stations are searched together
+SURFACE_EDGES = (-5, 5, 15, 25) #temperatures of the colours of the surface
+SURFACE_PALETTE = ('purple', 'blue', 'yellow', 'red')
+
+class TemperatureSurface:
+  """
+  Interpolates the temperatures of scattered stations onto a regular latitude/longitude grid by inverse distance weighting.
+
+  Every grid cell is the weighted mean of its `neighbours` nearest stations, with weights 1/distance**`power`. Distances
+  are measured on a local equirectangular projection, so a degree of longitude counts for its true length at Dutch
+  latitudes. The grid is split into tiles of `TILE_CELLS` by `TILE_CELLS` cells and only the stations that can be among
+  the nearest of some cell of a tile are compared with its cells, in chunks of at most `CHUNK_ELEMENTS` distances, so
+  neither time nor memory grow with the product of cells and stations.
+
+  The nearest stations and their weights only depend on the station coordinates, not on the temperatures. They are
+  computed once and reused for as long as the same stations are interpolated, so refreshing the surface with new
+  temperatures costs one gather and one sum per cell.
+
+  Args:
+    bounds (tuple): ((south, west), (north, east)) corners of the grid in degrees.
+    shape (tuple): (rows, columns) of the grid.
+    neighbours (int): Nearest stations contributing to every cell.
+    power (float): Exponent of the inverse distance weights, larger values make the surface follow the nearest station more.
+    max_distance (float): Cells farther than this many degrees from every station are left empty (NaN). None fills the whole grid.
+
+  Example:
+    >>> surface = TemperatureSurface(shape=(560, 780))
+    >>> grid = surface.interpolate(weather_scraper.weather_table_stacker(url_list))
+    >>> grid.shape
+    (560, 780)
+  """
+  def __init__(self, bounds=SURFACE_BOUNDS, shape=DEFAULT_SHAPE, neighbours=DEFAULT_NEIGHBOURS, power=DEFAULT_POWER, max_distance=DEFAULT_MAX_DISTANCE):
+    (south,west),(north,east)=bounds
+    if not south < north or not west < east:
+      raise ValueError('Invalid surface bounds')
+    rows,columns=shape
+    if type(rows) is not int or type(columns) is not int or rows<1 or columns<1:
+      raise ValueError('Invalid surface shape')
+    if type(neighbours) is not int or neighbours<1 or not power > 0:
+      raise ValueError('Invalid interpolation parameters')
+    self.bounds=((south,west),(north,east))
+    self.shape=(rows,columns)
+    self.neighbours=neighbours
+    self.power=power
+    self.max_distance=max_distance
+    self._scale=np.cos(np.radians((south+north)/2)) #length of a degree of longitude in degrees of latitude
+    #cell centres, the first row is the northern edge like the rows of an image
+    latitudes=north-(np.arange(rows)+0.5)*(north-south)/rows
+    longitudes=west+(np.arange(columns)+0.5)*(east-west)/columns
+    self.latitudes=latitudes
+    self.longitudes=longitudes
+    self._lock=threading.Lock()
+    self._key=None
+    self._weights=None #(station indices, weights, empty cells) of the cached station set
+    self._counters={'computed':0,'reused':0}
+
+  def _tiles(self):
+    """
+    Yields the flat cell indices, centre and half diagonal of every tile of the grid.
+    """
+    rows,columns=self.shape
+    longitudes=self.longitudes*self._scale
+    for top in range(0, rows, TILE_CELLS):
+      for left in range(0, columns, TILE_CELLS):
+        tile_rows=np.arange(top, min(top+TILE_CELLS, rows))
+        tile_columns=np.arange(left, min(left+TILE_CELLS, columns))
+        latitudes=self.latitudes[tile_rows]
+        tile_longitudes=longitudes[tile_columns]
+        centre=np.array([(latitudes[0]+latitudes[-1])/2, (tile_longitudes[0]+tile_longitudes[-1])/2])
+        half_diagonal=np.hypot(latitudes[0]-latitudes[-1], tile_longitudes[0]-tile_longitudes[-1])/2
+        yield (tile_rows[:, None]*columns+tile_columns[None, :]).ravel(),centre,half_diagonal
+
+  def _nearest(self, cells, stations, count):
+    """
+    Returns the indices into `stations` of the `count` nearest stations of every cell and their squared distances.
+    """
+    rows,columns=self.shape
+    latitudes=self.latitudes[cells // columns]
+    longitudes=self.longitudes[cells % columns]*self._scale
+    #squared distances of the cells to every candidate station
+    distances=(latitudes[:, None]-stations[None, :, 0])**2+(longitudes[:, None]-stations[None, :, 1])**2
+    if count < len(stations):
+      closest=np.argpartition(distances, count-1, axis=1)[:, :count]
+    else:
+      closest=np.broadcast_to(np.arange(count), (len(cells), count))
+    return closest,np.take_along_axis(distances, closest, axis=1)
+
+  def weights(self, latitude, longitude):
+    """
+    Finds the nearest stations of every cell and their normalised weights, or returns them from the cache.
+
+    Args:
+      latitude (array-like): Latitudes of the stations.
+      longitude (array-like): Longitudes of the stations, in the same order.
+
+    Returns:
+      tuple: (indices, weights, empty), the station indices (cells x neighbours), their weights summing to 1 for
+        every cell, and the boolean mask of the cells beyond `max_distance`.
+    """
+    stations=np.column_stack([np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float)*self._scale])
+    if len(stations) == 0:
+      raise ValueError('No stations to interpolate')
+    key=stations.tobytes()
+    with self._lock:
+      if self._key == key:
+        self._counters['reused']+=1
+        return self._weights
+    size=self.shape[0]*self.shape[1]
+    count=min(self.neighbours, len(stations))
+    indices=np.empty((size, count), dtype=np.int32)
+    weights=np.empty((size, count))
+    nearest=np.empty(size)
+    for cells,centre,half_diagonal in self._tiles():
+      #the nearest stations of any cell of the tile are no farther from its centre than the count-th nearest station of
+      #the centre plus the whole diagonal of the tile, the other stations are never compared with its cells
+      reach=np.sqrt(((stations-centre)**2).sum(axis=1))
+      limit=np.partition(reach, count-1)[count-1]+2*half_diagonal
+      candidates=np.flatnonzero(reach <= limit)
+      step=max(1, CHUNK_ELEMENTS // len(candidates))
+      for start in range(0, len(cells), step):
+        chunk=cells[start:start+step]
+        closest,selected=self._nearest(chunk, stations[candidates], count)
+        #a station on a cell centre would divide by zero, it simply dominates the cell
+        inverse=np.maximum(selected, 1e-12)**(-self.power/2)
+        indices[chunk]=candidates[closest]
+        weights[chunk]=inverse/inverse.sum(axis=1, keepdims=True)
+        nearest[chunk]=np.sqrt(selected.min(axis=1))
+    empty=nearest > self.max_distance if self.max_distance is not None else np.zeros(size, dtype=bool)
+    with self._lock:
+      self._key=key
+      self._weights=(indices,weights,empty)
+      self._counters['computed']+=1
+    return indices,weights,empty
+
+  def interpolate(self, table):
+    """
+    Interpolates the temperatures of a weather table onto the grid.
+
+    Args:
+      table (WeatherTable): The stations, as returned by `weather_scraper.weather_table_stacker()`.
+
+    Returns:
+      numpy.ndarray: Float grid of `shape` in degrees Celsius, the first row is the northern edge.
+        Cells beyond `max_distance` of every station are NaN.
+    """
+    temperature=np.asarray(table.temperature, dtype=float)
+    known=np.isfinite(temperature)
+    latitude=np.asarray(table.latitude)
+    longitude=np.asarray(table.longitude)
+    if not known.all():
+      temperature,latitude,longitude=temperature[known],latitude[known],longitude[known]
+    indices,weights,empty=self.weights(latitude, longitude)
+    grid=(temperature[indices]*weights).sum(axis=1)
+    grid[empty]=np.nan
+    return grid.reshape(self.shape)
+
+  def stats(self):
+    """
+    Reports how often the weights were computed and how often they were reused.
+
+    Returns:
+      dict: A dictionary with:
+        - computed (int): Station sets whose weights had to be computed.
+        - reused (int): Interpolations that reused the cached weights.
+    """
+    with self._lock:
+      return dict(self._counters)
+
+def surface_image(grid, edges=SURFACE_EDGES, palette=SURFACE_PALETTE, opacity=0.5):
+  """
+  Colours an interpolated grid with a continuous colormap, for `folium.raster_layers.ImageOverlay`.
+
+  Args:
+    grid (numpy.ndarray): Temperatures in degrees Celsius, NaN cells become transparent.
+    edges (sequence of float): Increasing temperatures of the colours, see `weather_scraper.marker_colours()`.
+    palette (sequence of str): One colour per edge, as names from `weather_scraper.NAMED_COLOURS` or '#rrggbb' strings.
+    opacity (float): Opacity of the coloured cells, between 0 and 1.
+
+  Returns:
+    numpy.ndarray: RGBA image of the same rows and columns, as uint8.
+
+  Example:
+    >>> surface_image(np.array([[-5.0, 25.0]]))[0, :, :3].tolist()
+    [[128, 0, 128], [255, 0, 0]]
+  """
+  edges=np.asarray(edges, dtype=float)
+  if edges.ndim != 1 or len(edges) == 0 or np.any(np.diff(edges) <= 0):
+    raise ValueError("Invalid temperature edges")
+  if len(palette) != len(edges):
+    raise ValueError("Palette needs one colour per edge")
+  stops=np.array([weather_scraper._rgb(colour) for colour in palette], dtype=float)
+  image=np.empty(grid.shape+(4,), dtype=np.uint8)
+  values=np.nan_to_num(grid, nan=edges[0])
+  for channel in range(3):
+    image[..., channel]=np.rint(np.interp(values, edges, stops[:, channel]))
+  image[..., 3]=np.where(np.isnan(grid), 0, round(255*opacity))
+  return image
+
+_default_surface=None
+_default_lock=threading.Lock()
+
+def default_surface():
+  """
+  Returns the surface drawn by `weather_scraper.map_generator(surface=True)`, created on first use.
+  Sharing it keeps its cached weights between maps of the same cities.
+  """
+  global _default_surface
+  with _default_lock:
+    if _default_surface is None:
+      _default_surface=TemperatureSurface()
+    return _default_surface
+
+def set_default_surface(surface):
+  """
+  Replaces the surface drawn by `weather_scraper.map_generator(surface=True)`.
+
+  Args:
+    surface (TemperatureSurface or None): The new surface. None creates a default one on next use.
+  """
+  global _default_surface
+  with _default_lock:
+    _default_surface=surface
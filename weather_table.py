@@ -0,0 +1,162 @@
+import sys
+import numpy as np
+
+#numeric columns of a weather table, stored side by side in one structured array
+NUMERIC_DTYPE = np.dtype([('temperature', np.int32), ('latitude', np.float64), ('longitude', np.float64)])
+COLUMNS = ('city', 'temperature', 'description', 'latitude', 'longitude')
+
+class StringColumn:
+  """
+  Column of repeated strings stored as integer codes into a list of unique, interned values.
+
+  Comparing the column with a string returns a boolean NumPy mask without creating a Python object per row.
+
+  Args:
+    codes (numpy.ndarray): Index into `values` for every row.
+    values (list of str): The distinct strings of the column.
+
+  Example:
+    >>> column = StringColumn.from_strings(['Fog', 'Sunny', 'Fog'])
+    >>> column == 'Fog'
+    array([ True, False,  True])
+  """
+  __slots__ = ('codes', 'values', '_positions')
+
+  def __init__(self, codes, values):
+    self.codes=np.asarray(codes, dtype=np.int32)
+    self.values=[sys.intern(value) for value in values]
+    self._positions={value:position for position,value in enumerate(self.values)}
+
+  @classmethod
+  def from_strings(cls, strings):
+    positions={}
+    codes=np.fromiter((positions.setdefault(string, len(positions)) for string in strings), dtype=np.int32)
+    return cls(codes, list(positions))
+
+  def __len__(self):
+    return len(self.codes)
+
+  def __getitem__(self, key):
+    if isinstance(key, (int, np.integer)):
+      return self.values[self.codes[key]]
+    return StringColumn(self.codes[key], self.values)
+
+  def __eq__(self, other):
+    position=self._positions.get(other)
+    if position is None:
+      return np.zeros(len(self.codes), dtype=bool)
+    return self.codes == position
+
+  def __ne__(self, other):
+    return ~(self == other)
+
+  def isin(self, strings):
+    """
+    Returns a boolean mask of the rows whose value is one of `strings`.
+    """
+    positions=[self._positions[string] for string in strings if string in self._positions]
+    return np.isin(self.codes, positions)
+
+  def tolist(self):
+    values=self.values
+    return [values[code] for code in self.codes.tolist()]
+
+class WeatherTable:
+  """
+  Columnar version of the weather matrix produced by `weather_array_stacker()`.
+
+  Temperature, latitude and longitude are NumPy columns backed by one structured array, city and description are
+  `StringColumn`s. Filtering with a boolean mask and computing on the columns never creates per-row Python objects.
+  `tolist()` gives back the list-of-lists matrix for existing callers.
+
+  Args:
+    city (StringColumn): The name of the city of every row.
+    description (StringColumn): The weather description of every row.
+    numeric (numpy.ndarray): Structured array of dtype `NUMERIC_DTYPE` with temperature, latitude and longitude.
+
+  Example:
+    >>> table = WeatherTable.from_rows(weather_array_stacker(url_list))
+    >>> warm = table[table.temperature >= 15]
+    >>> warm.city.tolist()
+    ['Amsterdam', 'Haarlem']
+    >>> table.temperature.mean()
+    13.5
+  """
+  __slots__ = ('city', 'description', 'numeric')
+
+  def __init__(self, city, description, numeric):
+    if not len(city) == len(description) == len(numeric):
+      raise ValueError('Columns of different length')
+    self.city=city
+    self.description=description
+    self.numeric=numeric
+
+  @classmethod
+  def from_rows(cls, rows):
+    """
+    Builds a table from a weather matrix.
+
+    Args:
+      rows (list of list): Rows of the form [City (str), temp_max (int), weather (str), latitude (float), longitude (float)].
+
+    Returns:
+      WeatherTable: The same data in columns.
+    """
+    numeric=np.empty(len(rows), dtype=NUMERIC_DTYPE)
+    numeric['temperature']=[row[1] for row in rows]
+    numeric['latitude']=[row[3] for row in rows]
+    numeric['longitude']=[row[4] for row in rows]
+    return cls(StringColumn.from_strings(row[0] for row in rows), StringColumn.from_strings(row[2] for row in rows), numeric)
+
+  @property
+  def temperature(self):
+    return self.numeric['temperature']
+
+  @property
+  def latitude(self):
+    return self.numeric['latitude']
+
+  @property
+  def longitude(self):
+    return self.numeric['longitude']
+
+  def __len__(self):
+    return len(self.numeric)
+
+  def __getitem__(self, key):
+    """
+    Returns one row as a list for an integer, or a new table for a slice, an index array or a boolean mask.
+    """
+    if isinstance(key, (int, np.integer)):
+      record=self.numeric[key]
+      return [self.city[key],int(record['temperature']),self.description[key],float(record['latitude']),float(record['longitude'])]
+    return WeatherTable(self.city[key], self.description[key], self.numeric[key])
+
+  def __iter__(self):
+    return iter(self.tolist())
+
+  def tolist(self):
+    """
+    Returns the list-of-lists matrix in the format of `weather_array_stacker()`.
+    """
+    return [list(row) for row in zip(self.city.tolist(), self.temperature.tolist(), self.description.tolist(), self.latitude.tolist(), self.longitude.tolist())]
+
+  def to_numpy(self):
+    """
+    Returns the numeric columns as the structured array backing the table, without copying.
+    """
+    return self.numeric
+
+  def to_pandas(self):
+    """
+    Returns a pandas DataFrame of the table. The numeric columns and the string codes are shared with the table,
+    the strings become `pandas.Categorical` columns. Requires pandas, which is not a dependency of this package.
+    """
+    import pandas as pd
+    return pd.DataFrame({
+      'city':pd.Categorical.from_codes(self.city.codes, categories=self.city.values),
+      'temperature':self.temperature,
+      'description':pd.Categorical.from_codes(self.description.codes, categories=self.description.values),
+      'latitude':self.latitude,
+      'longitude':self.longitude,
+    }, copy=False)